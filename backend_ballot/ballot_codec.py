@@ -0,0 +1,126 @@
+"""
+Ballot Codec
+Compact storage format for ballot entries. Instead of a list of {rank, trackId}
+maps (~40 bytes per entry once DynamoDB counts attribute names and type
+overhead), entries are packed into one binary attribute as fixed-width
+records: a rank byte followed by the 22-character base62 Spotify ID as a
+17-byte integer. Reading a binary attribute also skips boto3's per-map
+deserialization, which dominates the CPU cost of large scans.
+
+Ballots whose track IDs aren't Spotify IDs are stored as maps, and reads
+accept both formats, so old items keep working without migration.
+"""
+import re
+import struct
+from decimal import Decimal
+from typing import Any
+
+PACKED_ATTRIBUTE = 'packedEntries'
+
+# Leading format byte, so the layout can change without guessing
+FORMAT_VERSION = 1
+
+BASE62 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+SPOTIFY_ID = re.compile(r'[0-9A-Za-z]{22}\Z')
+ID_BYTES = 17  # 62**22 < 2**136
+ENTRY = struct.Struct(f'>B{ID_BYTES}s')
+
+_DIGITS = {c: i for i, c in enumerate(BASE62)}
+
+# Packed ID -> track ID, so hot tracks are decoded once per execution context
+_decoded_ids: dict[bytes, str] = {}
+_DECODED_IDS_MAX = 50000
+
+
+def encode_id(track_id: str) -> bytes:
+    value = 0
+    for c in track_id:
+        value = value * 62 + _DIGITS[c]
+    return value.to_bytes(ID_BYTES, 'big')
+
+
+def decode_id(data: bytes) -> str:
+    track_id = _decoded_ids.get(data)
+    if track_id is None:
+        value = int.from_bytes(data, 'big')
+        digits = []
+        for _ in range(22):
+            value, digit = divmod(value, 62)
+            digits.append(BASE62[digit])
+        track_id = ''.join(reversed(digits))
+        if len(_decoded_ids) >= _DECODED_IDS_MAX:
+            _decoded_ids.clear()
+        _decoded_ids[data] = track_id
+    return track_id
+
+
+def can_pack(entries: list[dict[str, Any]]) -> bool:
+    """Whether every entry is a bare {rank, trackId} with a Spotify track ID and a one-byte rank."""
+    return all(
+        SPOTIFY_ID.match(e['trackId']) and 0 < int(e['rank']) < 256 and e.get('track') is None
+        for e in entries
+    )
+
+
+def pack_entries(entries: list[dict[str, Any]]) -> bytes:
+    return bytes([FORMAT_VERSION]) + b''.join(
+        ENTRY.pack(int(e['rank']), encode_id(e['trackId'])) for e in entries
+    )
+
+
+def unpack_entries(data: bytes) -> list[dict[str, Any]]:
+    if not data or data[0] != FORMAT_VERSION:
+        raise ValueError(f'Unsupported packed entries format: {data[:1]!r}')
+    return [
+        {'rank': rank, 'trackId': decode_id(packed_id)}
+        for rank, packed_id in ENTRY.iter_unpack(data[1:])
+    ]
+
+
+def encode_ballot(ballot: dict[str, Any]) -> dict[str, Any]:
+    """Storage form of a ballot: entries packed when possible, otherwise unchanged."""
+    entries = ballot.get('entries')
+    if entries is None or not can_pack(entries):
+        return ballot
+    item = {k: v for k, v in ballot.items() if k != 'entries'}
+    item[PACKED_ATTRIBUTE] = pack_entries(entries)
+    return item
+
+
+def decode_ballot(item: dict[str, Any] | None) -> dict[str, Any] | None:
+    """Turn a stored ballot of either format back into one with `entries`, in place."""
+    if item is not None and PACKED_ATTRIBUTE in item:
+        # bytes() also unwraps boto3's Binary, for items read through the resource API (e.g. scripts)
+        item['entries'] = unpack_entries(bytes(item.pop(PACKED_ATTRIBUTE)))
+    return item
+
+
+def stored_fields(fields: list[str] | None) -> list[str] | None:
+    """Attributes to project for the requested ballot fields (entries may be stored packed)."""
+    if fields and 'entries' in fields and PACKED_ATTRIBUTE not in fields:
+        return [*fields, PACKED_ATTRIBUTE]
+    return fields
+
+
+def item_size(value: Any) -> int:
+    """Approximate DynamoDB size in bytes of an item (or attribute value), as billed for reads."""
+    if isinstance(value, dict):
+        return sum(len(k.encode()) + _value_size(v) for k, v in value.items())
+    return _value_size(value)
+
+
+def _value_size(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(str(abs(value)).replace('.', '').strip('0')) or 1
+        return (digits + 1) // 2 + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 3 + sum(len(k.encode()) + _value_size(v) + 1 for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(_value_size(v) + 1 for v in value)
+    return len(bytes(value))  # boto3 Binary
@@ -0,0 +1,268 @@
+"""
+DynamoDB Client
+Thin, lazily connected wrapper over the low-level botocore DynamoDB client.
+
+boto3's resource API costs a cold start ~200 ms before the first request can
+be served: importing boto3 pulls in s3transfer, and building the resource
+loads its resource model on top of the service model. This module imports
+only botocore, and only when the first DynamoDB call is made, so requests that
+never touch the table (preflights, validation errors) skip it entirely.
+Callers tell AWS errors apart with error_code() rather than `except
+ClientError`, which would import botocore.exceptions up front.
+
+Tables expose the subset of the boto3 Table interface the ballot Lambda uses,
+taking and returning plain Python values (numbers come back as Decimal and
+binary as bytes), so the in-memory stand-in in memory_store.py still fits.
+"""
+import random
+import threading
+import time
+from decimal import Decimal
+from typing import Any
+
+from instrumentation import phase
+
+# Request fields holding a single item/key map, and response fields to convert back
+_ITEM_FIELDS = ('Key', 'Item', 'ExclusiveStartKey', 'ExpressionAttributeValues')
+_RESULT_FIELDS = ('Item', 'Attributes', 'LastEvaluatedKey')
+
+# BatchWriteItem accepts at most this many requests
+BATCH_WRITE_SIZE = 25
+
+# Unprocessed batch items/keys (throttling) are resent after a jittered backoff that
+# doubles from BATCH_BACKOFF seconds up to BATCH_MAX_BACKOFF, at most BATCH_RETRIES times
+BATCH_RETRIES = 8
+BATCH_BACKOFF = 0.05
+BATCH_MAX_BACKOFF = 2.0
+
+
+def serialize(value: Any) -> dict[str, Any]:
+    """Python value -> DynamoDB attribute value ({'S': ...}, {'N': ...}, ...)."""
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, (int, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {'B': bytes(value)}
+    if isinstance(value, dict):
+        return {'M': {k: serialize(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [serialize(v) for v in value]}
+    if isinstance(value, (set, frozenset)) and value:
+        if all(isinstance(v, str) for v in value):
+            return {'SS': list(value)}
+        if all(isinstance(v, (int, Decimal)) and not isinstance(v, bool) for v in value):
+            return {'NS': [str(v) for v in value]}
+        if all(isinstance(v, (bytes, bytearray)) for v in value):
+            return {'BS': [bytes(v) for v in value]}
+    # Floats are rejected as boto3 does: they can't round-trip exactly
+    raise TypeError(f'Unsupported DynamoDB type: {type(value).__name__}')
+
+
+def deserialize(attribute: dict[str, Any]) -> Any:
+    """DynamoDB attribute value -> Python value."""
+    (kind, value), = attribute.items()
+    if kind == 'S' or kind == 'B' or kind == 'BOOL':
+        return value
+    if kind == 'N':
+        return Decimal(value)
+    if kind == 'M':
+        return {k: deserialize(v) for k, v in value.items()}
+    if kind == 'L':
+        return [deserialize(v) for v in value]
+    if kind == 'NULL':
+        return None
+    if kind == 'NS':
+        return {Decimal(v) for v in value}
+    return set(value)  # SS, BS
+
+
+def error_code(error: BaseException) -> str | None:
+    """The AWS error code of a botocore ClientError, or None for any other exception.
+
+    Read from the error's response rather than matched by class, so callers
+    don't import botocore.exceptions (about 18 ms) before their first call.
+    """
+    response = getattr(error, 'response', None)
+    if not isinstance(response, dict):
+        return None
+    return response.get('Error', {}).get('Code')
+
+
+def batch_backoff(attempt: int, unprocessed: int) -> None:
+    """Wait before resending the `attempt`th round of unprocessed batch requests.
+
+    Raises RuntimeError once BATCH_RETRIES rounds have been resent, rather than
+    hammering a throttled table until the Lambda times out.
+    """
+    if attempt >= BATCH_RETRIES:
+        raise RuntimeError(f'{unprocessed} batch requests still unprocessed after {BATCH_RETRIES} retries')
+    time.sleep(random.uniform(0, min(BATCH_MAX_BACKOFF, BATCH_BACKOFF * 2 ** attempt)))
+
+
+def serialize_item(item: dict[str, Any]) -> dict[str, Any]:
+    return {k: serialize(v) for k, v in item.items()}
+
+
+def deserialize_item(item: dict[str, Any]) -> dict[str, Any]:
+    return {k: deserialize(v) for k, v in item.items()}
+
+
+class BatchWriter:
+    """Buffers puts and deletes into BatchWriteItem calls, resending unprocessed items with backoff."""
+
+    def __init__(self, table: 'Table') -> None:
+        self.table = table
+        self._requests: list[dict[str, Any]] = []
+        self._retries = 0  # consecutive calls that left items unprocessed
+
+    def put_item(self, Item: dict[str, Any]) -> None:
+        self._add({'PutRequest': {'Item': serialize_item(Item)}})
+
+    def delete_item(self, Key: dict[str, Any]) -> None:
+        self._add({'DeleteRequest': {'Key': serialize_item(Key)}})
+
+    def _add(self, request: dict[str, Any]) -> None:
+        self._requests.append(request)
+        if len(self._requests) >= BATCH_WRITE_SIZE:
+            self._send()
+
+    def _send(self) -> None:
+        batch, self._requests = self._requests[:BATCH_WRITE_SIZE], self._requests[BATCH_WRITE_SIZE:]
+        with phase('dynamodb'):
+            result = self.table.db.client.batch_write_item(RequestItems={self.table.name: batch})
+        unprocessed = result.get('UnprocessedItems', {}).get(self.table.name, [])
+        if not unprocessed:
+            self._retries = 0
+            return
+        batch_backoff(self._retries, len(unprocessed))
+        self._retries += 1
+        self._requests.extend(unprocessed)
+
+    def __enter__(self) -> 'BatchWriter':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        while self._requests:
+            self._send()
+
+
+class Table:
+    """One table, called with the same keyword arguments as boto3's Table."""
+
+    def __init__(self, db: 'DynamoDB', name: str) -> None:
+        self.db = db
+        self.name = name
+
+    @property
+    def table_name(self) -> str:
+        return self.name
+
+    def _call(self, operation: str, **kwargs: Any) -> dict[str, Any]:
+        for field in _ITEM_FIELDS:
+            if field in kwargs:
+                kwargs[field] = serialize_item(kwargs[field])
+        with phase('dynamodb'):
+            result = getattr(self.db.client, operation)(TableName=self.name, **kwargs)
+        for field in _RESULT_FIELDS:
+            if field in result:
+                result[field] = deserialize_item(result[field])
+        if 'Items' in result:
+            result['Items'] = [deserialize_item(item) for item in result['Items']]
+        return result
+
+    def get_item(self, **kwargs: Any) -> dict[str, Any]:
+        return self._call('get_item', **kwargs)
+
+    def put_item(self, **kwargs: Any) -> dict[str, Any]:
+        return self._call('put_item', **kwargs)
+
+    def update_item(self, **kwargs: Any) -> dict[str, Any]:
+        return self._call('update_item', **kwargs)
+
+    def delete_item(self, **kwargs: Any) -> dict[str, Any]:
+        return self._call('delete_item', **kwargs)
+
+    def scan(self, **kwargs: Any) -> dict[str, Any]:
+        return self._call('scan', **kwargs)
+
+    def query(self, **kwargs: Any) -> dict[str, Any]:
+        return self._call('query', **kwargs)
+
+    def batch_writer(self) -> BatchWriter:
+        return BatchWriter(self)
+
+
+class _Meta:
+    def __init__(self, db: 'DynamoDB') -> None:
+        self.db = db
+
+    @property
+    def client(self) -> Any:
+        return self.db.client
+
+
+class DynamoDB:
+    """Stand-in for `boto3.resource('dynamodb')` that connects on first use."""
+
+    def __init__(self, endpoint_url: str | None = None) -> None:
+        self.endpoint_url = endpoint_url
+        self.meta = _Meta(self)  # meta.client, as on the boto3 resource
+        self._client = None
+        self._streams_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            with self._lock:  # Parallel scans may make the first call from several threads
+                if self._client is None:
+                    self._client = self._connect('dynamodb')
+        return self._client
+
+    @property
+    def streams_client(self) -> Any:
+        """Low-level DynamoDB Streams client, created on first use."""
+        if self._streams_client is None:
+            with self._lock:
+                if self._streams_client is None:
+                    self._streams_client = self._connect('dynamodbstreams')
+        return self._streams_client
+
+    def _connect(self, service: str) -> Any:
+        import botocore.session
+        session = botocore.session.get_session()
+        if self.endpoint_url:
+            return session.create_client(
+                service,
+                endpoint_url=self.endpoint_url,
+                region_name='us-east-1',
+                aws_access_key_id='dummy',
+                aws_secret_access_key='dummy',
+            )
+        return session.create_client(service)
+
+    def Table(self, name: str) -> Table:
+        return Table(self, name)
+
+    def batch_get_item(self, RequestItems: dict[str, Any]) -> dict[str, Any]:
+        """BatchGetItem with plain keys in, and plain items and unprocessed keys out."""
+        request = {
+            name: {**params, 'Keys': [serialize_item(key) for key in params['Keys']]}
+            for name, params in RequestItems.items()
+        }
+        with phase('dynamodb'):
+            result = self.client.batch_get_item(RequestItems=request)
+        result['Responses'] = {
+            name: [deserialize_item(item) for item in items]
+            for name, items in result.get('Responses', {}).items()
+        }
+        result['UnprocessedKeys'] = {
+            name: {**params, 'Keys': [deserialize_item(key) for key in params['Keys']]}
+            for name, params in result.get('UnprocessedKeys', {}).items()
+        }
+        return result
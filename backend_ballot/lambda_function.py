@@ -2,31 +2,118 @@
 Ballot Storage Lambda
 Handles ballot storage in DynamoDB. No authentication - honor system for friends.
 """
+import base64
+import hashlib
 import json
 import os
-from decimal import Decimal
-from typing import Any
-import boto3
+import queue
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Iterator
 
-# DynamoDB table names (set via environment variables)
-BALLOTS_TABLE = os.environ.get('BALLOTS_TABLE', 'musicvoting_ballots')
+from tally import (
+    ALGORITHMS,
+    MAX_SONGS,
+    STATS_KEY,
+    STATS_SHARDS,
+    Tally,
+    aggregate_items,
+    is_stats_key,
+    pack_ballots,
+    rank_attribute,
+    stats_key,
+    tally_aggregate,
+    tally_deltas,
+    tally_packed,
+)
+from voting_methods import METHODS, method_results
+from rank_stability import rank_stability
+from ballot_codec import PACKED_ATTRIBUTE, decode_ballot, encode_ballot, item_size, stored_fields
+from serialization import compress_response, dumps, dumps_bytes
+from dynamo import DynamoDB, batch_backoff, error_code, serialize_item
+from instrumentation import bind, cache_lookup, count, instrument, phase, set_route
+from live_results import CursorExpired, Leaderboard, MemoryChangeFeed, StreamChangeFeed, change_record, record_deltas, sse
+
+# DynamoDB table names (set via environment variables). Ballots and the tally are
+# partitioned by electionId, so one election's items are read with a Query
+BALLOTS_TABLE = os.environ.get('BALLOTS_TABLE', 'musicvoting_election_ballots')
+TALLY_TABLE = os.environ.get('TALLY_TABLE', 'musicvoting_election_tally')
+TRACKS_TABLE = os.environ.get('TRACKS_TABLE', 'musicvoting_tracks')
+
+# Election used when a request doesn't name one (?electionId=, or electionId in a POST body)
+ELECTION_ID = os.environ.get('ELECTION_ID', '2025')
+ELECTION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+
+# Track metadata cached in the Lambda execution context (cleared when it grows past this)
+TRACK_CACHE_SIZE = int(os.environ.get('TRACK_CACHE_SIZE', '10000'))
+
+# Parallel scan segments for whole-table reads across every election (migrations)
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '4'))
+
+# Page size for cursor-paginated admin reads (?limit=&cursor=)
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+# Top-level ballot attributes a caller may request with ?fields=
+BALLOT_FIELDS = ('electionId', 'username', 'entries', 'submittedAt', 'isRescinded', 'rescindedAt', 'revision')
+
+# Ordinal methods (IRV, Schulze, Copeland) only rank tracks with at least this many
+# votes (override per request with ?minVotes=), capped to the most-voted candidates
+METHOD_MIN_VOTES = int(os.environ.get('METHOD_MIN_VOTES', '2'))
+METHOD_MAX_CANDIDATES = int(os.environ.get('METHOD_MAX_CANDIDATES', '300'))
+
+# Bucket (behind CloudFront) that finalized results snapshots are published to
+RESULTS_BUCKET = os.environ.get('RESULTS_BUCKET', None)
+# Tracks per algorithm in a snapshot (the results view shows the top 100)
+SNAPSHOT_TOP = int(os.environ.get('SNAPSHOT_TOP', '100'))
+
+# 'packed' stores ballot entries as one compact binary attribute (see ballot_codec.py);
+# 'map' writes the original list of maps. Reads understand both.
+BALLOT_ENCODING = os.environ.get('BALLOT_ENCODING', 'map')
+
+# How many times a ballot write is attempted when concurrent writes cancel its transaction,
+# and the jittered backoff between attempts (seconds, doubling per attempt up to the cap)
+TRANSACTION_RETRIES = 5
+TRANSACTION_BACKOFF = 0.025
+TRANSACTION_MAX_BACKOFF = 0.4
+
+# Idempotency-Key values remembered per ballot; a retry of any of the last few saves is not rewritten
+IDEMPOTENCY_KEYS_KEPT = 5
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,64}$')
 
 # Local DynamoDB endpoint (set for local development)
 DYNAMODB_ENDPOINT = os.environ.get('DYNAMODB_ENDPOINT', None)
 
-# Connect to DynamoDB (local or AWS)
-if DYNAMODB_ENDPOINT:
-    dynamodb = boto3.resource(
-        'dynamodb',
-        endpoint_url=DYNAMODB_ENDPOINT,
-        region_name='us-east-1',
-        aws_access_key_id='dummy',
-        aws_secret_access_key='dummy',
-    )
-else:
-    dynamodb = boto3.resource('dynamodb')
+# Stream of the ballots table (NEW_AND_OLD_IMAGES) that live results read; unset, writes go to an in-process feed
+BALLOTS_STREAM_ARN = os.environ.get('BALLOTS_STREAM_ARN', None)
+
+# Live results: how long a Function URL request waits for changes before answering,
+# the reconnect delay sent to EventSource, and the idle time before a keep-alive
+LIVE_POLL_SECONDS = float(os.environ.get('LIVE_POLL_SECONDS', '20'))
+LIVE_RETRY_MS = 500
+LIVE_HEARTBEAT_SECONDS = 15
+
+# Rank stability: resampling worker processes (serial where Lambda can't start them),
+# the most time a request may spend resampling, and the most resamples one may ask for
+STABILITY_WORKERS = int(os.environ.get('STABILITY_WORKERS', str(os.cpu_count() or 1)))
+STABILITY_BUDGET_MS = int(os.environ.get('STABILITY_BUDGET_MS', '20000'))
+MAX_STABILITY_RESAMPLES = 10000
+
+# DynamoDB (local or AWS); the client is only created on the first call, not at import
+dynamodb = DynamoDB(DYNAMODB_ENDPOINT)
 
 ballots_table = dynamodb.Table(BALLOTS_TABLE)
+tally_table = dynamodb.Table(TALLY_TABLE)
+tracks_table = dynamodb.Table(TRACKS_TABLE)
+
+# Where ballot changes come from for live results
+change_feed = StreamChangeFeed(dynamodb, BALLOTS_STREAM_ARN) if BALLOTS_STREAM_ARN else MemoryChangeFeed()
+
+# trackId -> Spotify track metadata already known to be in the catalog
+_track_cache: dict[str, dict[str, Any]] = {}
 
 
 def cors_headers() -> dict[str, str]:
@@ -38,35 +125,534 @@ def cors_headers() -> dict[str, str]:
     return {}
 
 
-def decimal_to_num(obj: Any) -> Any:
-    """Convert Decimal objects to int/float for JSON serialization."""
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    if isinstance(obj, dict):
-        return {k: decimal_to_num(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [decimal_to_num(i) for i in obj]
-    return obj
-
-
 def response(status_code: int, body: dict[str, Any] | list) -> dict[str, Any]:
     """Create a Lambda response with CORS headers."""
+    with phase('serialize'):
+        return {
+            'statusCode': status_code,
+            'headers': {**cors_headers(), 'Content-Type': 'application/json'},
+            'body': dumps(body),
+        }
+
+
+def transact_write(operations: list[dict[str, Any]]) -> None:
+    """Apply Put/Update operations atomically across tables.
+
+    Operations use the low-level TransactWriteItems shape, but Key, Item and
+    ExpressionAttributeValues are given as plain Python values.
+    """
+    transact_items = []
+    for operation in operations:
+        for kind, params in operation.items():
+            params = dict(params)
+            for field in ('Key', 'Item', 'ExpressionAttributeValues'):
+                if field in params:
+                    params[field] = serialize_item(params[field])
+            transact_items.append({kind: params})
+
+    with phase('dynamodb'):
+        dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+
+
+def is_transaction_conflict(error: BaseException) -> bool:
+    """True if a transaction was cancelled by a failed condition or a concurrent write."""
+    return error_code(error) in (
+        'TransactionCanceledException',
+        'TransactionConflictException',
+    )
+
+
+def conflict_backoff(attempt: int) -> None:
+    """Wait before re-attempting a cancelled transaction, so colliding saves spread out instead of retrying in lockstep."""
+    count('transactionConflicts')
+    if attempt + 1 < TRANSACTION_RETRIES:
+        time.sleep(random.uniform(0, min(TRANSACTION_MAX_BACKOFF, TRANSACTION_BACKOFF * 2 ** attempt)))
+
+
+def revision_condition(old: dict[str, Any] | None) -> dict[str, Any]:
+    """Condition that the stored ballot is still the one the tally deltas were computed from."""
+    if old is None:
+        return {
+            'ConditionExpression': 'attribute_not_exists(#username)',
+            'ExpressionAttributeNames': {'#username': 'username'},
+        }
+    if 'revision' not in old:
+        return {
+            'ConditionExpression': 'attribute_not_exists(#revision)',
+            'ExpressionAttributeNames': {'#revision': 'revision'},
+        }
     return {
-        'statusCode': status_code,
-        'headers': {**cors_headers(), 'Content-Type': 'application/json'},
-        'body': json.dumps(decimal_to_num(body)),
+        'ConditionExpression': '#revision = :revision',
+        'ExpressionAttributeNames': {'#revision': 'revision'},
+        'ExpressionAttributeValues': {':revision': old['revision']},
     }
 
 
-def handle_get_ballot(username: str) -> dict[str, Any]:
+def next_revision(old: dict[str, Any] | None) -> int:
+    """Revision number for the ballot replacing `old`."""
+    return int(old.get('revision', 0)) + 1 if old else 1
+
+
+def entries_hash(entries: list[dict[str, Any]]) -> str:
+    """Content hash of a ballot's {rank, trackId} entries, independent of list order and encoding."""
+    canonical = '\n'.join(f'{rank}:{track_id}' for rank, track_id in sorted((int(e['rank']), e['trackId']) for e in entries))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+def stored_entries_hash(ballot: dict[str, Any]) -> str:
+    """The stored ballot's entries hash (computed for ballots saved before it was recorded)."""
+    return ballot.get('entriesHash') or entries_hash(ballot.get('entries', []))
+
+
+def live_entry_count(ballot: dict[str, Any] | None) -> int:
+    """Number of entries a ballot contributes to the tally."""
+    if not ballot or ballot.get('isRescinded'):
+        return 0
+    return len(ballot.get('entries', []))
+
+
+def tally_operations(election_id: str, old: dict[str, Any] | None, new: dict[str, Any] | None) -> list[dict[str, Any]]:
+    """Aggregate table updates that move the election's tally from the `old` ballot to `new`."""
+    operations = []
+
+    for track_id, ranks in tally_deltas(old, new).items():
+        names = {'#votes': 'votes'}
+        values: dict[str, Any] = {':votes': sum(ranks.values())}
+        adds = ['#votes :votes']
+        for rank, delta in ranks.items():
+            attribute = rank_attribute(rank)
+            names[f'#{attribute}'] = attribute
+            values[f':{attribute}'] = delta
+            adds.append(f'#{attribute} :{attribute}')
+
+        operations.append({'Update': {
+            'TableName': TALLY_TABLE,
+            'Key': {'electionId': election_id, 'trackId': track_id},
+            'UpdateExpression': 'ADD ' + ', '.join(adds),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values,
+        }})
+
+    voters_delta = int(live_entry_count(new) > 0) - int(live_entry_count(old) > 0)
+    votes_delta = live_entry_count(new) - live_entry_count(old)
+    if voters_delta or votes_delta:
+        operations.append({'Update': {
+            'TableName': TALLY_TABLE,
+            'Key': {'electionId': election_id, 'trackId': stats_key(random.randrange(STATS_SHARDS))},
+            'UpdateExpression': 'ADD #voters :voters, #votes :votes',
+            'ExpressionAttributeNames': {'#voters': 'totalVoters', '#votes': 'totalVotes'},
+            'ExpressionAttributeValues': {':voters': voters_delta, ':votes': votes_delta},
+        }})
+
+    return operations
+
+
+def cache_track(track_id: str, track: dict[str, Any]) -> None:
+    """Remember a catalogued track for the life of this execution context."""
+    if len(_track_cache) >= TRACK_CACHE_SIZE:
+        _track_cache.clear()
+    _track_cache[track_id] = track
+
+
+def upsert_tracks(tracks: dict[str, dict[str, Any]]) -> None:
+    """Write track metadata to the catalog, skipping tracks this container has already seen."""
+    new_tracks = {t: track for t, track in tracks.items() if t not in _track_cache}
+    if not new_tracks:
+        return
+
+    with tracks_table.batch_writer() as batch:
+        for track_id, track in new_tracks.items():
+            batch.put_item(Item={'trackId': track_id, 'track': track})
+    for track_id, track in new_tracks.items():
+        cache_track(track_id, track)
+
+
+def get_tracks(track_ids: set[str]) -> dict[str, dict[str, Any]]:
+    """Look up catalog metadata for many tracks, 100 keys per BatchGetItem, via the cache."""
+    found = {t: _track_cache[t] for t in track_ids if t in _track_cache}
+    missing = sorted(t for t in track_ids if t not in found)
+    cache_lookup('trackCache', hits=len(found), misses=len(missing))
+
+    for start in range(0, len(missing), 100):
+        request = {TRACKS_TABLE: {'Keys': [{'trackId': t} for t in missing[start:start + 100]]}}
+        retries = 0
+        while True:
+            result = dynamodb.batch_get_item(RequestItems=request)
+            for item in result.get('Responses', {}).get(TRACKS_TABLE, []):
+                found[item['trackId']] = item['track']
+                cache_track(item['trackId'], item['track'])
+            request = result.get('UnprocessedKeys')
+            if not request:
+                break
+            batch_backoff(retries, len(request.get(TRACKS_TABLE, {}).get('Keys', [])))
+            retries += 1
+
+    return found
+
+
+def hydrate_entries(entries: list[dict[str, Any]]) -> None:
+    """Join catalog metadata into `{rank, trackId}` entries in place.
+
+    Entries that still embed a full track (ballots saved before the catalog) are left as-is.
+    """
+    missing = {e['trackId'] for e in entries if e.get('track') is None}
+    if not missing:
+        return
+    tracks = get_tracks(missing)
+    for entry in entries:
+        if entry.get('track') is None and entry['trackId'] in tracks:
+            entry['track'] = tracks[entry['trackId']]
+
+
+def hydrate_ballots(ballots: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Join catalog metadata into every ballot's entries with one batched lookup."""
+    hydrate_entries([entry for ballot in ballots for entry in ballot.get('entries', [])])
+    return ballots
+
+
+def projection(fields: list[str] | None) -> dict[str, Any]:
+    """Scan/query kwargs that fetch only the given top-level attributes."""
+    if not fields:
+        return {}
+    names = {f'#p{i}': field for i, field in enumerate(fields)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names,
+    }
+
+
+def scan_pages(table: Any, **kwargs: Any) -> Iterator[list[dict[str, Any]]]:
+    """Yield each page of one scan (or scan segment), following LastEvaluatedKey."""
+    result = table.scan(**kwargs)
+    yield result.get('Items', [])
+
+    while 'LastEvaluatedKey' in result:
+        result = table.scan(ExclusiveStartKey=result['LastEvaluatedKey'], **kwargs)
+        yield result.get('Items', [])
+
+
+def scan_table(table: Any, segments: int = 1, fields: list[str] | None = None) -> Iterator[dict[str, Any]]:
+    """Yield every item in a table.
+
+    With more than one segment the table is read as a DynamoDB parallel scan,
+    one thread per segment, so latency tracks the largest segment rather than
+    the whole table. Pages are yielded as they arrive from any segment.
+    """
+    kwargs = projection(fields)
+
+    if segments <= 1:
+        for page in scan_pages(table, **kwargs):
+            yield from page
+        return
+
+    pages: queue.Queue = queue.Queue()
+    stop = threading.Event()
+
+    def scan_segment(segment: int) -> None:
+        try:
+            for page in scan_pages(table, Segment=segment, TotalSegments=segments, **kwargs):
+                if stop.is_set():
+                    break
+                pages.put(page)
+        except Exception as e:
+            pages.put(e)
+        finally:
+            pages.put(None)
+
+    # The low-level client behind the table is thread-safe; scan keeps no resource state
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        for segment in range(segments):
+            pool.submit(bind(scan_segment), segment)
+        try:
+            finished = 0
+            while finished < segments:
+                page = pages.get()
+                if page is None:
+                    finished += 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield from page
+        finally:
+            # Let workers wind down if the caller stopped early or a segment failed
+            stop.set()
+
+
+def scan_ballots(segments: int = SCAN_SEGMENTS, fields: list[str] | None = None) -> Iterator[dict[str, Any]]:
+    """Yield every ballot of every election, with packed entries decoded."""
+    return map(decode_ballot, scan_table(ballots_table, segments, stored_fields(fields)))
+
+
+def election_query(election_id: str, fields: list[str] | None = None) -> dict[str, Any]:
+    """Query kwargs for one election's partition, optionally projected to `fields`."""
+    kwargs = projection(fields)
+    return {
+        **kwargs,
+        'KeyConditionExpression': '#election = :election',
+        'ExpressionAttributeNames': {**kwargs.get('ExpressionAttributeNames', {}), '#election': 'electionId'},
+        'ExpressionAttributeValues': {':election': election_id},
+    }
+
+
+def query_election(table: Any, election_id: str, fields: list[str] | None = None) -> Iterator[dict[str, Any]]:
+    """Yield every item in one election's partition of a table, following LastEvaluatedKey."""
+    kwargs = election_query(election_id, fields)
+    result = table.query(**kwargs)
+    yield from result.get('Items', [])
+
+    while 'LastEvaluatedKey' in result:
+        result = table.query(ExclusiveStartKey=result['LastEvaluatedKey'], **kwargs)
+        yield from result.get('Items', [])
+
+
+def election_ballots(election_id: str, fields: list[str] | None = None) -> Iterator[dict[str, Any]]:
+    """Yield one election's ballots, with packed entries decoded."""
+    return map(decode_ballot, query_election(ballots_table, election_id, stored_fields(fields)))
+
+
+def election_tally(election_id: str) -> Tally:
+    """One election's tally, read from its aggregate items (O(tracks)), not its ballots."""
+    return tally_aggregate(query_election(tally_table, election_id))
+
+
+def get_ballot_item(election_id: str, username: str, consistent: bool = False) -> dict[str, Any] | None:
+    """Read one ballot, with packed entries decoded."""
+    result = ballots_table.get_item(Key={'electionId': election_id, 'username': username}, ConsistentRead=consistent)
+    return decode_ballot(result.get('Item'))
+
+
+def storage_item(ballot: dict[str, Any]) -> dict[str, Any]:
+    """The item to write for a ballot under BALLOT_ENCODING."""
+    return encode_ballot(ballot) if BALLOT_ENCODING == 'packed' else ballot
+
+
+def parse_election(value: str | None) -> str:
+    """An election ID from a request, defaulting to ELECTION_ID. Raises ValueError if it is malformed."""
+    election_id = value or ELECTION_ID
+    if not isinstance(election_id, str) or not ELECTION_ID_PATTERN.match(election_id):
+        raise ValueError('Election ID must be 1-32 letters, digits, _ or -')
+    return election_id
+
+
+def parse_fields(query_params: dict[str, str]) -> list[str] | None:
+    """Parse ?fields= for admin reads. Raises ValueError on bad input."""
+    fields = None
+    if query_params.get('fields'):
+        fields = [f.strip() for f in query_params['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in BALLOT_FIELDS]
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+
+    return fields
+
+
+def encode_cursor(key: dict[str, Any]) -> str:
+    """Opaque, URL-safe cursor wrapping a DynamoDB LastEvaluatedKey."""
+    return base64.urlsafe_b64encode(dumps_bytes(key)).decode()
+
+
+def decode_cursor(cursor: str) -> dict[str, Any]:
+    """Turn a cursor back into an ExclusiveStartKey. Raises ValueError if it is malformed."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(key, dict):
+        raise ValueError('Invalid cursor')
+    return key
+
+
+def stream_admin_ballots(election_id: str, query_params: dict[str, str]) -> Iterator[str]:
+    """Return an iterator of NDJSON lines, one ballot of the election per line.
+
+    Ballots are serialized one at a time as the query produces them, so memory
+    stays flat regardless of election size. Parameters are validated eagerly
+    (ValueError) so callers can still answer 400 before streaming starts.
+    """
+    fields = parse_fields(query_params)
+
+    def lines() -> Iterator[str]:
+        # Hydrate in small batches so each catalog lookup covers many ballots
+        batch = []
+        for ballot in election_ballots(election_id, fields):
+            batch.append(ballot)
+            if len(batch) == 100:
+                yield from (dumps(b) + '\n' for b in hydrate_ballots(batch))
+                batch = []
+        yield from (dumps(b) + '\n' for b in hydrate_ballots(batch))
+
+    return lines()
+
+
+def rebuild_tally(election_id: str = ELECTION_ID, apply: bool = True) -> dict[str, Any]:
+    """Recompute an election's aggregate tally from its ballots and compare it to the stored one.
+
+    With `apply`, drifted items are overwritten and orphaned ones deleted. Run this
+    while voting is quiet: saves landing mid-rebuild may be overwritten.
+    """
+    # Ballots saved before the track catalog embed full tracks; collect them for backfill
+    embedded: dict[str, dict[str, Any]] = {}
+
+    def ballots() -> Iterator[dict[str, Any]]:
+        for ballot in election_ballots(election_id, fields=['username', 'entries', 'isRescinded']):
+            for entry in ballot.get('entries', []):
+                if entry.get('track') is not None:
+                    embedded.setdefault(entry['trackId'], entry['track'])
+            yield ballot
+
+    expected = {
+        track_id: {'electionId': election_id, **item}
+        for track_id, item in aggregate_items(ballots()).items()
+    }
+    stored = {item['trackId']: item for item in query_election(tally_table, election_id)}
+    counters = ['votes', 'totalVoters', 'totalVotes'] + [rank_attribute(r) for r in range(1, MAX_SONGS + 1)]
+
+    # Saves spread the election-wide counters over shards: compare their sum, and fold
+    # them back into the one STATS_KEY item if it has drifted
+    shards = [track_id for track_id in stored if is_stats_key(track_id) and track_id != STATS_KEY]
+    stored[STATS_KEY] = {
+        c: sum(int(stored.get(k, {}).get(c, 0)) for k in [STATS_KEY, *shards]) for c in ('totalVoters', 'totalVotes')
+    }
+    for track_id in shards:
+        del stored[track_id]
+
+    drifted = [
+        track_id for track_id, item in expected.items()
+        if any(int(item.get(c, 0)) != int(stored.get(track_id, {}).get(c, 0)) for c in counters)
+    ]
+    orphaned = [
+        track_id for track_id, item in stored.items()
+        if track_id not in expected and int(item.get('votes', 0)) != 0
+    ]
+    if STATS_KEY in drifted:
+        orphaned += shards
+
+    if apply:
+        with tally_table.batch_writer() as batch:
+            for track_id in drifted:
+                batch.put_item(Item=expected[track_id])
+            for track_id in orphaned:
+                batch.delete_item(Key={'electionId': election_id, 'trackId': track_id})
+        upsert_tracks(embedded)
+
+    return {
+        'election': election_id,
+        'tracks': len(expected) - 1,
+        'embeddedTracks': len(embedded),
+        'drifted': drifted,
+        'orphaned': orphaned,
+        'repaired': apply,
+    }
+
+
+def migrate_ballot_encoding(encoding: str = 'packed', apply: bool = True) -> dict[str, Any]:
+    """Rewrite stored ballots in the given encoding ('packed' or 'map') and report item sizes.
+
+    Each rewrite is conditional on the ballot's revision, so a save racing the
+    migration wins and that ballot is left for the next run. Track metadata
+    embedded in old ballots is copied to the catalog before it is dropped.
+    """
+    if encoding not in ('packed', 'map'):
+        raise ValueError(f'Unknown encoding: {encoding}')
+
+    counts = {'scanned': 0, 'converted': 0, 'conflicts': 0, 'bytesBefore': 0, 'bytesAfter': 0}
+    for item in scan_table(ballots_table):
+        counts['scanned'] += 1
+        ballot = decode_ballot(dict(item))
+        entries = ballot.get('entries', [])
+        embedded = {e['trackId']: e['track'] for e in entries if e.get('track') is not None}
+        if encoding == 'packed':
+            target = encode_ballot({**ballot, 'entries': [{'rank': e['rank'], 'trackId': e['trackId']} for e in entries]})
+        else:
+            target = ballot
+
+        counts['bytesBefore'] += item_size(item)
+        counts['bytesAfter'] += item_size(target)
+        if (PACKED_ATTRIBUTE in item) == (PACKED_ATTRIBUTE in target):
+            continue  # Already stored this way (or can't be packed)
+
+        counts['converted'] += 1
+        if not apply:
+            continue
+        upsert_tracks(embedded)
+        try:
+            ballots_table.put_item(Item=target, **revision_condition(item))
+        except Exception as e:
+            if error_code(e) != 'ConditionalCheckFailedException':
+                raise
+            counts['conflicts'] += 1
+
+    return {**counts, 'encoding': encoding, 'applied': apply}
+
+
+def migrate_legacy_ballots(source_table: str, election_id: str = ELECTION_ID, apply: bool = True) -> dict[str, Any]:
+    """Copy ballots from a table keyed only on username into one election, then rebuild its tally.
+
+    Ballots the election already has are left alone, so the copy can be re-run.
+    Stored items are copied as they are, in either entry encoding.
+    """
+    counts = {'scanned': 0, 'copied': 0, 'existing': 0}
+    for item in scan_table(dynamodb.Table(source_table), SCAN_SEGMENTS):
+        counts['scanned'] += 1
+        if not apply:
+            continue
+        try:
+            ballots_table.put_item(Item={**item, 'electionId': election_id}, **revision_condition(None))
+            counts['copied'] += 1
+        except Exception as e:
+            if error_code(e) != 'ConditionalCheckFailedException':
+                raise
+            counts['existing'] += 1
+
+    tally = rebuild_tally(election_id) if apply else None
+    return {**counts, 'election': election_id, 'tally': tally, 'applied': apply}
+
+
+def publish_results(target: Any = None, election_id: str = ELECTION_ID) -> dict[str, Any]:
+    """Compute every algorithm once from an election's ballots and publish immutable snapshots.
+
+    Run when the vote closes: the results page then reads the snapshots from
+    CloudFront under results/<electionId>/ instead of querying. `target`
+    defaults to RESULTS_BUCKET; pass a snapshot.DirectoryTarget to write them
+    locally instead.
+    """
+    import snapshot  # Only used at vote close, so kept out of every cold start
+
+    if target is None:
+        if not RESULTS_BUCKET:
+            raise ValueError('RESULTS_BUCKET is not set')
+        target = snapshot.S3Target(RESULTS_BUCKET)
+
+    ballots = hydrate_ballots(list(election_ballots(election_id)))
+    packed = pack_ballots(ballots)
+    tally = tally_packed(packed)
+
+    documents: dict[str, Any] = {}
+    for algorithm in ALGORITHMS:
+        documents[algorithm] = {
+            'algorithm': algorithm,
+            'stats': tally.stats(),
+            'results': tally.rankings(algorithm, SNAPSHOT_TOP),
+        }
+    for method in METHODS:
+        results, stats = method_results(packed, method, SNAPSHOT_TOP, METHOD_MIN_VOTES, METHOD_MAX_CANDIDATES)
+        documents[method] = {'algorithm': method, 'stats': stats, 'results': results}
+    # Only aggregates: the bucket is public, and individual ballots stay behind /admin/ballots
+
+    return snapshot.publish(documents, target, prefix=f'results/{election_id}')
+
+
+def handle_get_ballot(election_id: str, username: str) -> dict[str, Any]:
     """Get a user's ballot."""
     try:
-        result = ballots_table.get_item(Key={'username': username})
-        ballot = result.get('Item')
+        ballot = get_ballot_item(election_id, username)
 
         if not ballot:
             return response(404, {'error': 'Ballot not found'})
 
+        hydrate_entries(ballot.get('entries', []))
         return response(200, ballot)
 
     except Exception as e:
@@ -74,8 +660,17 @@ def handle_get_ballot(username: str) -> dict[str, Any]:
         return response(500, {'error': 'Failed to get ballot'})
 
 
-def handle_save_ballot(body: dict[str, Any]) -> dict[str, Any]:
-    """Save a user's ballot."""
+def valid_rank(rank: Any) -> bool:
+    """True for an integer rank on the ballot. JSON true and 1.0 compare equal to 1, so the type is checked."""
+    return isinstance(rank, int) and not isinstance(rank, bool) and 1 <= rank <= MAX_SONGS
+
+
+def handle_save_ballot(election_id: str, body: dict[str, Any], idempotency_key: str | None = None) -> dict[str, Any]:
+    """Save a user's ballot.
+
+    Saves whose entries match the stored ballot, and retries of a save already
+    applied (same Idempotency-Key), are answered without writing.
+    """
     username = body.get('username', '')
     entries = body.get('entries', [])
     submitted_at = body.get('submittedAt', '')
@@ -86,99 +681,463 @@ def handle_save_ballot(body: dict[str, Any]) -> dict[str, Any]:
     if not entries or len(entries) == 0:
         return response(400, {'success': False, 'error': 'Ballot must contain at least 1 entry'})
 
-    if len(entries) > 20:
-        return response(400, {'success': False, 'error': 'Ballot cannot exceed 20 entries'})
+    if len(entries) > MAX_SONGS:
+        return response(400, {'success': False, 'error': f'Ballot cannot exceed {MAX_SONGS} entries'})
+
+    for entry in entries:
+        if not entry.get('trackId') or not valid_rank(entry.get('rank')):
+            return response(400, {'success': False, 'error': f'Each entry needs a trackId and a rank from 1 to {MAX_SONGS}'})
+
+    if idempotency_key is not None and not IDEMPOTENCY_KEY_PATTERN.match(idempotency_key):
+        return response(400, {'success': False, 'error': 'Idempotency-Key must be 1-64 letters, digits or _.:-'})
 
     try:
-        ballots_table.put_item(Item={
-            'username': username,
-            'entries': entries,
-            'submittedAt': submitted_at,
-            'isRescinded': False,  # Clear rescinded flag on save
-        })
-        return response(200, {'success': True})
+        # Track metadata goes to the catalog once; the ballot only keeps {rank, trackId}
+        upsert_tracks({e['trackId']: e['track'] for e in entries if e.get('track') is not None})
+        entries = [{'rank': e['rank'], 'trackId': e['trackId']} for e in entries]
+        content_hash = entries_hash(entries)
+
+        # Write the ballot and the tally deltas in one transaction, retrying if
+        # another save for the same user (or a hot track) got there first
+        for attempt in range(TRANSACTION_RETRIES):
+            old = get_ballot_item(election_id, username, consistent=True)
+
+            if old and idempotency_key and idempotency_key in old.get('idempotencyKeys', []):
+                count('idempotentReplays')
+                return response(200, {'success': True, 'replayed': True})
+            # The transaction below is conditional on the revision read here, so an
+            # unchanged ballot can't have been replaced between this check and the reply
+            if old and not old.get('isRescinded') and stored_entries_hash(old) == content_hash:
+                count('unchangedSaves')
+                return response(200, {'success': True, 'unchanged': True})
+
+            ballot = {
+                'electionId': election_id,
+                'username': username,
+                'entries': entries,
+                'entriesHash': content_hash,
+                'submittedAt': submitted_at,
+                'isRescinded': False,  # Clear rescinded flag on save
+                'revision': next_revision(old),
+            }
+            if idempotency_key:
+                keys = [k for k in (old or {}).get('idempotencyKeys', []) if k != idempotency_key]
+                ballot['idempotencyKeys'] = [*keys, idempotency_key][-IDEMPOTENCY_KEYS_KEPT:]
+            try:
+                transact_write([
+                    {'Put': {'TableName': BALLOTS_TABLE, 'Item': storage_item(ballot), **revision_condition(old)}},
+                    *tally_operations(election_id, old, ballot),
+                ])
+                change_feed.publish(change_record(old, ballot))
+                return response(200, {'success': True})
+            except Exception as e:
+                if not is_transaction_conflict(e):
+                    raise
+                conflict_backoff(attempt)
+
+        return response(409, {'success': False, 'error': 'Ballot was modified concurrently, please retry'})
 
     except Exception as e:
         print(f"Save ballot error: {e}")
         return response(500, {'success': False, 'error': 'Failed to save ballot'})
 
 
-def handle_delete_ballot(username: str) -> dict[str, Any]:
+def handle_delete_ballot(election_id: str, username: str) -> dict[str, Any]:
     """Soft-delete a user's ballot by setting isRescinded flag."""
     if not username:
         return response(400, {'success': False, 'error': 'Username required'})
 
     try:
         # Soft delete - mark as rescinded instead of deleting
-        ballots_table.update_item(
-            Key={'username': username},
-            UpdateExpression='SET isRescinded = :val, rescindedAt = :time',
-            ExpressionAttributeValues={
-                ':val': True,
-                ':time': __import__('datetime').datetime.now().isoformat(),
-            },
-        )
-        return response(200, {'success': True})
+        for attempt in range(TRANSACTION_RETRIES):
+            old = get_ballot_item(election_id, username, consistent=True)
+            rescinded_at = datetime.now().isoformat()
+
+            if not old or old.get('isRescinded'):
+                # Nothing counted in the tally, so no aggregate update is needed
+                ballots_table.update_item(
+                    Key={'electionId': election_id, 'username': username},
+                    UpdateExpression='SET isRescinded = :val, rescindedAt = :time',
+                    ExpressionAttributeValues={':val': True, ':time': rescinded_at},
+                )
+                change_feed.publish(change_record(old, {**(old or {'electionId': election_id, 'username': username}), 'isRescinded': True, 'rescindedAt': rescinded_at}))
+                return response(200, {'success': True})
+
+            condition = revision_condition(old)
+            try:
+                transact_write([
+                    {'Update': {
+                        'TableName': BALLOTS_TABLE,
+                        'Key': {'electionId': election_id, 'username': username},
+                        'UpdateExpression': 'SET isRescinded = :val, rescindedAt = :time, #revision = :next',
+                        'ConditionExpression': condition['ConditionExpression'],
+                        'ExpressionAttributeNames': {**condition['ExpressionAttributeNames'], '#revision': 'revision'},
+                        'ExpressionAttributeValues': {
+                            **condition.get('ExpressionAttributeValues', {}),
+                            ':val': True,
+                            ':time': rescinded_at,
+                            ':next': next_revision(old),
+                        },
+                    }},
+                    *tally_operations(election_id, old, None),
+                ])
+                change_feed.publish(change_record(old, {
+                    **old, 'isRescinded': True, 'rescindedAt': rescinded_at, 'revision': next_revision(old),
+                }))
+                return response(200, {'success': True})
+            except Exception as e:
+                if not is_transaction_conflict(e):
+                    raise
+                conflict_backoff(attempt)
+
+        return response(409, {'success': False, 'error': 'Ballot was modified concurrently, please retry'})
 
     except Exception as e:
         print(f"Delete ballot error: {e}")
         return response(500, {'success': False, 'error': 'Failed to rescind ballot'})
 
 
-def handle_admin_get_ballots() -> dict[str, Any]:
-    """Get all ballots."""
+def handle_admin_get_ballots(election_id: str, query_params: dict[str, str]) -> dict[str, Any]:
+    """Get an election's ballots with one partition Query, optionally projected to ?fields=."""
+    try:
+        fields = parse_fields(query_params)
+    except ValueError as e:
+        return response(400, {'error': str(e)})
+
     try:
-        result = ballots_table.scan()
-        ballots = result.get('Items', [])
+        if query_params.get('format') == 'ndjson':
+            # Lambda buffers the body; local_server.py streams the same lines incrementally
+            return {
+                'statusCode': 200,
+                'headers': {**cors_headers(), 'Content-Type': 'application/x-ndjson'},
+                'body': ''.join(stream_admin_ballots(election_id, query_params)),
+            }
 
-        # Handle pagination if needed
-        while 'LastEvaluatedKey' in result:
-            result = ballots_table.scan(ExclusiveStartKey=result['LastEvaluatedKey'])
-            ballots.extend(result.get('Items', []))
+        if 'limit' in query_params or 'cursor' in query_params:
+            return handle_admin_get_ballots_page(election_id, query_params, fields)
 
-        return response(200, ballots)
+        return response(200, hydrate_ballots(list(election_ballots(election_id, fields))))
 
     except Exception as e:
         print(f"Admin get ballots error: {e}")
         return response(500, {'error': 'Failed to get ballots'})
 
 
-def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
-    """Lambda handler for ballot API. Supports both API Gateway and Function URL formats."""
+def handle_admin_get_ballots_page(election_id: str, query_params: dict[str, str], fields: list[str] | None) -> dict[str, Any]:
+    """Get one page of an election's ballots. The returned cursor is passed back as ?cursor= for the next page."""
+    try:
+        limit = int(query_params.get('limit', DEFAULT_PAGE_LIMIT))
+        if not 1 <= limit <= MAX_PAGE_LIMIT:
+            raise ValueError(f'Parameter "limit" must be between 1 and {MAX_PAGE_LIMIT}')
+        kwargs = {**election_query(election_id, stored_fields(fields)), 'Limit': limit}
+        if query_params.get('cursor'):
+            kwargs['ExclusiveStartKey'] = decode_cursor(query_params['cursor'])
+    except ValueError as e:
+        return response(400, {'error': str(e)})
+
+    result = ballots_table.query(**kwargs)
+    last_key = result.get('LastEvaluatedKey')
+    return response(200, {
+        'items': hydrate_ballots([decode_ballot(item) for item in result.get('Items', [])]),
+        'cursor': encode_cursor(last_key) if last_key else None,
+    })
+
+
+def handle_admin_get_results(election_id: str, query_params: dict[str, str]) -> dict[str, Any]:
+    """Get ranked results for one algorithm, limited to the top N tracks."""
+    algorithm = query_params.get('algorithm', 'borda')
+    if algorithm not in ALGORITHMS + METHODS:
+        return response(400, {'error': f'Unknown algorithm. Expected one of: {", ".join(ALGORITHMS + METHODS)}'})
+
+    try:
+        top = int(query_params.get('top', 100))
+        min_votes = int(query_params.get('minVotes', METHOD_MIN_VOTES))
+    except ValueError:
+        return response(400, {'error': 'Parameters "top" and "minVotes" must be integers'})
+    if top < 1:
+        return response(400, {'error': 'Parameter "top" must be at least 1'})
+
+    if algorithm in METHODS:
+        return handle_admin_get_method_results(election_id, algorithm, top, max(min_votes, 1))
+
+    try:
+        tally = election_tally(election_id)
+        results = tally.rankings(algorithm, top)
+        hydrate_entries(results)
+        return response(200, {
+            'algorithm': algorithm,
+            'stats': tally.stats(),
+            'results': results,
+        })
+
+    except Exception as e:
+        print(f"Admin get results error: {e}")
+        return response(500, {'error': 'Failed to get results'})
+
+
+def handle_admin_get_method_results(election_id: str, method: str, top: int, min_votes: int) -> dict[str, Any]:
+    """Get IRV/Schulze/Copeland results, which need the ballots rather than the aggregate."""
+    try:
+        packed = pack_ballots(election_ballots(election_id, fields=['entries', 'isRescinded']))
+        results, stats = method_results(packed, method, top, min_votes, METHOD_MAX_CANDIDATES)
+        hydrate_entries(results)
+        return response(200, {
+            'algorithm': method,
+            'stats': stats,
+            'results': results,
+        })
+
+    except Exception as e:
+        print(f"Admin get method results error: {e}")
+        return response(500, {'error': 'Failed to get results'})
+
+
+def stability_params(query_params: dict[str, str]) -> dict[str, Any]:
+    """Validate the rank stability parameters: ?top=, ?resamples=, ?seed=, ?budgetMs= and ?confidence=."""
+    try:
+        top = int(query_params.get('top', 100))
+        resamples = int(query_params.get('resamples', 1000))
+        seed = int(query_params.get('seed', 0))
+        budget_ms = int(query_params.get('budgetMs', STABILITY_BUDGET_MS))
+        confidence = float(query_params.get('confidence', 0.95))
+    except ValueError:
+        raise ValueError('Parameters "top", "resamples", "seed" and "budgetMs" must be integers and "confidence" a number')
+    if top < 1:
+        raise ValueError('Parameter "top" must be at least 1')
+    if not 1 <= resamples <= MAX_STABILITY_RESAMPLES:
+        raise ValueError(f'Parameter "resamples" must be between 1 and {MAX_STABILITY_RESAMPLES}')
+    if not 0 < confidence < 1:
+        raise ValueError('Parameter "confidence" must be between 0 and 1')
+    return {
+        'top': top,
+        'resamples': resamples,
+        'seed': seed,
+        'budget': min(max(budget_ms, 0), STABILITY_BUDGET_MS) / 1000,
+        'confidence': confidence,
+    }
+
+
+def handle_admin_results_stability(election_id: str, query_params: dict[str, str]) -> dict[str, Any]:
+    """Bootstrap rank intervals for every scoring algorithm's top N tracks."""
+    try:
+        params = stability_params(query_params)
+    except ValueError as e:
+        return response(400, {'error': str(e)})
+
+    try:
+        packed = pack_ballots(election_ballots(election_id, fields=['entries', 'isRescinded']))
+        with phase('resample'):
+            report = rank_stability(packed, workers=STABILITY_WORKERS, **params)
+        count('resamples', report['resamples'])
+        hydrate_entries([r for results in report['algorithms'].values() for r in results])
+        return response(200, {'election': election_id, **report})
+
+    except Exception as e:
+        print(f"Admin results stability error: {e}")
+        return response(500, {'error': 'Failed to compute rank stability'})
+
+
+def live_results_params(query_params: dict[str, str]) -> tuple[str, int]:
+    """Validate ?algorithm= and ?top= for live results, which only follow the scoring algorithms."""
+    algorithm = query_params.get('algorithm', 'borda')
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Live results support: {", ".join(ALGORITHMS)}')
+    try:
+        top = int(query_params.get('top', 100))
+    except ValueError:
+        raise ValueError('Parameter "top" must be an integer')
+    if top < 1:
+        raise ValueError('Parameter "top" must be at least 1')
+    return algorithm, top
+
+
+def live_leaderboard(election_id: str, algorithm: str, top: int, undo: list[dict[str, Any]] | None = None) -> Leaderboard:
+    """A leaderboard from the election's tally aggregate, with `undo` change records reverted."""
+    tally = election_tally(election_id)
+    for record in reversed(undo or []):
+        tally.apply_deltas(*record_deltas(record, undo=True))
+    return Leaderboard(tally, algorithm, top)
+
+
+def live_results_events(
+    election_id: str,
+    query_params: dict[str, str],
+    last_event_id: str | None = None,
+    follow: bool = True,
+) -> Iterator[str]:
+    """Server-Sent Events with an election's top N for one scoring algorithm, then only what changes.
+
+    The first message is a `snapshot` (the GET /admin/results body). Each ballot
+    save or rescind after it sends a `delta` with the entries whose rank, score
+    or votes changed, the IDs that left the top N and a checksum of the new order.
+    Every message's id is a change feed cursor, so a reconnect with Last-Event-ID
+    resumes where the viewer left off, or gets a new snapshot if that is too old.
+
+    With `follow` the stream runs until the client disconnects (local_server.py).
+    Without it, it ends after one snapshot, one delta or LIVE_POLL_SECONDS of no
+    changes: Python Lambdas can't stream a response, so Function URL viewers
+    long-poll, and EventSource reconnects by itself after each response.
+
+    Raises ValueError for invalid parameters before anything is read.
+    """
+    algorithm, top = live_results_params(query_params)
+
+    def events() -> Iterator[str]:
+        cursor = last_event_id
+        board = None
+        while True:
+            if cursor is None:
+                # Position the cursor before the tally read, so no change falls between them. A
+                # write landing in between is in the tally and read again; without `follow` the
+                # next request undoes what it reads from a fresh tally, so it isn't counted twice
+                cursor = change_feed.latest()
+                board = live_leaderboard(election_id, algorithm, top)
+                snapshot = board.snapshot()
+                hydrate_entries(snapshot['results'])
+                yield sse('snapshot', snapshot, cursor, retry=LIVE_RETRY_MS)
+                if not follow:
+                    return
+                continue
+
+            try:
+                records, cursor_after = change_feed.read(cursor, LIVE_HEARTBEAT_SECONDS if follow else LIVE_POLL_SECONDS)
+            except CursorExpired:
+                cursor = None
+                continue
+            records = [r for r in records if r['dynamodb']['Keys'].get('electionId') == election_id]
+
+            delta = None
+            if records:
+                if board is None:
+                    # Resuming from Last-Event-ID: the tally already includes these records
+                    board = live_leaderboard(election_id, algorithm, top, undo=records)
+                count('liveChanges', len(records))
+                delta = board.apply(records)
+            cursor = cursor_after
+            if delta:
+                hydrate_entries([change for change in delta['changes'] if 'track' in change])
+                yield sse('delta', delta, cursor)
+            else:
+                # Keeps the connection alive and the client's Last-Event-ID current
+                yield sse(event_id=cursor)
+            if not follow:
+                return
+
+    return events()
+
+
+def handle_admin_results_stream(election_id: str, query_params: dict[str, str], last_event_id: str | None) -> dict[str, Any]:
+    """Answer GET /admin/results/stream with the next live results events (see live_results_events)."""
+    try:
+        events = live_results_events(election_id, query_params, last_event_id, follow=False)
+    except ValueError as e:
+        return response(400, {'error': str(e)})
 
-    # Function URL uses requestContext.http, API Gateway uses httpMethod directly
-    if 'requestContext' in event and 'http' in event.get('requestContext', {}):
-        # Function URL format
-        method = event['requestContext']['http']['method']
-        path = event.get('rawPath', '')
-    else:
-        # API Gateway format (also used by local server)
-        method = event.get('httpMethod', '')
-        path = event.get('path', '')
-
-    # Handle CORS preflight
-    if method == 'OPTIONS':
+    try:
         return {
             'statusCode': 200,
-            'headers': cors_headers(),
-            'body': '',
+            'headers': {**cors_headers(), 'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'},
+            'body': ''.join(events),
         }
 
-    # Parse body for POST/PUT
-    body = {}
-    if event.get('body'):
+    except Exception as e:
+        print(f"Admin results stream error: {e}")
+        return response(500, {'error': 'Failed to get live results'})
+
+
+@instrument('ballot')
+def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
+    """Lambda handler for ballot API. Supports both API Gateway and Function URL formats."""
+
+    # Direct invocation (the vote-close schedule or `aws lambda invoke`), never reachable via the URL
+    if event.get('action') == 'finalize':
+        set_route('INVOKE', 'finalize')
+        return publish_results(election_id=parse_election(event.get('electionId')))
+
+    with phase('route'):
+        result = route_request(event)
+    with phase('serialize'):
+        return compress_response(result, event.get('headers'))
+
+
+def request_header(event: dict[str, Any], name: str) -> str | None:
+    """A request header's value, matched case-insensitively (Function URLs lowercase names)."""
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def route_request(event: dict[str, Any]) -> dict[str, Any]:
+    """Dispatch an HTTP event to its handler."""
+    with phase('parse'):
+        # Function URL uses requestContext.http, API Gateway uses httpMethod directly
+        if 'requestContext' in event and 'http' in event.get('requestContext', {}):
+            # Function URL format
+            method = event['requestContext']['http']['method']
+            path = event.get('rawPath', '')
+        else:
+            # API Gateway format (also used by local server)
+            method = event.get('httpMethod', '')
+            path = event.get('path', '')
+
+        # Handle CORS preflight
+        if method == 'OPTIONS':
+            set_route(method, '*')
+            return {
+                'statusCode': 200,
+                'headers': cors_headers(),
+                'body': '',
+            }
+
+        query_params = event.get('queryStringParameters') or {}
+
+        # Parse body for POST/PUT
+        body = {}
+        if event.get('body'):
+            try:
+                body = json.loads(event['body'])
+            except json.JSONDecodeError:
+                set_route(method, 'invalid')
+                return response(400, {'error': 'Invalid JSON body'})
+
+        # Every ballot and result belongs to one election
         try:
-            body = json.loads(event['body'])
-        except json.JSONDecodeError:
-            return response(400, {'error': 'Invalid JSON body'})
+            body_election = body.get('electionId') if isinstance(body, dict) else None
+            election_id = parse_election(query_params.get('electionId') or body_election)
+        except ValueError as e:
+            set_route(method, 'invalid')
+            return response(400, {'error': str(e)})
 
     # Route handling
+    if '/admin/results/stream' in path:
+        set_route(method, '/admin/results/stream')
+        if method == 'GET':
+            # EventSource sends Last-Event-ID when it reconnects
+            last_event_id = request_header(event, 'last-event-id') or query_params.get('lastEventId')
+            return handle_admin_results_stream(election_id, query_params, last_event_id)
+        return response(405, {'error': 'Method not allowed'})
+
+    if '/admin/results/stability' in path:
+        set_route(method, '/admin/results/stability')
+        if method == 'GET':
+            return handle_admin_results_stability(election_id, query_params)
+        return response(405, {'error': 'Method not allowed'})
+
+    if '/admin/results' in path:
+        set_route(method, '/admin/results')
+        if method == 'GET':
+            return handle_admin_get_results(election_id, query_params)
+        return response(405, {'error': 'Method not allowed'})
+
     if '/admin/ballots' in path:
+        set_route(method, '/admin/ballots')
         if method == 'GET':
-            return handle_admin_get_ballots()
+            return handle_admin_get_ballots(election_id, query_params)
         return response(405, {'error': 'Method not allowed'})
 
     if '/ballot' in path:
+        set_route(method, '/ballot')
         # Extract username from path if present
         path_parts = path.rstrip('/').split('/')
         path_username = None
@@ -186,36 +1145,112 @@ def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
             path_username = path_parts[-1]
 
         if method == 'GET' and path_username:
-            return handle_get_ballot(path_username)
+            return handle_get_ballot(election_id, path_username)
         elif method == 'POST':
-            return handle_save_ballot(body)
+            return handle_save_ballot(election_id, body, request_header(event, 'idempotency-key'))
         elif method == 'DELETE' and path_username:
-            return handle_delete_ballot(path_username)
+            return handle_delete_ballot(election_id, path_username)
         return response(405, {'error': 'Method not allowed'})
 
+    set_route(method, 'unknown')
     return response(404, {'error': 'Not found'})
 
 
 # For local testing
 if __name__ == '__main__':
+    import copy
+
     # Simulate DynamoDB with mocks
+    def apply_update(item, expression, names=None, values=None):
+        """Apply the simple SET/ADD update expressions used above to a dict."""
+        names, values = names or {}, values or {}
+        for action, clauses in re.findall(r'(SET|ADD) (.*?)(?= SET | ADD |$)', expression):
+            for clause in clauses.split(', '):
+                if action == 'ADD':
+                    name, value = clause.split(' ')
+                    name = names.get(name, name)
+                    item[name] = item.get(name, 0) + values[value]
+                else:
+                    name, value = clause.split(' = ')
+                    name = names.get(name, name)
+                    if value.startswith('if_not_exists'):
+                        item.setdefault(name, values[value.split(', ')[1].rstrip(')')])
+                    else:
+                        item[name] = values[value]
+
     class MockTable:
-        def __init__(self):
+        def __init__(self, *keys):
+            self.keys = keys
             self.data = {}
 
-        def get_item(self, Key):
-            return {'Item': self.data.get(Key.get('username'))}
+        def _key(self, item):
+            return tuple(item[k] for k in self.keys)
 
-        def put_item(self, Item):
-            self.data[Item['username']] = Item
+        def get_item(self, Key, **kwargs):
+            return {'Item': copy.deepcopy(self.data.get(self._key(Key)))}
+
+        def put_item(self, Item, **kwargs):
+            self.data[self._key(Item)] = Item
+
+        def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, **kwargs):
+            item = self.data.setdefault(self._key(Key), dict(Key))
+            apply_update(item, UpdateExpression, kwargs.get('ExpressionAttributeNames'), ExpressionAttributeValues)
 
         def delete_item(self, Key):
-            self.data.pop(Key.get('username'), None)
+            self.data.pop(self._key(Key), None)
+
+        def batch_writer(self):
+            return self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def _page(self, keys, Limit=None, ExclusiveStartKey=None):
+            if ExclusiveStartKey:
+                keys = [k for k in keys if k > self._key(ExclusiveStartKey)]
+            if Limit is None or len(keys) <= Limit:
+                return {'Items': [copy.deepcopy(self.data[k]) for k in keys]}
+            return {
+                'Items': [copy.deepcopy(self.data[k]) for k in keys[:Limit]],
+                'LastEvaluatedKey': dict(zip(self.keys, keys[Limit - 1])),
+            }
+
+        def scan(self, Segment=0, TotalSegments=1, Limit=None, ExclusiveStartKey=None, **kwargs):
+            return self._page(sorted(self.data)[Segment::TotalSegments], Limit, ExclusiveStartKey)
+
+        def query(self, ExpressionAttributeValues, Limit=None, ExclusiveStartKey=None, **kwargs):
+            keys = [k for k in sorted(self.data) if k[0] == ExpressionAttributeValues[':election']]
+            return self._page(keys, Limit, ExclusiveStartKey)
+
+    ballots_table = MockTable('electionId', 'username')
+    tally_table = MockTable('electionId', 'trackId')
+    tracks_table = MockTable('trackId')
 
-        def scan(self):
-            return {'Items': list(self.data.values())}
+    class MockResource:
+        def batch_get_item(self, RequestItems):
+            keys = RequestItems[TRACKS_TABLE]['Keys']
+            items = [tracks_table.data[(k['trackId'],)] for k in keys if (k['trackId'],) in tracks_table.data]
+            return {'Responses': {TRACKS_TABLE: items}}
 
-    ballots_table = MockTable()
+    dynamodb = MockResource()
+
+    def transact_write(operations):
+        tables = {BALLOTS_TABLE: ballots_table, TALLY_TABLE: tally_table}
+        for operation in operations:
+            for kind, params in operation.items():
+                table = tables[params['TableName']]
+                if kind == 'Put':
+                    table.put_item(params['Item'])
+                else:
+                    table.update_item(
+                        params['Key'],
+                        params['UpdateExpression'],
+                        params['ExpressionAttributeValues'],
+                        ExpressionAttributeNames=params.get('ExpressionAttributeNames'),
+                    )
 
     # Test save ballot
     print("Testing save ballot...")
@@ -224,12 +1259,46 @@ if __name__ == '__main__':
         'path': '/ballot',
         'body': json.dumps({
             'username': 'hen',
-            'entries': [{'rank': i, 'trackId': f'track{i}'} for i in range(1, 21)],
+            'entries': [
+                {'rank': i, 'trackId': f'track{i}', 'track': {'id': f'track{i}', 'name': f'Song {i}'}}
+                for i in range(1, 21)
+            ],
             'submittedAt': '2025-01-01T00:00:00Z',
         }),
     }, None)
     print(result)
 
+    # Test re-save with a different order (applies deltas against the first save)
+    lambda_handler({
+        'httpMethod': 'POST',
+        'path': '/ballot',
+        'body': json.dumps({
+            'username': 'hen',
+            'entries': [{'rank': i, 'trackId': f'track{21 - i}'} for i in range(1, 21)],
+            'submittedAt': '2025-01-02T00:00:00Z',
+        }),
+    }, None)
+
+    # Test an unchanged re-save, then a save retried with the same Idempotency-Key
+    print("\nTesting unchanged and retried saves...")
+    def save(ranks, idempotency_key=None):
+        return lambda_handler({
+            'httpMethod': 'POST',
+            'path': '/ballot',
+            'headers': {'Idempotency-Key': idempotency_key} if idempotency_key else {},
+            'body': json.dumps({
+                'username': 'hen',
+                'entries': [{'rank': i, 'trackId': f'track{ranks(i)}'} for i in range(20, 0, -1)],
+                'submittedAt': '2025-01-03T00:00:00Z',
+            }),
+        }, None)['body']
+    hen = (ELECTION_ID, 'hen')
+    revision = ballots_table.data[hen]['revision']
+    print(save(lambda i: 21 - i))
+    assert ballots_table.data[hen]['revision'] == revision
+    print(save(lambda i: i, 'save-3'), save(lambda i: i, 'save-3'))
+    assert ballots_table.data[hen]['revision'] == revision + 1
+
     # Test get ballot
     print("\nTesting get ballot...")
     result = lambda_handler({
@@ -237,3 +1306,91 @@ if __name__ == '__main__':
         'path': '/ballot/hen',
     }, None)
     print(result)
+
+    # Test that another election's ballot stays out of this election's query and tally
+    print("\nTesting admin ballots (one election's partition)...")
+    lambda_handler({
+        'httpMethod': 'POST',
+        'path': '/ballot',
+        'body': json.dumps({'electionId': '2024', 'username': 'hen', 'entries': [{'rank': 1, 'trackId': 'old1'}]}),
+    }, None)
+    result = lambda_handler({
+        'httpMethod': 'GET',
+        'path': '/admin/ballots',
+        'queryStringParameters': {'fields': 'electionId,username,submittedAt'},
+    }, None)
+    print(result['statusCode'], json.loads(result['body']))
+    assert 'old1' not in {item['trackId'] for item in query_election(tally_table, ELECTION_ID)}
+
+    # Test cursor pagination and NDJSON
+    print("\nTesting admin ballots (paginated + ndjson)...")
+    for name in ('alice', 'bob'):
+        ballots_table.put_item({'electionId': ELECTION_ID, 'username': name, 'entries': [], 'isRescinded': True})
+    cursor, pages = None, 0
+    while True:
+        params = {'limit': '2', **({'cursor': cursor} if cursor else {})}
+        page = json.loads(lambda_handler({
+            'httpMethod': 'GET', 'path': '/admin/ballots', 'queryStringParameters': params,
+        }, None)['body'])
+        pages += 1
+        cursor = page['cursor']
+        if not cursor:
+            break
+    print(f"{pages} pages")
+    result = lambda_handler({
+        'httpMethod': 'GET',
+        'path': '/admin/ballots',
+        'queryStringParameters': {'format': 'ndjson', 'fields': 'username'},
+    }, None)
+    print(result['body'])
+
+    # Test results
+    print("\nTesting admin results...")
+    result = lambda_handler({
+        'httpMethod': 'GET',
+        'path': '/admin/results',
+        'queryStringParameters': {'algorithm': 'harmonic', 'top': '3'},
+    }, None)
+    print(result)
+    result = lambda_handler({
+        'httpMethod': 'GET',
+        'path': '/admin/results',
+        'queryStringParameters': {'algorithm': 'schulze', 'top': '3', 'minVotes': '1'},
+    }, None)
+    print(result)
+    result = lambda_handler({
+        'httpMethod': 'GET',
+        'path': '/admin/results/stability',
+        'queryStringParameters': {'top': '2', 'resamples': '50', 'seed': '1'},
+    }, None)
+    print(result)
+    stability = json.loads(result['body'])
+    assert result['statusCode'] == 200 and stability['resamples'] == 50, stability
+    assert all(len(results) == 2 for results in stability['algorithms'].values()), stability
+
+    # Test live results: a snapshot, then the delta a rescind causes, resumed from its id
+    print("\nTesting live results...")
+    def live(last_event_id=None):
+        return lambda_handler({
+            'httpMethod': 'GET',
+            'path': '/admin/results/stream',
+            'headers': {'Last-Event-ID': last_event_id} if last_event_id else {},
+            'queryStringParameters': {'algorithm': 'borda', 'top': '3'},
+        }, None)['body']
+    snapshot_event = live()
+    print(snapshot_event)
+    last_event_id = re.search(r'^id: (.*)$', snapshot_event, re.M).group(1)
+
+    # Test rescind, then check the aggregate against a full rebuild
+    print("\nTesting rescind + tally rebuild check...")
+    lambda_handler({'httpMethod': 'DELETE', 'path': '/ballot/hen'}, None)
+    print(rebuild_tally(apply=False))
+    print(live(last_event_id))
+
+    print("\nTesting results snapshot...")
+    import tempfile
+    import snapshot
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = publish_results(snapshot.DirectoryTarget(directory))
+        with open(os.path.join(directory, manifest['files']['schulze'].lstrip('/'))) as f:
+            print(manifest['files'].keys(), json.load(f)['stats'])
@@ -0,0 +1,332 @@
+"""
+Live Results
+Change feed of ballot writes and a leaderboard kept current from it, for the
+Server-Sent Events endpoint GET /admin/results/stream.
+
+Change records follow the DynamoDB Streams model: one record per ballot
+write, with the ballot before and after as OldImage / NewImage. In AWS they
+come from the ballots table's stream (StreamChangeFeed), so the write itself
+is the publish. Locally, the ballot Lambda publishes each record to an
+in-process queue (MemoryChangeFeed) after its write commits.
+
+A Leaderboard holds one scoring algorithm's tally, applies each record's
+tally deltas, and reports only the top-N entries whose rank, score or votes
+changed. Viewers never rescan the ballots.
+"""
+import base64
+import json
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Iterable
+
+from ballot_codec import decode_ballot
+from dynamo import DynamoDB, deserialize_item, error_code
+from instrumentation import phase
+from serialization import dumps
+from tally import Tally, rank_counts, tally_deltas
+
+
+class CursorExpired(Exception):
+    """The reader's position is no longer in the feed; it must start again from a snapshot."""
+
+
+def change_record(old: dict[str, Any] | None, new: dict[str, Any] | None) -> dict[str, Any]:
+    """A stream-shaped record for replacing ballot `old` with `new` (either may be None)."""
+    ballot = new or old or {}
+    data: dict[str, Any] = {'Keys': {'electionId': ballot.get('electionId'), 'username': ballot.get('username')}}
+    if old is not None:
+        data['OldImage'] = old
+    if new is not None:
+        data['NewImage'] = new
+    event_name = 'INSERT' if old is None else 'REMOVE' if new is None else 'MODIFY'
+    return {'eventName': event_name, 'dynamodb': data}
+
+
+def record_deltas(record: dict[str, Any], undo: bool = False) -> tuple[dict[str, dict[int, int]], int]:
+    """Tally deltas and voter count change for a record (or for reverting it, with `undo`)."""
+    old = record['dynamodb'].get('OldImage')
+    new = record['dynamodb'].get('NewImage')
+    if undo:
+        old, new = new, old
+    return tally_deltas(old, new), bool(rank_counts(new)) - bool(rank_counts(old))
+
+
+class MemoryChangeFeed:
+    """In-process stand-in for the ballots table's stream.
+
+    Records are numbered from 1 and the last `size` are kept. A cursor is the
+    last sequence number its reader has seen.
+    """
+
+    def __init__(self, size: int = 10000) -> None:
+        self._records: deque[dict[str, Any]] = deque(maxlen=size)
+        self._sequence = 0
+        self._changed = threading.Condition()
+
+    def publish(self, record: dict[str, Any]) -> None:
+        with self._changed:
+            self._sequence += 1
+            self._records.append({**record, 'dynamodb': {**record['dynamodb'], 'SequenceNumber': str(self._sequence)}})
+            self._changed.notify_all()
+
+    def latest(self) -> str:
+        with self._changed:
+            return str(self._sequence)
+
+    def read(self, cursor: str, timeout: float) -> tuple[list[dict[str, Any]], str]:
+        """Records after `cursor`, waiting up to `timeout` seconds for the first. Returns them and the new cursor."""
+        try:
+            after = int(cursor)
+        except ValueError:
+            raise CursorExpired(cursor)
+
+        with self._changed:
+            if after > self._sequence:
+                raise CursorExpired(cursor)  # From before a restart
+            self._changed.wait_for(lambda: self._sequence > after, timeout)
+            oldest = self._sequence - len(self._records) + 1
+            if after + 1 < oldest:
+                raise CursorExpired(cursor)
+            return list(self._records)[after + 1 - oldest:], str(self._sequence)
+
+
+class StreamChangeFeed:
+    """Change records read from the ballots table's DynamoDB stream (NEW_AND_OLD_IMAGES view).
+
+    The table write is the publish, so publish() does nothing. A cursor holds
+    the next shard iterator for each shard being read. Iterators expire after
+    15 minutes, after which read() raises CursorExpired.
+
+    GetRecords allows 5 calls per second per shard across every reader, so the
+    viewers in one container share a single poller: each shard is read at most
+    once per POLL_INTERVAL, and the records behind an iterator are fetched once
+    and handed to every viewer at that position. New viewers start from the
+    container's shared position rather than an iterator of their own. When
+    readers in other containers push the shard over its limit, the poller backs
+    off and viewers get no records until it recovers, rather than an error.
+    """
+
+    POLL_INTERVAL = 1.0
+    # Doubled after each LimitExceededException, up to MAX_BACKOFF seconds
+    MAX_BACKOFF = 16.0
+    # GetRecords results kept for viewers at the same position
+    RESULTS_KEPT = 256
+
+    def __init__(self, db: DynamoDB, stream_arn: str) -> None:
+        self.db = db
+        self.stream_arn = stream_arn
+        self._results: OrderedDict[str, tuple[list[dict[str, Any]], str | None]] = OrderedDict()
+        self._head: dict[str, str] | None = None
+        self._shard_locks: dict[str, threading.Lock] = {}
+        self._polled_at: dict[str, float] = {}
+        self._backoff = 0.0
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {'getRecords': 0, 'shared': 0, 'throttled': 0}
+
+    def publish(self, record: dict[str, Any]) -> None:
+        pass
+
+    def _shards(self) -> list[dict[str, Any]]:
+        shards: list[dict[str, Any]] = []
+        kwargs: dict[str, Any] = {}
+        while True:
+            with phase('dynamodb'):
+                result = self.db.streams_client.describe_stream(StreamArn=self.stream_arn, **kwargs)
+            description = result['StreamDescription']
+            shards += description.get('Shards', [])
+            if not description.get('LastEvaluatedShardId'):
+                return shards
+            kwargs['ExclusiveStartShardId'] = description['LastEvaluatedShardId']
+
+    def _iterator(self, shard_id: str, iterator_type: str) -> str:
+        with phase('dynamodb'):
+            return self.db.streams_client.get_shard_iterator(
+                StreamArn=self.stream_arn, ShardId=shard_id, ShardIteratorType=iterator_type,
+            )['ShardIterator']
+
+    @staticmethod
+    def _encode(iterators: dict[str, str]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(iterators).encode()).decode()
+
+    @staticmethod
+    def _decode(cursor: str) -> dict[str, str]:
+        try:
+            iterators = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise CursorExpired(cursor)
+        if not isinstance(iterators, dict):
+            raise CursorExpired(cursor)
+        return iterators
+
+    @staticmethod
+    def _plain(record: dict[str, Any]) -> dict[str, Any]:
+        stream_data = record['dynamodb']
+        data = {'Keys': deserialize_item(stream_data['Keys']), 'SequenceNumber': stream_data['SequenceNumber']}
+        for image in ('OldImage', 'NewImage'):
+            if image in stream_data:
+                data[image] = decode_ballot(deserialize_item(stream_data[image]))
+        return {'eventName': record['eventName'], 'dynamodb': data}
+
+    def latest(self) -> str:
+        """The container's shared position, taken from the open shards' LATEST on first use."""
+        with self._lock:
+            if self._head is None:
+                open_shards = [
+                    shard['ShardId'] for shard in self._shards()
+                    if 'EndingSequenceNumber' not in shard.get('SequenceNumberRange', {})
+                ]
+                self._head = {shard_id: self._iterator(shard_id, 'LATEST') for shard_id in open_shards}
+            return self._encode(self._head)
+
+    def _get_records(self, shard_id: str, iterator: str, deadline: float) -> tuple[list[dict[str, Any]], str | None] | None:
+        """The records at `iterator` and the next iterator, or None if the shard can't be polled before `deadline`."""
+        with self._lock:
+            lock = self._shard_locks.setdefault(shard_id, threading.Lock())
+        if not lock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            return None
+        try:
+            # Another viewer at this position may have just fetched it
+            if iterator in self._results:
+                self.counters['shared'] += 1
+                return self._results[iterator]
+
+            due = max(self._polled_at.get(shard_id, 0.0) + self.POLL_INTERVAL, self._resume_at)
+            if due > deadline:
+                return None
+            time.sleep(max(0.0, due - time.monotonic()))
+            self._polled_at[shard_id] = time.monotonic()
+            self.counters['getRecords'] += 1
+            try:
+                with phase('dynamodb'):
+                    result = self.db.streams_client.get_records(ShardIterator=iterator, Limit=1000)
+            except Exception as e:
+                code = error_code(e)
+                if code == 'LimitExceededException':
+                    self.counters['throttled'] += 1
+                    self._backoff = min(self.MAX_BACKOFF, self._backoff * 2 or self.POLL_INTERVAL)
+                    self._resume_at = time.monotonic() + random.uniform(self._backoff / 2, self._backoff)
+                    return None
+                if code in ('ExpiredIteratorException', 'TrimmedDataAccessException', 'ResourceNotFoundException'):
+                    raise CursorExpired(iterator)
+                raise
+            self._backoff = 0.0
+
+            fetched = ([self._plain(r) for r in result.get('Records', [])], result.get('NextShardIterator'))
+            self._results[iterator] = fetched
+            while len(self._results) > self.RESULTS_KEPT:
+                self._results.popitem(last=False)
+            return fetched
+        finally:
+            lock.release()
+
+    def _advance(self, iterators: dict[str, str], shard_id: str, next_iterator: str | None) -> None:
+        del iterators[shard_id]
+        if next_iterator:
+            iterators[shard_id] = next_iterator
+        else:
+            # The shard closed (they roll over every few hours); carry on from its children
+            for shard in self._shards():
+                if shard.get('ParentShardId') == shard_id:
+                    iterators[shard['ShardId']] = self._iterator(shard['ShardId'], 'TRIM_HORIZON')
+
+    def read(self, cursor: str, timeout: float) -> tuple[list[dict[str, Any]], str]:
+        """Records after `cursor`, polling up to `timeout` seconds for the first. Returns them and the new cursor."""
+        iterators = self._decode(cursor)
+        deadline = time.monotonic() + timeout
+        while True:
+            records = []
+            for shard_id, iterator in list(iterators.items()):
+                try:
+                    fetched = self._get_records(shard_id, iterator, deadline)
+                except CursorExpired:
+                    with self._lock:
+                        if self._head and self._head.get(shard_id) == iterator:
+                            self._head = None  # Expired for every viewer; start again from LATEST
+                    raise CursorExpired(cursor)
+                if fetched is None:
+                    continue
+                shard_records, next_iterator = fetched
+                records += shard_records
+                self._advance(iterators, shard_id, next_iterator)
+                with self._lock:
+                    # Keep the shared position moving so new viewers start close to now
+                    if self._head is not None and self._head.get(shard_id) == iterator:
+                        self._advance(self._head, shard_id, next_iterator)
+
+            if records or time.monotonic() >= deadline:
+                return records, self._encode(iterators)
+            time.sleep(min(self.POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+
+def ranking_checksum(results: list[dict[str, Any]]) -> str:
+    """FNV-1a hash of the ranked track IDs; the frontend recomputes it to check its copy is in sync."""
+    value = 0x811C9DC5
+    for byte in ','.join(r['trackId'] for r in results).encode():
+        value = ((value ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return f'{value:08x}'
+
+
+class Leaderboard:
+    """One algorithm's top-N, kept current by applying change records to its tally."""
+
+    def __init__(self, tally: Tally, algorithm: str, top: int) -> None:
+        self.tally = tally
+        self.algorithm = algorithm
+        self.top = top
+        self.results = tally.rankings(algorithm, top)
+        self.stats = tally.stats()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {'algorithm': self.algorithm, 'stats': self.stats, 'results': [dict(r) for r in self.results]}
+
+    def apply(self, records: Iterable[dict[str, Any]]) -> dict[str, Any] | None:
+        """Apply records and return what changed in the top-N, or None if nothing visible did.
+
+        `changes` lists entries that entered or whose rank, score or votes changed,
+        with their new 1-based `rank`. Only entries new to the top-N carry `track`
+        (None until the caller hydrates it). `removed` lists track IDs that left.
+        """
+        for record in records:
+            deltas, voters = record_deltas(record)
+            self.tally.apply_deltas(deltas, voters)
+
+        before = {r['trackId']: (rank, r) for rank, r in enumerate(self.results, 1)}
+        stats_before = self.stats
+        self.results = self.tally.rankings(self.algorithm, self.top)
+        self.stats = self.tally.stats()
+
+        changes = []
+        for rank, result in enumerate(self.results, 1):
+            previous_rank, previous = before.pop(result['trackId'], (None, None))
+            if previous is None:
+                changes.append({**result, 'rank': rank, 'previousRank': None})
+            elif (rank, result['score'], result['votes']) != (previous_rank, previous['score'], previous['votes']):
+                # The viewer already has this track's metadata
+                moved = {k: v for k, v in result.items() if k != 'track'}
+                changes.append({**moved, 'rank': rank, 'previousRank': previous_rank})
+
+        if not changes and not before and self.stats == stats_before:
+            return None
+        return {
+            'stats': self.stats,
+            'changes': changes,
+            'removed': list(before),
+            'checksum': ranking_checksum(self.results),
+        }
+
+
+def sse(event: str | None = None, data: Any = None, event_id: str | None = None, retry: int | None = None) -> str:
+    """One Server-Sent Events message. With only `event_id` it updates the client's Last-Event-ID."""
+    lines = []
+    if retry is not None:
+        lines.append(f'retry: {retry}')
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    if data is not None:
+        lines.append(f'data: {dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
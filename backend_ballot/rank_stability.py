@@ -0,0 +1,291 @@
+"""
+Rank Stability
+Bootstrap confidence intervals for each track's rank under every scoring
+algorithm, for GET /admin/results/stability.
+
+Each resample draws the electorate again with replacement (a voter drawn k
+times counts k times) and reranks every track under all five algorithms.
+Across resamples that gives each track a distribution of ranks; a track whose
+interval straddles the countdown cut-off genuinely could have landed either
+side of it.
+
+Resample i is seeded from (seed, i) alone, so a given seed always gives the
+same ranks whatever the worker count, chunking or NumPy availability. Scores
+are summed from exact weighted (track, rank) counts in rank order on both
+paths, so ties break identically too.
+
+Resamples are spread over a ProcessPoolExecutor whose workers attach to one
+shared memory copy of the packed (track, rank, voter) arrays rather than
+receiving them per task. Where processes or shared memory are unavailable
+(AWS Lambda has no /dev/shm) they run serially in-process instead. Either way
+resampling stops at the time budget and reports how many resamples finished.
+"""
+import math
+import multiprocessing
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any
+
+from tally import ALGORITHMS, MAX_SONGS, PackedBallots, numpy, score, tally_packed, use_numpy
+
+# (track, rank) counts are kept as track * _WIDTH + rank
+_WIDTH = MAX_SONGS + 1
+
+# Points by [rank][algorithm]; row 0 is unused
+_POINT_TABLE = [(0.0,) * len(ALGORITHMS)] + [
+    tuple(score(a, rank) for a in ALGORITHMS) for rank in range(1, _WIDTH)
+]
+
+# The arrays one process resamples from; set by _load in each worker (or the caller, run serially)
+_state: dict[str, Any] = {}
+
+
+def _load(
+    tracks: Any, ranks: Any, voters: Any, voter_count: int, track_count: int,
+    tracked: list[int], vectorized: bool,
+) -> None:
+    state = {
+        'tracks': tracks, 'ranks': ranks, 'voters': voters,
+        'voter_count': voter_count, 'track_count': track_count, 'tracked': tracked, 'vectorized': vectorized,
+    }
+    if vectorized:
+        np = numpy()
+        state['keys'] = np.frombuffer(tracks, dtype=np.intc).astype(np.intp) * _WIDTH \
+            + np.frombuffer(ranks, dtype=np.int8)
+        state['voters'] = np.frombuffer(voters, dtype=np.intc)
+        state['tracked'] = np.array(tracked, dtype=np.intp)
+        state['points'] = np.array(_POINT_TABLE)
+    _state.clear()
+    _state.update(state)
+
+
+def _attach(name: str, entry_count: int, *args: Any) -> None:
+    """Worker initializer: view the packed arrays in the shared block without copying them."""
+    # Workers leave with os._exit, so the views never need releasing before the block closes
+    shared = SharedMemory(name=name)
+    view = shared.buf
+    tracks = view[:4 * entry_count].cast('i')
+    voters = view[4 * entry_count:8 * entry_count].cast('i')
+    ranks = view[8 * entry_count:9 * entry_count].cast('b')
+    _load(tracks, ranks, voters, *args)
+    _state['shared'] = shared
+
+
+def _share(packed: PackedBallots) -> SharedMemory:
+    """Copy the packed arrays into one shared block, laid out tracks | voters | ranks."""
+    n = len(packed)
+    shared = SharedMemory(create=True, size=max(9 * n, 1))
+    shared.buf[:4 * n] = packed.tracks.tobytes()
+    shared.buf[4 * n:8 * n] = packed.voters.tobytes()
+    shared.buf[8 * n:9 * n] = packed.ranks.tobytes()
+    return shared
+
+
+def _resample(seed: int, index: int) -> array:
+    """Ranks of the tracked tracks in resample `index`, as [algorithm][tracked track] flattened."""
+    state = _state
+    voter_count, n = state['voter_count'], state['track_count']
+    draws = random.Random(f'{seed}/{index}').choices(range(voter_count), k=voter_count)
+    ranks = array('i')
+
+    if state['vectorized']:
+        np = numpy()
+        weights = np.bincount(draws, minlength=voter_count)[state['voters']]
+        counts = np.bincount(state['keys'], weights=weights, minlength=n * _WIDTH).reshape(n, _WIDTH)
+        scores = np.zeros((n, len(ALGORITHMS)))
+        for rank in range(1, _WIDTH):
+            scores += counts[:, rank:rank + 1] * state['points'][rank]
+        positions = np.empty(n, dtype=np.intc)
+        for a in range(len(ALGORITHMS)):
+            # Stable, so ties keep first-seen order as Tally.rankings does
+            positions[np.argsort(-scores[:, a], kind='stable')] = np.arange(1, n + 1, dtype=np.intc)
+            ranks.extend(positions[state['tracked']].tolist())
+        return ranks
+
+    weights = [0] * voter_count
+    for voter in draws:
+        weights[voter] += 1
+    counts = [0] * (n * _WIDTH)
+    for track, rank, voter in zip(state['tracks'], state['ranks'], state['voters']):
+        weight = weights[voter]
+        if weight:
+            counts[track * _WIDTH + rank] += weight
+    scores = [[0.0] * len(ALGORITHMS) for _ in range(n)]
+    for track in range(n):
+        track_scores = scores[track]
+        base = track * _WIDTH
+        for rank in range(1, _WIDTH):
+            count = counts[base + rank]
+            if count:
+                for a, points in enumerate(_POINT_TABLE[rank]):
+                    track_scores[a] += count * points
+    for a in range(len(ALGORITHMS)):
+        positions = [0] * n
+        order = sorted(range(n), key=lambda track: scores[track][a], reverse=True)
+        for position, track in enumerate(order, 1):
+            positions[track] = position
+        ranks.extend(positions[track] for track in state['tracked'])
+    return ranks
+
+
+def _resample_chunk(seed: int, start: int, stop: int, deadline: float) -> list[tuple[int, array]]:
+    """Resamples start..stop-1, or as many as finish before `deadline` (a time.time())."""
+    results = []
+    for index in range(start, stop):
+        if time.time() >= deadline:
+            break
+        results.append((index, _resample(seed, index)))
+    return results
+
+
+def _run_parallel(
+    packed: PackedBallots, load_args: tuple, chunks: list[tuple[int, int]], seed: int, deadline: float, workers: int,
+) -> list[tuple[int, array]]:
+    shared = _share(packed)
+    try:
+        # Spawned rather than forked: the Lambda runtime and local server are multi-threaded
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_attach, initargs=(shared.name, len(packed), *load_args),
+        ) as pool:
+            futures = [pool.submit(_resample_chunk, seed, start, stop, deadline) for start, stop in chunks]
+            return [result for future in futures for result in future.result()]
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def _run_serial(
+    packed: PackedBallots, load_args: tuple, chunks: list[tuple[int, int]], seed: int, deadline: float,
+) -> list[tuple[int, array]]:
+    _load(packed.tracks, packed.ranks, packed.voters, *load_args)
+    try:
+        return [result for start, stop in chunks for result in _resample_chunk(seed, start, stop, deadline)]
+    finally:
+        _state.clear()
+
+
+def _percentile(ordered: list[int], q: float) -> int:
+    """Nearest-rank percentile of a sorted list; lower bounds round down and upper bounds up."""
+    position = q * (len(ordered) - 1)
+    return ordered[math.floor(position) if q <= 0.5 else math.ceil(position)]
+
+
+def rank_stability(
+    packed: PackedBallots,
+    top: int = 100,
+    resamples: int = 1000,
+    seed: int = 0,
+    budget: float = 20.0,
+    confidence: float = 0.95,
+    workers: int | None = None,
+    vectorized: bool | None = None,
+) -> dict[str, Any]:
+    """Bootstrap rank intervals for each algorithm's observed top `top` tracks.
+
+    Each result carries its observed `rank` and `score`, the `interval` of ranks
+    holding `confidence` of the resamples, the `median` rank, and `inTop`, the
+    share of resamples that placed it within the top `top`. Resampling stops
+    after `budget` seconds; `resamples` in the report is how many finished.
+    """
+    started = time.perf_counter()
+    tally = tally_packed(packed, vectorized)
+    index = {track_id: i for i, track_id in enumerate(packed.track_ids)}
+    observed = {algorithm: tally.rankings(algorithm, top) for algorithm in ALGORITHMS}
+    tracked = sorted({index[r['trackId']] for results in observed.values() for r in results})
+    column = {track: i for i, track in enumerate(tracked)}
+
+    workers = max(1, workers if workers is not None else os.cpu_count() or 1)
+    # A few chunks per worker keeps them all busy without much per-task overhead
+    size = max(1, min(50, math.ceil(resamples / (workers * 4))))
+    chunks = [(start, min(start + size, resamples)) for start in range(0, resamples, size)]
+    deadline = time.time() + budget
+    load_args = (packed.voter_count, len(packed.track_ids), tracked, use_numpy(vectorized))
+
+    parallel = workers > 1 and len(chunks) > 1 and packed.voter_count > 0
+    samples: list[tuple[int, array]] = []
+    if parallel:
+        try:
+            samples = _run_parallel(packed, load_args, chunks, seed, deadline, workers)
+        except OSError as e:
+            print(f"Rank stability falling back to serial resampling: {e}")
+            parallel = False
+    if not parallel and packed.voter_count > 0:
+        samples = _run_serial(packed, load_args, chunks, seed, deadline)
+    samples.sort(key=lambda sample: sample[0])
+
+    tail = (1 - confidence) / 2
+    width = len(tracked)
+    report: dict[str, Any] = {}
+    for a, algorithm in enumerate(ALGORITHMS):
+        results = []
+        for rank, result in enumerate(observed[algorithm], 1):
+            offset = a * width + column[index[result['trackId']]]
+            ranks = sorted(sample[offset] for _, sample in samples)
+            results.append({
+                'trackId': result['trackId'],
+                'track': result['track'],
+                'rank': rank,
+                'score': result['score'],
+                'votes': result['votes'],
+                'interval': [_percentile(ranks, tail), _percentile(ranks, 1 - tail)] if ranks else None,
+                'median': ranks[(len(ranks) - 1) // 2] if ranks else None,
+                'inTop': round(sum(r <= top for r in ranks) / len(ranks), 3) if ranks else None,
+            })
+        report[algorithm] = results
+
+    return {
+        'stats': tally.stats(),
+        'resamples': len(samples),
+        'requested': resamples,
+        'seed': seed,
+        'confidence': confidence,
+        'timedOut': len(samples) < resamples,
+        'workers': workers if parallel else 1,
+        'elapsedMs': round((time.perf_counter() - started) * 1000),
+        'algorithms': report,
+    }
+
+
+if __name__ == '__main__':
+    from tally import pack_ballots
+
+    rng = random.Random(5)
+    packed = pack_ballots(
+        {'entries': [
+            {'rank': rank, 'trackId': f'track{int(rng.paretovariate(1.1)) % 300}'}
+            for rank in range(1, rng.randint(1, 20) + 1)
+        ]}
+        for _ in range(2000)
+    )
+
+    # Resample i depends only on (seed, i): paths, worker counts and chunking all agree
+    runs = {}
+    for name, vectorized, workers in (('python', False, 1), ('numpy', True, 1), ('pool', None, 2)):
+        if vectorized and numpy() is None:
+            continue
+        runs[name] = rank_stability(packed, top=20, resamples=40, seed=7, workers=workers, vectorized=vectorized)
+        print(f"{name}: {runs[name]['resamples']} resamples on {runs[name]['workers']} worker(s) "
+              f"in {runs[name]['elapsedMs']} ms")
+    assert len({repr(run['algorithms']) for run in runs.values()}) == 1
+
+    report = runs['python']
+    assert not report['timedOut'] and report['resamples'] == 40
+    for algorithm, results in report['algorithms'].items():
+        assert len(results) == 20, algorithm
+        for result in results:
+            low, high = result['interval']
+            assert low <= result['median'] <= high and 0 <= result['inTop'] <= 1, result
+    # A clear winner stays first however the electorate is resampled
+    assert report['algorithms']['borda'][0]['interval'] == [1, 1], report['algorithms']['borda'][0]
+
+    # A different seed resamples differently; an exhausted budget stops early
+    assert rank_stability(packed, top=20, resamples=40, seed=8, workers=1)['algorithms'] != report['algorithms']
+    stopped = rank_stability(packed, top=20, resamples=40, budget=0, workers=1)
+    assert stopped['timedOut'] and stopped['resamples'] == 0
+    assert stopped['algorithms']['borda'][0]['interval'] is None
+    print("OK")
@@ -0,0 +1,99 @@
+"""
+Results Snapshot
+Publishes precomputed results as immutable, content-hashed JSON files so the
+results page can be served from CloudFront after the vote closes.
+
+Each document is written as `<prefix>/<name>.<hash>.json`, pre-compressed with
+gzip, plus a `.br` sibling (brotli when the module is installed, otherwise the
+gzip bytes labelled as such) that a CloudFront Function serves to browsers
+accepting br. A small, short-lived `<prefix>/latest.json` manifest maps each
+document name to its current file.
+"""
+import gzip
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Any
+
+from serialization import dumps_bytes
+
+try:
+    import brotli
+except ImportError:  # Optional: .br objects fall back to gzip with a matching Content-Encoding
+    brotli = None
+
+# Hashed files never change; the manifest is re-read at most a minute late
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+MANIFEST_CACHE = 'public, max-age=60'
+
+
+def encode(document: Any) -> bytes:
+    """Serialize deterministically so unchanged results keep the same hash."""
+    return dumps_bytes(document, sort_keys=True)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def compress(data: bytes) -> dict[str, tuple[str, bytes]]:
+    """Compressed variants of `data` by key suffix: {suffix: (Content-Encoding, body)}."""
+    gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        return {'': ('gzip', gzipped), '.br': ('br', brotli.compress(data, quality=11))}
+    return {'': ('gzip', gzipped), '.br': ('gzip', gzipped)}
+
+
+class S3Target:
+    """Write snapshot files to an S3 bucket, pre-compressed."""
+
+    def __init__(self, bucket: str, client: Any = None) -> None:
+        self.bucket = bucket
+        if client is None:
+            import boto3
+            client = boto3.client('s3')
+        self.client = client
+
+    def write(self, key: str, data: bytes, cache_control: str) -> None:
+        for suffix, (encoding, body) in compress(data).items():
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=key + suffix,
+                Body=body,
+                ContentType='application/json',
+                ContentEncoding=encoding,
+                CacheControl=cache_control,
+            )
+
+
+class DirectoryTarget:
+    """Write uncompressed snapshot files under a local directory (e.g. the frontend's public/)."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def write(self, key: str, data: bytes, cache_control: str) -> None:
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+
+def publish(documents: dict[str, Any], target: S3Target | DirectoryTarget, prefix: str = 'results') -> dict[str, Any]:
+    """Write every document under a content-hashed name, then the manifest pointing at them.
+
+    The manifest goes last, so readers never see it reference a missing file.
+    """
+    files = {}
+    for name, document in documents.items():
+        data = encode(document)
+        key = f'{prefix}/{name}.{content_hash(data)}.json'
+        target.write(key, data, IMMUTABLE_CACHE)
+        files[name] = f'/{key}'
+
+    manifest = {
+        'generatedAt': datetime.now(timezone.utc).isoformat(),
+        'files': files,
+    }
+    target.write(f'{prefix}/latest.json', encode(manifest), MANIFEST_CACHE)
+    return manifest
@@ -0,0 +1,427 @@
+"""
+Ballot Tally
+Computes ranking results for every scoring algorithm in a single pass over the ballots.
+Scoring formulas mirror the frontend (see ResultsViewer.tsx / SortableTrack.tsx).
+
+Large tallies pack ballots into contiguous integer arrays and score them with
+NumPy when it is installed, falling back to an equivalent pure-Python loop.
+NumPy is imported on first use rather than at import, keeping ~60 ms off cold
+starts that never score packed ballots.
+"""
+import heapq
+import math
+from array import array
+from typing import Any, Iterable
+
+_numpy: Any = None
+_numpy_checked = False
+
+# Maximum number of songs on a ballot (matches CONFIG.MAX_SONGS on the frontend)
+MAX_SONGS = 20
+
+ALGORITHMS = ('borda', 'harmonic', 'logarithmic', 'exponential', 'bayesian')
+
+# Key of the aggregate item holding election-wide counters (real track IDs never start with '#')
+STATS_KEY = '#stats'
+# Saves add to one of this many '#stats#<n>' shards, so concurrent transactions don't
+# all contend for a single item; readers sum every item whose key starts with STATS_KEY
+STATS_SHARDS = 16
+
+
+def stats_key(shard: int) -> str:
+    """Key of one election-wide counter shard."""
+    return f'{STATS_KEY}#{shard}'
+
+
+def is_stats_key(track_id: str) -> bool:
+    """True for the election-wide counter item and its shards."""
+    return track_id.startswith(STATS_KEY)
+
+
+def score(algorithm: str, rank: int) -> float:
+    """Points awarded to a track placed at `rank` under the given algorithm."""
+    if algorithm == 'harmonic':
+        return 1 / rank
+    if algorithm == 'logarithmic':
+        return math.log2(MAX_SONGS + 2 - rank)
+    if algorithm == 'exponential':
+        return math.pow(2, MAX_SONGS - rank)
+    if algorithm == 'bayesian':
+        return (MAX_SONGS - rank + 1) / MAX_SONGS
+    return MAX_SONGS - rank + 1
+
+
+# Precomputed points per rank so the hot loop is a list lookup rather than a branch per entry
+_POINTS = {rank: tuple(score(a, rank) for a in ALGORITHMS) for rank in range(1, MAX_SONGS + 1)}
+
+
+# Points by [rank][algorithm] for packed scoring; row 0 is unused
+_POINT_TABLE = [(0.0,) * len(ALGORITHMS)] + [_POINTS[rank] for rank in range(1, MAX_SONGS + 1)]
+
+
+def _points(rank: int) -> tuple[float, ...]:
+    points = _POINTS.get(rank)
+    if points is None:
+        points = tuple(score(a, rank) for a in ALGORITHMS)
+    return points
+
+
+class Tally:
+    """Accumulated per-track scores for all algorithms."""
+
+    def __init__(self) -> None:
+        self.tracks: dict[str, dict[str, Any]] = {}
+        self.total_voters = 0
+        self.total_votes = 0
+
+    def add_ballot(self, ballot: dict[str, Any]) -> None:
+        """Add a ballot's entries to the tally. Rescinded ballots are ignored."""
+        if ballot.get('isRescinded'):
+            return
+        self.total_voters += 1
+        for entry in ballot.get('entries', []):
+            self.add_entry(entry['trackId'], int(entry['rank']), entry.get('track'))
+
+    def add_entry(self, track_id: str, rank: int, track: dict[str, Any] | None = None) -> None:
+        """Add a single ranked entry to the tally."""
+        self.add_counts(track_id, {rank: 1}, track)
+
+    def add_aggregate(self, item: dict[str, Any]) -> None:
+        """Add a materialized per-track aggregate item (see aggregate_items) to the tally."""
+        if is_stats_key(item['trackId']):
+            self.total_voters += int(item.get('totalVoters', 0))
+            return
+        counts = {
+            rank: int(item[rank_attribute(rank)])
+            for rank in range(1, MAX_SONGS + 1)
+            if item.get(rank_attribute(rank))
+        }
+        if counts:
+            self.add_counts(item['trackId'], counts, item.get('track'))
+
+    def add_counts(
+        self, track_id: str, counts: dict[int, int], track: dict[str, Any] | None = None
+    ) -> None:
+        """Add `count` votes at each rank for a track."""
+        item = self.tracks.get(track_id)
+        if item is None:
+            item = {
+                'trackId': track_id,
+                'track': track,
+                'votes': 0,
+                'positions': [],
+                'scores': [0.0] * len(ALGORITHMS),
+            }
+            self.tracks[track_id] = item
+        elif item['track'] is None:
+            item['track'] = track
+
+        scores = item['scores']
+        for rank, count in counts.items():
+            item['votes'] += count
+            item['positions'].extend([rank] * count)
+            for i, points in enumerate(_points(rank)):
+                scores[i] += points * count
+            self.total_votes += count
+
+    def apply_deltas(self, deltas: dict[str, dict[int, int]], voters: int = 0) -> None:
+        """Apply per-track rank count changes (see tally_deltas), which may be negative.
+
+        Changed tracks are re-scored from their rank counts in rank order, as
+        add_aggregate does, so the result matches a fresh tally_aggregate exactly.
+        Tracks left with no votes are dropped.
+        """
+        self.total_voters += voters
+        for track_id, ranks in deltas.items():
+            item = self.tracks.get(track_id)
+            counts: dict[int, int] = {}
+            for rank in (item['positions'] if item else []):
+                counts[rank] = counts.get(rank, 0) + 1
+            for rank, delta in ranks.items():
+                counts[rank] = counts.get(rank, 0) + delta
+            counts = {rank: counts[rank] for rank in sorted(counts) if counts[rank] > 0}
+
+            if item is None:
+                if counts:
+                    self.add_counts(track_id, counts)
+                continue
+            self.total_votes -= item['votes']
+            if not counts:
+                del self.tracks[track_id]
+                continue
+            # Reset and re-add in place, so the track keeps its tie-breaking order
+            item.update(votes=0, positions=[], scores=[0.0] * len(ALGORITHMS))
+            self.add_counts(track_id, counts)
+
+    def rankings(self, algorithm: str, top: int | None = None) -> list[dict[str, Any]]:
+        """Return tracks ordered by score for the algorithm, optionally limited to the top N."""
+        index = ALGORITHMS.index(algorithm)
+        # Both are stable, so ties keep first-seen order like the frontend's Array.sort
+        if top is None:
+            ordered = sorted(self.tracks.values(), key=lambda item: item['scores'][index], reverse=True)
+        else:
+            ordered = heapq.nlargest(top, self.tracks.values(), key=lambda item: item['scores'][index])
+        return [
+            {
+                'trackId': item['trackId'],
+                'track': item['track'],
+                'score': round(item['scores'][index], 2),
+                'votes': item['votes'],
+                'positions': sorted(item['positions']),
+            }
+            for item in ordered
+        ]
+
+    def stats(self) -> dict[str, int]:
+        """Aggregate statistics for the whole election."""
+        return {
+            'totalVoters': self.total_voters,
+            'uniqueTracks': len(self.tracks),
+            'totalVotes': self.total_votes,
+        }
+
+
+class PackedBallots:
+    """Live ballots packed into parallel integer arrays, one element per entry.
+
+    Entry i placed track `track_ids[tracks[i]]` at `ranks[i]` on the ballot of
+    voter number `voters[i]`. Tracks are numbered in first-seen order, so ties
+    keep the same order as an incremental Tally.
+    """
+
+    def __init__(self) -> None:
+        self.track_ids: list[str] = []
+        self.track_meta: list[dict[str, Any] | None] = []
+        self.tracks = array('i')
+        self.ranks = array('b')
+        self.voters = array('i')
+        self.voter_count = 0
+        self._index: dict[str, int] = {}
+
+    def add_ballot(self, ballot: dict[str, Any]) -> None:
+        """Append a ballot's entries. Rescinded ballots are ignored."""
+        if ballot.get('isRescinded'):
+            return
+        voter = self.voter_count
+        self.voter_count += 1
+        for entry in ballot.get('entries', []):
+            rank = int(entry['rank'])
+            if not 1 <= rank <= MAX_SONGS:
+                raise ValueError(f'Rank {rank} is outside 1..{MAX_SONGS}')
+            track_id = entry['trackId']
+            index = self._index.get(track_id)
+            if index is None:
+                index = self._index[track_id] = len(self.track_ids)
+                self.track_ids.append(track_id)
+                self.track_meta.append(entry.get('track'))
+            elif self.track_meta[index] is None:
+                self.track_meta[index] = entry.get('track')
+            self.tracks.append(index)
+            self.ranks.append(rank)
+            self.voters.append(voter)
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+
+def pack_ballots(ballots: Iterable[dict[str, Any]]) -> PackedBallots:
+    """Pack live ballots into contiguous (track, rank, voter) arrays."""
+    packed = PackedBallots()
+    for ballot in ballots:
+        packed.add_ballot(ballot)
+    return packed
+
+
+def numpy() -> Any:
+    """The numpy module, imported on first call, or None if it isn't installed."""
+    global _numpy, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy as np
+            _numpy = np
+        except ImportError:  # Optional: the pure-Python path gives identical results
+            pass
+        _numpy_checked = True
+    return _numpy
+
+
+def use_numpy(vectorized: bool | None) -> bool:
+    """Whether to take the NumPy path: True/False force it, None means whenever it's installed."""
+    if vectorized is False:
+        return False
+    if vectorized and numpy() is None:
+        raise RuntimeError('NumPy is not installed')
+    return numpy() is not None
+
+
+def _as_numpy(packed: PackedBallots) -> tuple[Any, Any]:
+    np = numpy()
+    tracks = np.frombuffer(packed.tracks, dtype=np.intc).astype(np.intp)
+    ranks = np.frombuffer(packed.ranks, dtype=np.int8).astype(np.intp)
+    return tracks, ranks
+
+
+def score_packed(packed: PackedBallots, vectorized: bool | None = None) -> list[list[float]]:
+    """Per-track scores, as [track][algorithm] in ALGORITHMS order.
+
+    With NumPy each algorithm is one weighted bincount. bincount accumulates in
+    entry order, as the fallback loop does, so both paths give bit-identical sums.
+    """
+    n = len(packed.track_ids)
+    if use_numpy(vectorized):
+        np = numpy()
+        tracks, ranks = _as_numpy(packed)
+        points = np.array(_POINT_TABLE)[ranks]
+        return np.column_stack([
+            np.bincount(tracks, weights=points[:, a], minlength=n) for a in range(len(ALGORITHMS))
+        ]).reshape(n, len(ALGORITHMS)).tolist()
+
+    scores = [[0.0] * len(ALGORITHMS) for _ in range(n)]
+    for track, rank in zip(packed.tracks, packed.ranks):
+        track_scores = scores[track]
+        for a, points in enumerate(_POINT_TABLE[rank]):
+            track_scores[a] += points
+    return scores
+
+
+def count_ranks(packed: PackedBallots, vectorized: bool | None = None) -> list[list[int]]:
+    """Per-track vote counts, as [track][rank] (index 0 unused)."""
+    n = len(packed.track_ids)
+    width = MAX_SONGS + 1
+    if use_numpy(vectorized):
+        np = numpy()
+        tracks, ranks = _as_numpy(packed)
+        return np.bincount(tracks * width + ranks, minlength=n * width).reshape(n, width).tolist()
+
+    counts = [[0] * width for _ in range(n)]
+    for track, rank in zip(packed.tracks, packed.ranks):
+        counts[track][rank] += 1
+    return counts
+
+
+def tally_packed(packed: PackedBallots, vectorized: bool | None = None) -> Tally:
+    """Build a tally from packed ballots, with NumPy if available unless `vectorized` says otherwise."""
+    tally = Tally()
+    tally.total_voters = packed.voter_count
+    tally.total_votes = len(packed)
+    scores = score_packed(packed, vectorized)
+    counts = count_ranks(packed, vectorized)
+    for index, track_id in enumerate(packed.track_ids):
+        ranks = counts[index]
+        tally.tracks[track_id] = {
+            'trackId': track_id,
+            'track': packed.track_meta[index],
+            'votes': sum(ranks),
+            'positions': [rank for rank in range(1, MAX_SONGS + 1) for _ in range(ranks[rank])],
+            'scores': scores[index],
+        }
+    return tally
+
+
+def tally_ballots(ballots: Iterable[dict[str, Any]], vectorized: bool | None = None) -> Tally:
+    """Build a tally from an iterable of ballots."""
+    return tally_packed(pack_ballots(ballots), vectorized)
+
+
+def rank_attribute(rank: int) -> str:
+    """Name of the aggregate attribute counting votes at `rank`."""
+    return f'r{rank}'
+
+
+def rank_counts(ballot: dict[str, Any] | None) -> dict[str, dict[int, int]]:
+    """Count how often each track appears at each rank on a live (non-rescinded) ballot."""
+    counts: dict[str, dict[int, int]] = {}
+    if not ballot or ballot.get('isRescinded'):
+        return counts
+    for entry in ballot.get('entries', []):
+        ranks = counts.setdefault(entry['trackId'], {})
+        rank = int(entry['rank'])
+        ranks[rank] = ranks.get(rank, 0) + 1
+    return counts
+
+
+def tally_deltas(
+    old: dict[str, Any] | None, new: dict[str, Any] | None
+) -> dict[str, dict[int, int]]:
+    """Per-track rank count changes from replacing the `old` ballot with `new`.
+
+    Either ballot may be None (first save / rescind). Tracks and ranks whose
+    counts are unchanged are omitted.
+    """
+    deltas = rank_counts(new)
+    for track_id, ranks in rank_counts(old).items():
+        track_deltas = deltas.setdefault(track_id, {})
+        for rank, count in ranks.items():
+            track_deltas[rank] = track_deltas.get(rank, 0) - count
+
+    return {
+        track_id: {rank: delta for rank, delta in ranks.items() if delta}
+        for track_id, ranks in deltas.items()
+        if any(ranks.values())
+    }
+
+
+def aggregate_items(ballots: Iterable[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """Build the materialized aggregate items from scratch, keyed by trackId.
+
+    Used to rebuild or verify the incrementally maintained tally table.
+    """
+    packed = pack_ballots(ballots)
+    items: dict[str, dict[str, Any]] = {
+        STATS_KEY: {'trackId': STATS_KEY, 'totalVoters': packed.voter_count, 'totalVotes': len(packed)},
+    }
+    for track_id, ranks in zip(packed.track_ids, count_ranks(packed)):
+        item = items[track_id] = {'trackId': track_id, 'votes': sum(ranks)}
+        for rank in range(1, MAX_SONGS + 1):
+            if ranks[rank]:
+                item[rank_attribute(rank)] = ranks[rank]
+    return items
+
+
+def tally_aggregate(items: Iterable[dict[str, Any]]) -> Tally:
+    """Build a tally from materialized aggregate items instead of raw ballots."""
+    tally = Tally()
+    for item in items:
+        tally.add_aggregate(item)
+    return tally
+
+
+# Check that the NumPy and pure-Python paths agree
+if __name__ == '__main__':
+    import random
+    import time
+
+    rng = random.Random(7)
+    ballots = [
+        {
+            'username': f'voter{i}',
+            'isRescinded': i % 17 == 0,
+            'entries': [
+                {'rank': rank, 'trackId': f'track{int(rng.paretovariate(1.1)) % 3000}'}
+                for rank in range(1, rng.randint(1, MAX_SONGS) + 1)
+            ],
+        }
+        for i in range(20000)
+    ]
+
+    incremental = Tally()
+    for ballot in ballots:
+        incremental.add_ballot(ballot)
+    packed = pack_ballots(ballots)
+    paths = {'incremental': incremental, 'python': tally_packed(packed, vectorized=False)}
+    if numpy() is not None:
+        paths['numpy'] = tally_packed(packed, vectorized=True)
+
+    for name, tally in paths.items():
+        assert tally.stats() == incremental.stats(), name
+        for algorithm in ALGORITHMS:
+            assert tally.rankings(algorithm) == incremental.rankings(algorithm), (name, algorithm)
+        assert [t['scores'] for t in tally.tracks.values()] == [t['scores'] for t in paths['python'].tracks.values()]
+    print(f"Paths agree: {', '.join(paths)} ({len(packed)} entries, {len(packed.track_ids)} tracks)")
+
+    for name, vectorized in (('python', False), ('numpy', True)):
+        if vectorized and numpy() is None:
+            continue
+        start = time.perf_counter()
+        tally_packed(packed, vectorized)
+        print(f"  {name}: {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,56 @@
+"""Tests for ballot_codec.py: packed entries round-trip, and ballots that can't be packed stay as maps."""
+import pytest
+
+from ballot_codec import (
+    PACKED_ATTRIBUTE, decode_ballot, decode_id, encode_ballot, encode_id, item_size, stored_fields, unpack_entries,
+)
+
+SPOTIFY_IDS = ['4uLU6hMCjMI75M1A2tKUQC', '0000000000000000000000', 'zzzzzzzzzzzzzzzzzzzzzz']
+
+
+def entries(*track_ids: str) -> list[dict]:
+    return [{'rank': rank, 'trackId': t} for rank, t in enumerate(track_ids, start=1)]
+
+
+@pytest.mark.parametrize('track_id', SPOTIFY_IDS)
+def test_id_round_trip(track_id):
+    assert decode_id(encode_id(track_id)) == track_id
+
+
+def test_ballot_round_trip():
+    ballot = {'username': 'x', 'revision': 3, 'entries': entries(*SPOTIFY_IDS)}
+    item = encode_ballot(ballot)
+    assert 'entries' not in item and isinstance(item[PACKED_ATTRIBUTE], bytes)
+    assert item_size(item) < item_size(ballot)
+    assert decode_ballot(dict(item)) == ballot
+
+
+def test_unpackable_ballots_stay_as_maps():
+    non_spotify = {'username': 'x', 'entries': entries('track1')}
+    hydrated = {'username': 'x', 'entries': [{**entries(SPOTIFY_IDS[0])[0], 'track': {'name': 'Song'}}]}
+    no_entries = {'username': 'x'}
+    for ballot in (non_spotify, hydrated, no_entries):
+        assert encode_ballot(ballot) is ballot
+        assert decode_ballot(dict(ballot)) == ballot
+
+
+def test_empty_ballot_round_trip():
+    ballot = {'username': 'x', 'entries': []}
+    assert decode_ballot(encode_ballot(ballot)) == ballot
+
+
+def test_decode_nothing():
+    assert decode_ballot(None) is None
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        unpack_entries(b'\x02')
+    with pytest.raises(ValueError):
+        unpack_entries(b'')
+
+
+def test_stored_fields_include_packed_entries():
+    assert stored_fields(['username', 'entries']) == ['username', 'entries', PACKED_ATTRIBUTE]
+    assert stored_fields(['username']) == ['username']
+    assert stored_fields(None) is None
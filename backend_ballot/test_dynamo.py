@@ -0,0 +1,106 @@
+"""Tests for dynamo.py: attribute (de)serialization, and resending unprocessed batch writes and track lookups."""
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_common'))
+
+import dynamo  # noqa: E402
+import lambda_function  # noqa: E402
+from dynamo import BATCH_RETRIES, BATCH_WRITE_SIZE, DynamoDB, deserialize_item, serialize_item  # noqa: E402
+
+
+class ThrottlingClient:
+    """Low-level client stand-in that leaves the last `unprocessed` requests of each call unprocessed."""
+
+    def __init__(self, unprocessed: int = 0, throttled_calls: int | None = None) -> None:
+        self.unprocessed = unprocessed
+        self.throttled_calls = throttled_calls
+        self.calls: list[dict] = []
+        self.written: list[dict] = []
+
+    def _throttled(self) -> bool:
+        return self.throttled_calls is None or len(self.calls) <= self.throttled_calls
+
+    def batch_write_item(self, RequestItems):
+        self.calls.append(RequestItems)
+        (name, requests), = RequestItems.items()
+        left = requests[len(requests) - self.unprocessed:] if self._throttled() and self.unprocessed else []
+        self.written += requests[:len(requests) - len(left)]
+        return {'UnprocessedItems': {name: left} if left else {}}
+
+    def batch_get_item(self, RequestItems):
+        self.calls.append(RequestItems)
+        (name, params), = RequestItems.items()
+        keys = params['Keys']
+        left = keys[len(keys) - self.unprocessed:] if self._throttled() and self.unprocessed else []
+        done = keys[:len(keys) - len(left)]
+        return {
+            'Responses': {name: [{**key, 'track': {'M': {'name': key['trackId']}}} for key in done]},
+            'UnprocessedKeys': {name: {'Keys': left}} if left else {},
+        }
+
+
+def database(client: ThrottlingClient) -> DynamoDB:
+    db = DynamoDB()
+    db._client = client
+    return db
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays, recorded instead of slept."""
+    delays = []
+    monkeypatch.setattr(dynamo.time, 'sleep', delays.append)
+    return delays
+
+
+def test_item_round_trip():
+    item = {'s': 'x', 'n': Decimal(3), 'b': b'\x01', 'flag': True, 'none': None, 'm': {'l': [Decimal(1), 'y']}}
+    assert deserialize_item(serialize_item(item)) == item
+
+
+def test_floats_are_rejected():
+    with pytest.raises(TypeError):
+        serialize_item({'rank': 1.0})
+
+
+def test_batch_writer_resends_unprocessed_items(sleeps):
+    client = ThrottlingClient(unprocessed=5, throttled_calls=2)
+    with database(client).Table('t').batch_writer() as batch:
+        for n in range(30):
+            batch.put_item(Item={'id': str(n)})
+    assert sorted(int(r['PutRequest']['Item']['id']['S']) for r in client.written) == list(range(30))
+    assert len(sleeps) == 2
+    assert all(0 <= delay <= dynamo.BATCH_BACKOFF * 2 ** n for n, delay in enumerate(sleeps))
+    assert all(len(call['t']) <= BATCH_WRITE_SIZE for call in client.calls)
+
+
+def test_batch_writer_gives_up_when_throttled(sleeps):
+    client = ThrottlingClient(unprocessed=1)
+    with pytest.raises(RuntimeError):
+        with database(client).Table('t').batch_writer() as batch:
+            batch.put_item(Item={'id': 'x'})
+    assert len(client.calls) == BATCH_RETRIES + 1
+    assert len(sleeps) == BATCH_RETRIES
+    assert max(sleeps) <= dynamo.BATCH_MAX_BACKOFF
+
+
+def test_track_lookup_resends_unprocessed_keys(sleeps, monkeypatch):
+    client = ThrottlingClient(unprocessed=10, throttled_calls=2)
+    monkeypatch.setattr(lambda_function, 'dynamodb', database(client))
+    monkeypatch.setattr(lambda_function, '_track_cache', {})
+    ids = {f'track{n}' for n in range(150)}
+    assert lambda_function.get_tracks(ids) == {t: {'name': t} for t in ids}
+    assert len(sleeps) == 2
+
+
+def test_track_lookup_gives_up_when_throttled(sleeps, monkeypatch):
+    client = ThrottlingClient(unprocessed=1)
+    monkeypatch.setattr(lambda_function, 'dynamodb', database(client))
+    monkeypatch.setattr(lambda_function, '_track_cache', {})
+    with pytest.raises(RuntimeError):
+        lambda_function.get_tracks({'a', 'b'})
+    assert len(client.calls) == BATCH_RETRIES + 1
@@ -0,0 +1,217 @@
+"""Tests for handle_save_ballot against the in-memory DynamoDB: conflict retries, idempotent replays, unchanged saves."""
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('boto3')  # memory_store raises real botocore errors
+
+# lambda_function needs the shared layer; memory_store.py lives at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_common'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import lambda_function  # noqa: E402
+from live_results import MemoryChangeFeed  # noqa: E402
+from memory_store import MemoryDynamoDB, client_error  # noqa: E402
+from tally import STATS_KEY, is_stats_key  # noqa: E402
+
+ELECTION = 'test'
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """Point the Lambda at fresh in-memory tables, as local_server.use_memory_backend does. Returns its change feed."""
+    memory = MemoryDynamoDB()
+    memory.create_table(lambda_function.BALLOTS_TABLE, 'electionId', 'username')
+    memory.create_table(lambda_function.TALLY_TABLE, 'electionId', 'trackId')
+    memory.create_table(lambda_function.TRACKS_TABLE, 'trackId')
+    feed = MemoryChangeFeed()
+    monkeypatch.setattr(lambda_function, 'dynamodb', memory)
+    monkeypatch.setattr(lambda_function, 'ballots_table', memory.Table(lambda_function.BALLOTS_TABLE))
+    monkeypatch.setattr(lambda_function, 'tally_table', memory.Table(lambda_function.TALLY_TABLE))
+    monkeypatch.setattr(lambda_function, 'tracks_table', memory.Table(lambda_function.TRACKS_TABLE))
+    monkeypatch.setattr(lambda_function, 'change_feed', feed)
+    return feed
+
+
+def save(*track_ids: str, key: str | None = None, username: str = 'alice') -> tuple[int, dict]:
+    body = {
+        'username': username,
+        'entries': [{'rank': rank, 'trackId': t} for rank, t in enumerate(track_ids, start=1)],
+        'submittedAt': '2025-01-01T00:00:00',
+    }
+    result = lambda_function.handle_save_ballot(ELECTION, body, key)
+    return result['statusCode'], json.loads(result['body'])
+
+
+def stored(username: str = 'alice') -> dict:
+    return lambda_function.get_ballot_item(ELECTION, username, consistent=True)
+
+
+def votes() -> dict[str, int]:
+    tally = lambda_function.election_tally(ELECTION)
+    return {r['trackId']: r['votes'] for r in tally.rankings('borda')}
+
+
+def test_save_writes_ballot_and_tally(feed):
+    assert save('a', 'b') == (200, {'success': True})
+    assert stored()['entries'] == [{'rank': 1, 'trackId': 'a'}, {'rank': 2, 'trackId': 'b'}]
+    assert votes() == {'a': 1, 'b': 1}
+    assert feed.latest() == '1'
+
+
+def test_unchanged_entries_are_not_written(feed):
+    save('a', 'b')
+    revision = stored()['revision']
+    assert save('a', 'b') == (200, {'success': True, 'unchanged': True})
+    assert stored()['revision'] == revision
+    assert votes() == {'a': 1, 'b': 1}
+    assert feed.latest() == '1'
+
+
+def test_rescinded_ballot_with_same_entries_is_saved(feed):
+    save('a', 'b')
+    assert lambda_function.handle_delete_ballot(ELECTION, 'alice')['statusCode'] == 200
+    assert votes() == {}
+    assert save('a', 'b') == (200, {'success': True})
+    assert not stored()['isRescinded']
+    assert votes() == {'a': 1, 'b': 1}
+
+
+def test_retry_with_same_idempotency_key_is_replayed(feed):
+    assert save('a', 'b', key='save-1') == (200, {'success': True})
+    revision = stored()['revision']
+    # A retry of an applied save replays its reply, even if the client has edited the ballot since
+    assert save('c', key='save-1') == (200, {'success': True, 'replayed': True})
+    assert stored()['revision'] == revision
+    assert stored()['entries'] == [{'rank': 1, 'trackId': 'a'}, {'rank': 2, 'trackId': 'b'}]
+    assert votes() == {'a': 1, 'b': 1}
+    assert feed.latest() == '1'
+
+
+def test_new_idempotency_key_saves(feed):
+    save('a', key='save-1')
+    assert save('b', key='save-2') == (200, {'success': True})
+    assert votes() == {'b': 1}
+    assert stored()['idempotencyKeys'] == ['save-1', 'save-2']
+
+
+def test_only_recent_idempotency_keys_are_kept(feed):
+    for n in range(lambda_function.IDEMPOTENCY_KEYS_KEPT + 1):
+        save(f'track{n}', key=f'save-{n}')
+    assert stored()['idempotencyKeys'] == [f'save-{n}' for n in range(1, lambda_function.IDEMPOTENCY_KEYS_KEPT + 1)]
+    # The oldest key has been forgotten, so its retry is applied again
+    assert save('track0', key='save-0') == (200, {'success': True})
+
+
+def test_malformed_idempotency_key(feed):
+    status, body = save('a', key='not a key!')
+    assert status == 400 and not body['success']
+    assert stored() is None
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays between transaction attempts, recorded instead of slept."""
+    delays = []
+    monkeypatch.setattr(lambda_function.time, 'sleep', delays.append)
+    return delays
+
+
+def test_conflict_retries_exhausted(feed, sleeps, monkeypatch):
+    save('a')
+    read = lambda_function.get_ballot_item
+    reads = []
+
+    def read_then_concurrent_save(election_id, username, consistent=False):
+        # Another save for the same user lands between every read and its transaction
+        old = read(election_id, username, consistent)
+        reads.append(old['revision'])
+        lambda_function.ballots_table.update_item(
+            Key={'electionId': election_id, 'username': username},
+            UpdateExpression='SET revision = revision + :one',
+            ExpressionAttributeValues={':one': 1},
+        )
+        return old
+
+    monkeypatch.setattr(lambda_function, 'get_ballot_item', read_then_concurrent_save)
+    status, body = save('b')
+
+    assert status == 409 and not body['success']
+    assert len(reads) == lambda_function.TRANSACTION_RETRIES
+    assert reads == sorted(set(reads))  # each attempt re-read the ballot
+    # Jittered, doubling backoff between attempts, none after the last
+    assert len(sleeps) == lambda_function.TRANSACTION_RETRIES - 1
+    for attempt, delay in enumerate(sleeps):
+        cap = lambda_function.TRANSACTION_BACKOFF * 2 ** attempt
+        assert 0 <= delay <= min(lambda_function.TRANSACTION_MAX_BACKOFF, cap)
+    # No attempt was applied: the ballot still ranks 'a' and the tally is untouched
+    assert read(ELECTION, 'alice')['entries'] == [{'rank': 1, 'trackId': 'a'}]
+    assert votes() == {'a': 1}
+    assert feed.latest() == '1'
+
+
+def test_conflict_then_success(feed, sleeps, monkeypatch):
+    transact = lambda_function.transact_write
+    attempts = []
+
+    def conflict_once(operations):
+        attempts.append(operations)
+        if len(attempts) == 1:
+            raise client_error('TransactionConflictException', 'Transaction is ongoing for the item', 'TransactWriteItems')
+        transact(operations)
+
+    monkeypatch.setattr(lambda_function, 'transact_write', conflict_once)
+    assert save('a') == (200, {'success': True})
+    assert len(attempts) == 2 and len(sleeps) == 1
+    assert votes() == {'a': 1}
+
+
+def test_other_errors_are_not_retried(feed, monkeypatch):
+    attempts = []
+
+    def throttled(operations):
+        attempts.append(operations)
+        raise client_error('ProvisionedThroughputExceededException', 'Rate exceeded', 'TransactWriteItems')
+
+    monkeypatch.setattr(lambda_function, 'transact_write', throttled)
+    status, body = save('a')
+    assert status == 500 and not body['success']
+    assert len(attempts) == 1
+    assert stored() is None
+
+
+def test_election_counters_are_sharded(feed):
+    for n in range(40):
+        save('a', 'b', username=f'voter{n}')
+    lambda_function.handle_delete_ballot(ELECTION, 'voter0')
+    items = lambda_function.query_election(lambda_function.tally_table, ELECTION)
+    shards = [item for item in items if is_stats_key(item['trackId'])]
+    assert len(shards) > 1
+    assert all(item['trackId'] != STATS_KEY for item in shards)
+    assert lambda_function.election_tally(ELECTION).stats() == {'totalVoters': 39, 'uniqueTracks': 2, 'totalVotes': 78}
+
+
+def test_rebuild_folds_counter_shards(feed):
+    for n in range(20):
+        save('a', username=f'voter{n}')
+    assert lambda_function.rebuild_tally(ELECTION, apply=False)['drifted'] == []
+
+    # A lost counter update makes the shards' sum drift; repair folds them into one item
+    shard = next(i for i in lambda_function.query_election(lambda_function.tally_table, ELECTION) if is_stats_key(i['trackId']))
+    lambda_function.tally_table.put_item(Item={**shard, 'totalVoters': int(shard['totalVoters']) + 1})
+    result = lambda_function.rebuild_tally(ELECTION)
+    assert result['drifted'] == [STATS_KEY] and result['orphaned']
+    items = lambda_function.query_election(lambda_function.tally_table, ELECTION)
+    assert [i['trackId'] for i in items if is_stats_key(i['trackId'])] == [STATS_KEY]
+    assert lambda_function.election_tally(ELECTION).stats()['totalVoters'] == 20
+    assert lambda_function.rebuild_tally(ELECTION, apply=False)['drifted'] == []
+
+
+@pytest.mark.parametrize('rank', [1.0, True, '1', 0, lambda_function.MAX_SONGS + 1, None])
+def test_invalid_rank_is_rejected(feed, rank):
+    body = {'username': 'alice', 'entries': [{'rank': rank, 'trackId': 'a'}]}
+    result = lambda_function.handle_save_ballot(ELECTION, body)
+    assert result['statusCode'] == 400
+    assert stored() is None
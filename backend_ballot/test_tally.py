@@ -0,0 +1,141 @@
+"""Tests for tally.py: the incremental, pure-Python and NumPy paths, aggregates and deltas."""
+import random
+
+import pytest
+
+from tally import (
+    ALGORITHMS, MAX_SONGS, STATS_KEY, Tally, aggregate_items, numpy, pack_ballots, rank_counts, score,
+    tally_aggregate, tally_ballots, tally_deltas, tally_packed,
+)
+
+VECTORIZED = [False] + ([True] if numpy() is not None else [])
+
+
+def ballot(username: str, *track_ids: str, rescinded: bool = False) -> dict:
+    return {
+        'username': username,
+        'isRescinded': rescinded,
+        'entries': [{'rank': rank, 'trackId': t} for rank, t in enumerate(track_ids, start=1)],
+    }
+
+
+def random_ballots(count: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            'username': f'voter{i}',
+            'isRescinded': i % 17 == 0,
+            'entries': [
+                {'rank': rank, 'trackId': f'track{int(rng.paretovariate(1.1)) % 300}'}
+                for rank in range(1, rng.randint(1, MAX_SONGS) + 1)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def incremental(ballots: list[dict]) -> Tally:
+    tally = Tally()
+    for b in ballots:
+        tally.add_ballot(b)
+    return tally
+
+
+def scored(tally: Tally, algorithm: str) -> dict[str, tuple[float, int, list[int]]]:
+    return {r['trackId']: (r['score'], r['votes'], r['positions']) for r in tally.rankings(algorithm)}
+
+
+@pytest.mark.parametrize('vectorized', VECTORIZED)
+def test_packed_paths_agree_with_incremental(vectorized):
+    ballots = random_ballots(2000)
+    expected = incremental(ballots)
+    tally = tally_packed(pack_ballots(ballots), vectorized)
+    assert tally.stats() == expected.stats()
+    for algorithm in ALGORITHMS:
+        assert tally.rankings(algorithm) == expected.rankings(algorithm), algorithm
+
+
+@pytest.mark.skipif(numpy() is None, reason='NumPy is not installed')
+def test_numpy_scores_are_bit_identical():
+    packed = pack_ballots(random_ballots(2000))
+    python, vectorized = tally_packed(packed, vectorized=False), tally_packed(packed, vectorized=True)
+    assert [t['scores'] for t in vectorized.tracks.values()] == [t['scores'] for t in python.tracks.values()]
+
+
+def test_aggregate_matches_ballots():
+    ballots = random_ballots(500)
+    items = aggregate_items(ballots)
+    assert items[STATS_KEY]['totalVoters'] == sum(not b['isRescinded'] for b in ballots)
+    from_items, from_ballots = tally_aggregate(items.values()), tally_ballots(ballots)
+    assert from_items.stats() == from_ballots.stats()
+    # Aggregates sum points in rank order rather than ballot order, so near-ties may swap
+    for algorithm in ALGORITHMS:
+        assert scored(from_items, algorithm) == scored(from_ballots, algorithm), algorithm
+
+
+def test_apply_deltas_matches_fresh_tally():
+    ballots = random_ballots(300)
+    tally = tally_aggregate(aggregate_items(ballots).values())
+    rng = random.Random(1)
+    for _ in range(100):
+        i = rng.randrange(len(ballots))
+        old = ballots[i]
+        new = random_ballots(1, seed=rng.random())[0] if rng.random() < 0.8 else {**old, 'isRescinded': True}
+        ballots[i] = new
+        tally.apply_deltas(tally_deltas(old, new), bool(rank_counts(new)) - bool(rank_counts(old)))
+
+    fresh = tally_aggregate(aggregate_items(ballots).values())
+    assert tally.stats()['totalVotes'] == fresh.stats()['totalVotes']
+    assert tally.stats()['uniqueTracks'] == fresh.stats()['uniqueTracks']
+    for algorithm in ALGORITHMS:
+        assert scored(tally, algorithm) == scored(fresh, algorithm), algorithm
+
+
+@pytest.mark.parametrize('vectorized', VECTORIZED)
+def test_no_ballots(vectorized):
+    tally = tally_ballots([], vectorized)
+    assert tally.stats() == {'totalVoters': 0, 'uniqueTracks': 0, 'totalVotes': 0}
+    assert all(tally.rankings(algorithm) == [] for algorithm in ALGORITHMS)
+
+
+@pytest.mark.parametrize('vectorized', VECTORIZED)
+def test_empty_and_rescinded_ballots(vectorized):
+    ballots = [ballot('empty'), ballot('gone', 'a', 'b', rescinded=True), ballot('voter', 'a')]
+    tally = tally_ballots(ballots, vectorized)
+    # An empty ballot is still a voter; a rescinded one counts for nothing
+    assert tally.stats() == {'totalVoters': 2, 'uniqueTracks': 1, 'totalVotes': 1}
+    assert tally.stats() == incremental(ballots).stats()
+
+
+@pytest.mark.parametrize('vectorized', VECTORIZED)
+def test_single_candidate(vectorized):
+    tally = tally_ballots([ballot('x', 'only'), ballot('y', 'only')], vectorized)
+    for algorithm in ALGORITHMS:
+        [result] = tally.rankings(algorithm)
+        assert result['trackId'] == 'only'
+        assert result['votes'] == 2 and result['positions'] == [1, 1]
+        assert result['score'] == round(2 * score(algorithm, 1), 2)
+
+
+@pytest.mark.parametrize('vectorized', VECTORIZED)
+def test_ties_keep_first_seen_order(vectorized):
+    ballots = [ballot('x', 'b', 'a'), ballot('y', 'a', 'b'), ballot('z', 'c')]
+    tally = tally_ballots(ballots, vectorized)
+    for algorithm in ALGORITHMS:
+        order = [r['trackId'] for r in tally.rankings(algorithm)]
+        assert order[:2] == ['b', 'a'], algorithm
+        assert [r['trackId'] for r in tally.rankings(algorithm, top=1)] == ['b']
+
+
+def test_rank_outside_ballot_is_rejected():
+    with pytest.raises(ValueError):
+        pack_ballots([{'entries': [{'rank': MAX_SONGS + 1, 'trackId': 'a'}]}])
+
+
+def test_tally_deltas():
+    old = ballot('x', 'a', 'b')
+    new = ballot('x', 'b', 'c')
+    assert tally_deltas(old, new) == {'a': {1: -1}, 'b': {1: 1, 2: -1}, 'c': {2: 1}}
+    assert tally_deltas(None, old) == {'a': {1: 1}, 'b': {2: 1}}
+    assert tally_deltas(old, {**old, 'isRescinded': True}) == {'a': {1: -1}, 'b': {2: -1}}
+    assert tally_deltas(old, old) == {}
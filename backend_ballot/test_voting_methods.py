@@ -0,0 +1,105 @@
+"""Tests for voting_methods.py: known elections, edge cases, and NumPy / pure-Python agreement."""
+import random
+
+import pytest
+
+from tally import numpy, pack_ballots
+from voting_methods import METHODS, method_results
+
+VECTORIZED = [False] + ([True] if numpy() is not None else [])
+
+
+def ballots_from(groups: list[tuple[int, str]]) -> list[dict]:
+    """`count` ballots ranking each character of `order` in turn, per (count, order) group."""
+    return [
+        {'entries': [{'rank': r, 'trackId': t} for r, t in enumerate(order, start=1)]}
+        for count, order in groups
+        for _ in range(count)
+    ]
+
+
+def ranked(method: str, groups: list[tuple[int, str]], **kwargs) -> list[tuple[str, float]]:
+    results, _ = method_results(pack_ballots(ballots_from(groups)), method, **kwargs)
+    return [(r['trackId'], r['score']) for r in results]
+
+
+@pytest.mark.parametrize('vectorized', VECTORIZED)
+def test_schulze_worked_example(vectorized):
+    # Schulze's worked example (45 voters, 5 candidates): E > A > C > B > D
+    groups = [
+        (5, 'ACBED'), (5, 'ADECB'), (8, 'BEDAC'), (3, 'CABED'),
+        (7, 'CAEBD'), (2, 'CBADE'), (7, 'DCEBA'), (8, 'EBADC'),
+    ]
+    assert [t for t, _ in ranked('schulze', groups, vectorized=vectorized)] == list('EACBD')
+
+
+def test_irv_transfers_eliminated_votes():
+    # C is eliminated first and its votes go to B; A goes next and B ends with every ballot
+    assert ranked('irv', [(4, 'AB'), (3, 'BA'), (2, 'CB')]) == [('B', 9.0), ('A', 4.0), ('C', 2.0)]
+
+
+@pytest.mark.parametrize('vectorized', VECTORIZED)
+def test_copeland_partial_ballots(vectorized):
+    # A beats B (ranked over unranked counts), A and C tie
+    groups = [(2, 'AB'), (1, 'C'), (1, 'CA')]
+    assert ranked('copeland', groups, vectorized=vectorized) == [('A', 1.5), ('C', 1.0), ('B', 0.5)]
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_no_ballots(method):
+    results, stats = method_results(pack_ballots([]), method)
+    assert results == []
+    assert stats == {'totalVoters': 0, 'uniqueTracks': 0, 'totalVotes': 0, 'candidates': 0, 'minVotes': 1}
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_empty_ballot_counts_as_voter_only(method):
+    results, stats = method_results(pack_ballots(ballots_from([(1, ''), (1, 'A')])), method)
+    assert [r['trackId'] for r in results] == ['A']
+    assert stats['totalVoters'] == 2 and stats['candidates'] == 1
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_single_candidate(method):
+    [(track_id, _)] = ranked(method, [(3, 'A')])
+    assert track_id == 'A'
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_ties_go_to_the_first_seen_candidate(method):
+    # One ballot each way: a dead heat, broken by candidate order (most votes, then first seen)
+    assert [t for t, _ in ranked(method, [(1, 'AB'), (1, 'BA')])] == ['A', 'B']
+    assert [t for t, _ in ranked(method, [(1, 'BA'), (1, 'AB')])] == ['B', 'A']
+
+
+def test_tied_scores():
+    assert ranked('copeland', [(1, 'AB'), (1, 'BA')]) == [('A', 0.5), ('B', 0.5)]
+    assert ranked('schulze', [(1, 'AB'), (1, 'BA')]) == [('A', 0), ('B', 0)]
+    # IRV eliminates the later candidate of a tie, whose ballot then moves to the other
+    assert ranked('irv', [(1, 'AB'), (1, 'BA')]) == [('A', 2.0), ('B', 1.0)]
+
+
+def test_candidates_need_min_votes():
+    results, stats = method_results(pack_ballots(ballots_from([(2, 'AB'), (1, 'C')])), 'irv', min_votes=2)
+    assert [r['trackId'] for r in results] == ['A', 'B']
+    assert stats['candidates'] == 2 and stats['minVotes'] == 2
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        method_results(pack_ballots([]), 'plurality')
+
+
+@pytest.mark.skipif(numpy() is None, reason='NumPy is not installed')
+@pytest.mark.parametrize('method', METHODS)
+def test_numpy_and_python_agree(method):
+    rng = random.Random(3)
+    packed = pack_ballots(
+        {'entries': [
+            {'rank': rank, 'trackId': f'track{int(rng.paretovariate(1.2)) % 400}'}
+            for rank in range(1, rng.randint(1, 20) + 1)
+        ]}
+        for _ in range(2000)
+    )
+    assert method_results(packed, method, min_votes=2, vectorized=False) == \
+        method_results(packed, method, min_votes=2, vectorized=True)
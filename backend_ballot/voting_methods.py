@@ -0,0 +1,258 @@
+"""
+Voting Methods
+Ordinal results computed from whole ballots: instant-runoff (IRV), Schulze and
+Copeland. Unlike the positional algorithms in tally.py these can't be read from
+the per-rank aggregate, so they work from PackedBallots.
+
+Only tracks with at least `min_votes` votes (at most `max_candidates` of them,
+most-voted first) are candidates. Pairwise preferences are counted sparsely:
+each ballot contributes only the pairs it actually ranks, and "ranked beats
+unranked" is derived from per-candidate vote counts, so counting costs
+O(entries x ballot length) rather than O(voters x candidates^2).
+"""
+from typing import Any
+
+from tally import PackedBallots, numpy, tally_packed, use_numpy
+
+METHODS = ('irv', 'schulze', 'copeland')
+
+
+def ballot_orders(packed: PackedBallots) -> list[list[int]]:
+    """Each live ballot's track indices from first to last choice (a repeated track keeps its best rank)."""
+    orders: list[list[tuple[int, int]]] = [[] for _ in range(packed.voter_count)]
+    for track, rank, voter in zip(packed.tracks, packed.ranks, packed.voters):
+        orders[voter].append((rank, track))
+    result = []
+    for entries in orders:
+        seen: set[int] = set()
+        result.append([t for _, t in sorted(entries) if not (t in seen or seen.add(t))])
+    return result
+
+
+def select_candidates(
+    orders: list[list[int]], track_count: int, min_votes: int, max_candidates: int
+) -> list[int]:
+    """Track indices eligible as candidates, most-voted first (ties in first-seen order).
+
+    Candidate position doubles as the tie-break: earlier candidates win ties.
+    """
+    votes = [0] * track_count
+    for order in orders:
+        for track in order:
+            votes[track] += 1
+    eligible = [t for t in range(track_count) if votes[t] >= min_votes]
+    eligible.sort(key=lambda t: -votes[t])
+    return eligible[:max_candidates]
+
+
+def restrict(orders: list[list[int]], candidates: list[int]) -> list[list[int]]:
+    """Rewrite ballots as candidate positions, dropping non-candidates and emptied ballots."""
+    position = {track: i for i, track in enumerate(candidates)}
+    restricted = ([position[t] for t in order if t in position] for order in orders)
+    return [ballot for ballot in restricted if ballot]
+
+
+def pairwise_preferences(
+    ballots: list[list[int]], n: int, vectorized: bool | None = None
+) -> list[list[int]]:
+    """d[a][b]: ballots preferring candidate a to b.
+
+    A ballot prefers a to b if it ranks a above b, or ranks a and not b. Only
+    the ranked pairs are counted per ballot (`above`); the rest follows from
+    d[a][b] = votes[a] - above[b][a], since a ballot ranking a either ranks b
+    above a or doesn't prefer b to a.
+    """
+    votes = [0] * n
+    for ballot in ballots:
+        for a in ballot:
+            votes[a] += 1
+
+    if ballots and use_numpy(vectorized):
+        np = numpy()
+        width = max(len(b) for b in ballots)
+        # Ballots padded into a (voters x width) matrix; -1 marks no choice
+        matrix = np.full((len(ballots), width), -1, dtype=np.intp)
+        for row, ballot in enumerate(ballots):
+            matrix[row, :len(ballot)] = ballot
+        counts = np.zeros(n * n, dtype=np.int64)
+        for i in range(width):
+            for j in range(i + 1, width):
+                valid = matrix[:, j] >= 0  # choice j implies choice i
+                counts += np.bincount(matrix[valid, i] * n + matrix[valid, j], minlength=n * n)
+        above = counts.reshape(n, n)
+        return (np.array(votes)[:, None] - above.T).tolist()
+
+    above = [[0] * n for _ in range(n)]
+    for ballot in ballots:
+        for i, a in enumerate(ballot):
+            row = above[a]
+            for b in ballot[i + 1:]:
+                row[b] += 1
+    return [[votes[a] - above[b][a] if a != b else 0 for b in range(n)] for a in range(n)]
+
+
+def instant_runoff(ballots: list[list[int]], n: int) -> tuple[list[int], list[int]]:
+    """Eliminate the candidate with the fewest votes until none remain.
+
+    Returns (finishing order, winner first; votes each candidate held in the
+    round it was eliminated). Ties eliminate the later candidate. Only the
+    eliminated candidate's ballots are moved each round.
+    """
+    piles: list[list[int]] = [[] for _ in range(n)]
+    for index, ballot in enumerate(ballots):
+        piles[ballot[0]].append(index)
+    cursor = [0] * len(ballots)
+    continuing = set(range(n))
+    final_votes = [0] * n
+    eliminated = []
+
+    while continuing:
+        loser = min(continuing, key=lambda c: (len(piles[c]), -c))
+        continuing.remove(loser)
+        final_votes[loser] = len(piles[loser])
+        eliminated.append(loser)
+        for index in piles[loser]:
+            ballot = ballots[index]
+            position = cursor[index] + 1
+            while position < len(ballot) and ballot[position] not in continuing:
+                position += 1
+            cursor[index] = position
+            if position < len(ballot):
+                piles[ballot[position]].append(index)  # Otherwise the ballot is exhausted
+        piles[loser] = []
+
+    return eliminated[::-1], final_votes
+
+
+def schulze(d: list[list[int]], vectorized: bool | None = None) -> list[int]:
+    """Number of candidates each candidate beats by strongest path.
+
+    Strongest paths are a widest-path Floyd-Warshall pass over the pairwise
+    wins, O(n^3) but vectorized per intermediate candidate with NumPy.
+    """
+    n = len(d)
+    if n and use_numpy(vectorized):
+        np = numpy()
+        pairwise = np.array(d)
+        p = np.where(pairwise > pairwise.T, pairwise, 0)
+        for k in range(n):
+            p = np.maximum(p, np.minimum(p[:, k:k + 1], p[k:k + 1, :]))
+        np.fill_diagonal(p, 0)
+        return (p > p.T).sum(axis=1).tolist()
+
+    p = [[d[i][j] if d[i][j] > d[j][i] else 0 for j in range(n)] for i in range(n)]
+    for k in range(n):
+        pk = p[k]
+        for i in range(n):
+            pik = p[i][k]
+            if i == k or not pik:
+                continue
+            p[i] = [x if x >= pik else max(x, min(pik, y)) for x, y in zip(p[i], pk)]
+    return [sum(1 for j in range(n) if j != i and p[i][j] > p[j][i]) for i in range(n)]
+
+
+def copeland(d: list[list[int]]) -> list[float]:
+    """Head-to-head wins plus half a point per tie against every other candidate."""
+    n = len(d)
+    return [
+        sum(1.0 if d[a][b] > d[b][a] else 0.5 if d[a][b] == d[b][a] else 0.0 for b in range(n) if b != a)
+        for a in range(n)
+    ]
+
+
+def method_results(
+    packed: PackedBallots,
+    method: str,
+    top: int | None = None,
+    min_votes: int = 1,
+    max_candidates: int = 300,
+    vectorized: bool | None = None,
+) -> tuple[list[dict[str, Any]], dict[str, int]]:
+    """Rank candidate tracks by an ordinal method.
+
+    Returns results shaped like Tally.rankings (score is final-round votes for
+    IRV, tracks beaten for Schulze, wins plus half-ties for Copeland) and the
+    election stats with the candidate count and vote threshold added.
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown method: {method}')
+
+    orders = ballot_orders(packed)
+    candidates = select_candidates(orders, len(packed.track_ids), min_votes, max_candidates)
+    ballots = restrict(orders, candidates)
+    n = len(candidates)
+
+    if method == 'irv':
+        ordered, final_votes = instant_runoff(ballots, n)
+        scores: list[float] = [float(v) for v in final_votes]
+    else:
+        d = pairwise_preferences(ballots, n, vectorized)
+        scores = schulze(d, vectorized) if method == 'schulze' else copeland(d)
+        # Stable sort keeps candidate order (most votes first) for ties
+        ordered = sorted(range(n), key=lambda c: -scores[c])
+
+    tally = tally_packed(packed, vectorized)
+    results = []
+    for c in ordered[:top]:
+        item = tally.tracks[packed.track_ids[candidates[c]]]
+        results.append({
+            'trackId': item['trackId'],
+            'track': item['track'],
+            'score': round(scores[c], 2),
+            'votes': item['votes'],
+            'positions': item['positions'],
+        })
+    return results, {**tally.stats(), 'candidates': n, 'minVotes': min_votes}
+
+
+# Check the methods on a known election and that the NumPy and pure-Python paths agree
+if __name__ == '__main__':
+    import random
+    import time
+
+    from tally import pack_ballots
+
+    def ballots_from(groups: list[tuple[int, str]]) -> list[dict[str, Any]]:
+        return [
+            {'entries': [{'rank': r, 'trackId': t} for r, t in enumerate(order, start=1)]}
+            for count, order in groups
+            for _ in range(count)
+        ]
+
+    # Schulze's worked example (45 voters, 5 candidates): E > A > C > B > D
+    example = pack_ballots(ballots_from([
+        (5, 'ACBED'), (5, 'ADECB'), (8, 'BEDAC'), (3, 'CABED'),
+        (7, 'CAEBD'), (2, 'CBADE'), (7, 'DCEBA'), (8, 'EBADC'),
+    ]))
+    for vectorized in (False, True) if numpy() is not None else (False,):
+        results, _ = method_results(example, 'schulze', vectorized=vectorized)
+        assert [r['trackId'] for r in results] == list('EACBD'), results
+
+    # IRV: C is eliminated first and its votes go to B; A goes next and B ends with every ballot
+    results, _ = method_results(pack_ballots(ballots_from([(4, 'AB'), (3, 'BA'), (2, 'CB')])), 'irv')
+    assert [(r['trackId'], r['score']) for r in results] == [('B', 9.0), ('A', 4.0), ('C', 2.0)], results
+
+    # Copeland with partial ballots: A beats B (ranked over unranked counts), A and C tie
+    results, _ = method_results(pack_ballots(ballots_from([(2, 'AB'), (1, 'C'), (1, 'CA')])), 'copeland')
+    assert [(r['trackId'], r['score']) for r in results] == [('A', 1.5), ('C', 1.0), ('B', 0.5)], results
+
+    rng = random.Random(3)
+    packed = pack_ballots(
+        {'entries': [
+            {'rank': rank, 'trackId': f'track{int(rng.paretovariate(1.2)) % 400}'}
+            for rank in range(1, rng.randint(1, 20) + 1)
+        ]}
+        for _ in range(5000)
+    )
+    for method in METHODS:
+        timings = {}
+        outputs = {}
+        for name, vectorized in (('python', False), ('numpy', True)):
+            if vectorized and numpy() is None:
+                continue
+            start = time.perf_counter()
+            outputs[name] = method_results(packed, method, min_votes=2, vectorized=vectorized)
+            timings[name] = f'{(time.perf_counter() - start) * 1000:.0f} ms'
+        assert len({repr(o) for o in outputs.values()}) == 1, method
+        print(f"{method}: {outputs['python'][1]['candidates']} candidates, {timings}")
+    print("OK")
@@ -0,0 +1,264 @@
+"""
+Instrumentation
+Per-request timing and metrics for both Lambdas, written as CloudWatch
+Embedded Metric Format (EMF) log lines: one JSON object per request, which
+CloudWatch turns into metrics without the function making any API calls.
+
+Wrap a handler with `instrument()`. Code running under it times a phase
+with `with phase('dynamodb'):`, counts events with `count()` and records
+cache lookups with `cache_lookup()`. Outside an instrumented request these
+do nothing, so scripts pay nothing for them. Phases may nest ('route'
+includes the upstream and serialize time it causes). Phase times are summed
+across threads, so parallel upstream calls can add up to more than the
+request's duration. Worker threads only count towards a request if their
+function is wrapped with `bind()`.
+
+Profiling is off unless PROFILE_SLOW_MS is set. When it is, requests run
+under cProfile (and tracemalloc with PROFILE_MEMORY=1), and any request
+slower than the threshold prints its top functions and writes a .prof file
+to PROFILE_DIR. Only one request is profiled at a time.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Iterator
+
+# CloudWatch namespace for every metric
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'MusicVoting')
+
+# EMF lines are printed by default only inside Lambda, where stdout goes to CloudWatch Logs
+EMIT_METRICS = os.environ.get('EMF_METRICS', '1' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else '0') == '1'
+
+# Profile requests and dump those slower than this many milliseconds (0 disables profiling)
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', '0'))
+PROFILE_MEMORY = os.environ.get('PROFILE_MEMORY', '0') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp')
+# Functions (by cumulative time) and allocation sites printed for a slow request
+PROFILE_TOP = 25
+
+_current: contextvars.ContextVar['RequestMetrics | None'] = contextvars.ContextVar('request_metrics', default=None)
+
+# cProfile can only be active once per process, so concurrent requests go unprofiled
+_profile_lock = threading.Lock()
+
+
+class RequestMetrics:
+    """Phase timings, counters and cache lookups for one request."""
+
+    def __init__(self, function: str, request_id: str | None = None) -> None:
+        self.function = function
+        self.request_id = request_id
+        self.route = 'unknown'
+        self.status: int | None = None
+        self.phases: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.caches: dict[str, list[int]] = {}  # name -> [hits, misses]
+        self.properties: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @property
+    def duration_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def add_time(self, name: str, ms: float) -> None:
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    def add_count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def add_cache_lookup(self, name: str, hits: int, misses: int) -> None:
+        with self._lock:
+            totals = self.caches.setdefault(name, [0, 0])
+            totals[0] += hits
+            totals[1] += misses
+
+    def document(self) -> dict[str, Any]:
+        """The EMF log object for this request."""
+        metrics = [{'Name': 'durationMs', 'Unit': 'Milliseconds'}]
+        values: dict[str, Any] = {'durationMs': round(self.duration_ms, 2)}
+
+        with self._lock:
+            for name, ms in self.phases.items():
+                metrics.append({'Name': f'{name}Ms', 'Unit': 'Milliseconds'})
+                values[f'{name}Ms'] = round(ms, 2)
+            for name, n in self.counts.items():
+                metrics.append({'Name': name, 'Unit': 'Count'})
+                values[name] = n
+            for name, (hits, misses) in self.caches.items():
+                metrics += [
+                    {'Name': f'{name}Hits', 'Unit': 'Count'},
+                    {'Name': f'{name}Misses', 'Unit': 'Count'},
+                    {'Name': f'{name}HitRate', 'Unit': 'Percent'},
+                ]
+                values[f'{name}Hits'] = hits
+                values[f'{name}Misses'] = misses
+                values[f'{name}HitRate'] = round(100 * hits / (hits + misses), 2)
+
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Function'], ['Function', 'Route']],
+                    'Metrics': metrics,
+                }],
+            },
+            'Function': self.function,
+            'Route': self.route,
+            'statusCode': self.status,
+            'requestId': self.request_id,
+            **self.properties,
+            **values,
+        }
+
+
+def current() -> RequestMetrics | None:
+    """Metrics for the request running in this context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Add the time spent in the block to the current request's `name` phase."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_time(name, (time.perf_counter() - start) * 1000)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add to one of the current request's counters."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_count(name, n)
+
+
+def cache_lookup(name: str, hits: int, misses: int) -> None:
+    """Record lookups against a cache; the request reports its hits, misses and hit rate."""
+    metrics = _current.get()
+    if metrics is not None and hits + misses:
+        metrics.add_cache_lookup(name, hits, misses)
+
+
+def set_route(method: str, route: str) -> None:
+    """Label the current request with a low-cardinality route (e.g. 'GET /ballot'), a metric dimension."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.route = f'{method} {route}'
+
+
+def bind(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap `fn` so calls from worker threads count towards the calling request."""
+    metrics = _current.get()
+    if metrics is None:
+        return fn
+
+    @wraps(fn)
+    def run(*args: Any, **kwargs: Any) -> Any:
+        token = _current.set(metrics)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+class _Profile:
+    """cProfile (and optionally tracemalloc) running for one request."""
+
+    def __init__(self) -> None:
+        import cProfile
+
+        self.profile = cProfile.Profile()
+        self.snapshot = None
+        if PROFILE_MEMORY:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.snapshot = tracemalloc.take_snapshot()
+        self.profile.enable()
+
+    def finish(self, metrics: RequestMetrics) -> None:
+        self.profile.disable()
+        if metrics.duration_ms < PROFILE_SLOW_MS:
+            return
+
+        import io
+        import pstats
+
+        name = f'{metrics.function}-{int(time.time() * 1000)}-{threading.get_ident()}.prof'
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            self.profile.dump_stats(path)
+            metrics.properties['profile'] = path
+        except OSError as e:
+            print(f"Profile write error: {e}")
+
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        print(f"Slow request: {metrics.route} took {metrics.duration_ms:.0f} ms\n{out.getvalue()}")
+
+        if self.snapshot is not None:
+            import tracemalloc
+            _, peak = tracemalloc.get_traced_memory()
+            metrics.properties['peakTracedBytes'] = peak
+            growth = tracemalloc.take_snapshot().compare_to(self.snapshot, 'lineno')[:PROFILE_TOP]
+            print(f"Peak traced memory: {peak / 1024:.0f} KiB. Largest allocation changes:")
+            for stat in growth:
+                print(f"  {stat}")
+
+
+def _start_profile() -> _Profile | None:
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        return _Profile()
+    except Exception:
+        _profile_lock.release()
+        raise
+
+
+def instrument(function: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorate a Lambda handler to time each request and emit its metrics."""
+
+    def decorator(handler: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(handler)
+        def wrapper(event: dict[str, Any], context: Any) -> Any:
+            metrics = RequestMetrics(function, getattr(context, 'aws_request_id', None))
+            token = _current.set(metrics)
+            profile = _start_profile() if PROFILE_SLOW_MS else None
+            try:
+                result = handler(event, context)
+                if isinstance(result, dict):
+                    metrics.status = result.get('statusCode')
+                return result
+            except BaseException:
+                metrics.status = 500
+                raise
+            finally:
+                _current.reset(token)
+                if profile is not None:
+                    try:
+                        profile.finish(metrics)
+                    finally:
+                        _profile_lock.release()
+                if EMIT_METRICS:
+                    print(json.dumps(metrics.document()))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,318 @@
+"""
+Catalog Snapshot
+Offline track search over a prebuilt on-disk catalog, for SEARCH_BACKEND=offline
+in local development and CI where Spotify can't be reached.
+
+A snapshot is one file holding formatted tracks as compact JSON, an inverted
+index from tokens (of track, artist and album names) to the tracks containing
+them, and a sorted ID table. Every section is a flat array, so opening a
+snapshot just maps the file: nothing is parsed up front, and searches read
+only the posting lists of their query terms and the JSON of the tracks they
+return. Matches are ranked with BM25; the last query word also matches as a
+prefix, so partly typed words find tracks.
+
+Layout (little-endian, sections 4-byte aligned): a header of magic, version,
+track count, term count and average track length, then (offset, length) for
+each section in SECTIONS order.
+"""
+import bisect
+import heapq
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+from typing import Any, Iterable
+
+from prefix_index import normalize
+
+MAGIC = b'MVCS'
+VERSION = 1
+HEADER = struct.Struct('<4sIIId')
+
+SECTIONS = (
+    'term_offsets',     # u32 x (terms + 1): byte offsets into term_blob
+    'term_blob',        # UTF-8 terms, sorted by their encoded bytes
+    'posting_offsets',  # u32 x (terms + 1): entry offsets into posting_docs / posting_freqs
+    'posting_docs',     # u32 track numbers, ascending within each term
+    'posting_freqs',    # u32 occurrences of the term in that track
+    'doc_norms',        # f32 BM25 length norm of each track, K1 * (1 - B + B * length / average)
+    'doc_offsets',      # u32 x (tracks + 1): byte offsets into doc_blob
+    'doc_blob',         # compact JSON of each formatted track
+    'id_offsets',       # u32 x (tracks + 1): byte offsets into id_blob
+    'id_blob',          # track IDs in track order
+    'id_order',         # u32 track numbers sorted by ID
+)
+_SECTION_TABLE = struct.Struct(f'<{2 * len(SECTIONS)}I')
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Terms a partly typed last word may expand to
+PREFIX_EXPANSIONS = 50
+
+# A word matching this many times more tracks than have matched so far only reranks them
+RERANK_FACTOR = 8
+
+# Most tracks read for one word; past this only the earliest tracks in the snapshot are considered
+MAX_POSTINGS = 20000
+
+
+def tokenize(text: str) -> list[str]:
+    """Words of `text`, normalized as the prefix index does."""
+    return normalize(text).split()
+
+
+def track_tokens(track: dict[str, Any]) -> list[str]:
+    """Tokens a track is searchable by: its name, its artists' names and its album name."""
+    names = [track.get('name', ''), *(a.get('name', '') for a in track.get('artists', []))]
+    names.append((track.get('album') or {}).get('name', ''))
+    return [token for name in names for token in tokenize(name)]
+
+
+def _strings(values: list[bytes]) -> tuple[array, bytes]:
+    offsets = array('I', [0])
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+    return offsets, b''.join(values)
+
+
+def write_snapshot(tracks: Iterable[dict[str, Any]], path: str) -> dict[str, int]:
+    """Write formatted tracks to a snapshot file at `path`. Repeated IDs keep their first track."""
+    if sys.byteorder != 'little':
+        raise ValueError('Catalog snapshots are written on little-endian machines only')
+
+    docs: list[bytes] = []
+    ids: list[bytes] = []
+    lengths = array('I')
+    postings: dict[str, dict[int, int]] = {}
+    seen: set[str] = set()
+    for track in tracks:
+        if track['id'] in seen:
+            continue
+        seen.add(track['id'])
+        doc = len(docs)
+        docs.append(json.dumps(track, separators=(',', ':')).encode())
+        ids.append(track['id'].encode())
+        tokens = track_tokens(track)
+        lengths.append(len(tokens))
+        for token in tokens:
+            freqs = postings.setdefault(token, {})
+            freqs[doc] = freqs.get(doc, 0) + 1
+
+    terms = sorted(postings, key=str.encode)
+    posting_offsets = array('I', [0])
+    posting_docs = array('I')
+    posting_freqs = array('I')
+    for term in terms:
+        freqs = postings[term]
+        posting_docs.extend(freqs)  # Tracks were added in order, so already ascending
+        posting_freqs.extend(freqs.values())
+        posting_offsets.append(len(posting_docs))
+
+    term_offsets, term_blob = _strings([term.encode() for term in terms])
+    doc_offsets, doc_blob = _strings(docs)
+    id_offsets, id_blob = _strings(ids)
+    id_order = array('I', sorted(range(len(ids)), key=ids.__getitem__))
+    sections = {
+        'term_offsets': term_offsets.tobytes(), 'term_blob': term_blob,
+        'posting_offsets': posting_offsets.tobytes(),
+        'posting_docs': posting_docs.tobytes(), 'posting_freqs': posting_freqs.tobytes(),
+        'doc_offsets': doc_offsets.tobytes(), 'doc_blob': doc_blob,
+        'id_offsets': id_offsets.tobytes(), 'id_blob': id_blob, 'id_order': id_order.tobytes(),
+    }
+
+    average_length = sum(lengths) / len(lengths) if lengths else 0.0
+    norms = array('f', (BM25_K1 * (1 - BM25_B + BM25_B * n / average_length) for n in lengths))
+    sections['doc_norms'] = norms.tobytes()
+    position = HEADER.size + _SECTION_TABLE.size
+    table = []
+    for name in SECTIONS:
+        position += -position % 4
+        table += [position, len(sections[name])]
+        position += len(sections[name])
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(docs), len(terms), average_length))
+        f.write(_SECTION_TABLE.pack(*table))
+        for name in SECTIONS:
+            f.write(b'\0' * (-f.tell() % 4))
+            f.write(sections[name])
+    return {'tracks': len(docs), 'terms': len(terms), 'postings': len(posting_docs), 'bytes': position}
+
+
+class CatalogSnapshot:
+    """A snapshot file mapped read-only; safe to search from many threads."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.track_count, self.term_count, self.average_length = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} catalog snapshot')
+        if sys.byteorder != 'little':
+            raise ValueError('Catalog snapshots are read on little-endian machines only')
+
+        table = _SECTION_TABLE.unpack_from(self._map, HEADER.size)
+        view = memoryview(self._map)
+        section = {name: view[table[2 * i]:table[2 * i] + table[2 * i + 1]] for i, name in enumerate(SECTIONS)}
+        self._term_offsets = section['term_offsets'].cast('I')
+        self._term_blob = section['term_blob']
+        self._posting_offsets = section['posting_offsets'].cast('I')
+        self._posting_docs = section['posting_docs'].cast('I')
+        self._posting_freqs = section['posting_freqs'].cast('I')
+        self._doc_norms = section['doc_norms'].cast('f')
+        self._doc_offsets = section['doc_offsets'].cast('I')
+        self._doc_blob = section['doc_blob']
+        self._id_offsets = section['id_offsets'].cast('I')
+        self._id_blob = section['id_blob']
+        self._id_order = section['id_order'].cast('I')
+
+    def __len__(self) -> int:
+        return self.track_count
+
+    def _term(self, index: int) -> bytes:
+        return self._term_blob[self._term_offsets[index]:self._term_offsets[index + 1]].tobytes()
+
+    def _track_id(self, doc: int) -> bytes:
+        return self._id_blob[self._id_offsets[doc]:self._id_offsets[doc + 1]].tobytes()
+
+    def _track(self, doc: int) -> dict[str, Any]:
+        return json.loads(self._doc_blob[self._doc_offsets[doc]:self._doc_offsets[doc + 1]].tobytes())
+
+    def _terms_from(self, token: str, prefix: bool) -> list[int]:
+        """Term numbers equal to `token`, or with `prefix` starting with it (at most PREFIX_EXPANSIONS)."""
+        key = token.encode()
+        index = bisect.bisect_left(range(self.term_count), key, key=self._term)
+        if not prefix:
+            return [index] if index < self.term_count and self._term(index) == key else []
+        terms = []
+        while index < self.term_count and len(terms) < PREFIX_EXPANSIONS and self._term(index).startswith(key):
+            terms.append(index)
+            index += 1
+        return terms
+
+    def _frequency(self, term: int, doc: int) -> int:
+        start, stop = self._posting_offsets[term], self._posting_offsets[term + 1]
+        i = bisect.bisect_left(self._posting_docs, doc, start, stop)
+        return self._posting_freqs[i] if i < stop and self._posting_docs[i] == doc else 0
+
+    def search(self, query: str, limit: int = 20) -> list[dict[str, Any]]:
+        """Up to `limit` tracks matching `query`, best BM25 score first (ties in snapshot order).
+
+        Words are scored rarest first. A word far more common than the tracks
+        matched so far (say "the") only adds to their scores rather than
+        pulling in every track containing it. At most MAX_POSTINGS tracks are
+        read per word, so write popular tracks first.
+        """
+        tokens = tokenize(query)
+        words = []
+        for position, token in enumerate(tokens):
+            # A prefix counts as one word matching all its expansions, so a rare
+            # completion doesn't outweigh the words typed in full
+            terms = self._terms_from(token, prefix=position == len(tokens) - 1)
+            matches = sum(self._posting_offsets[t + 1] - self._posting_offsets[t] for t in terms)
+            if terms:
+                words.append((matches, terms))
+
+        scores: dict[int, float] = {}
+        norms = self._doc_norms
+        for matches, terms in sorted(words):
+            idf = math.log(1 + (self.track_count - matches + 0.5) / (matches + 0.5))
+            if scores and matches > RERANK_FACTOR * len(scores):
+                frequencies = {doc: sum(self._frequency(t, doc) for t in terms) for doc in scores}
+            else:
+                frequencies = {}
+                budget = MAX_POSTINGS
+                for term in terms:
+                    start, stop = self._posting_offsets[term], self._posting_offsets[term + 1]
+                    stop = min(stop, start + budget)
+                    budget -= stop - start
+                    for doc, freq in zip(self._posting_docs[start:stop].tolist(), self._posting_freqs[start:stop].tolist()):
+                        frequencies[doc] = frequencies.get(doc, 0) + freq
+            for doc, freq in frequencies.items():
+                if freq:
+                    scores[doc] = scores.get(doc, 0.0) + idf * freq * (BM25_K1 + 1) / (freq + norms[doc])
+
+        best = heapq.nsmallest(limit, scores, key=lambda doc: (-scores[doc], doc))
+        return [self._track(doc) for doc in best]
+
+    def get(self, track_id: str) -> dict[str, Any] | None:
+        """The track with this ID, or None."""
+        key = track_id.encode()
+        order = self._id_order
+        i = bisect.bisect_left(range(self.track_count), key, key=lambda n: self._track_id(order[n]))
+        if i < self.track_count and self._track_id(order[i]) == key:
+            return self._track(order[i])
+        return None
+
+    def close(self) -> None:
+        for name, value in list(vars(self).items()):
+            if isinstance(value, memoryview):
+                value.release()
+        self._map.close()
+
+
+if __name__ == '__main__':
+    import os
+    import random
+    import tempfile
+    import time
+    import tracemalloc
+
+    words = [f'{a}{b}' for a in ('la', 'mo', 'ri', 'sun', 'ko', 'be', 'ta', 'ne') for b in ('n', 'ra', 'lo', 'vy', 'st', 'ck')]
+    rng = random.Random(4)
+    # Words drawn Zipf-like, so a few ("the" in a real catalog) are in most tracks
+    words += [f'{w}{i}' for w in words for i in range(40)]
+
+    def title(count: int) -> str:
+        return ' '.join(words[min(int(rng.paretovariate(0.6)) - 1, len(words) - 1)] for _ in range(count)).title()
+
+    artists = [title(rng.randint(1, 3)) for _ in range(997)]
+    albums = [title(rng.randint(1, 4)) for _ in range(5000)]
+
+    def track(n: int) -> dict[str, Any]:
+        return {
+            'id': f'{n:022d}',
+            'name': title(rng.randint(1, 4)),
+            'artists': [{'id': f'artist{n % 997}', 'name': artists[n % 997]}],
+            'album': {'id': f'album{n % 5000}', 'name': albums[n % 5000], 'images': [], 'release_date': '2025-01-01'},
+            'duration_ms': 200000,
+            'preview_url': None,
+            'external_urls': {'spotify': f'https://open.spotify.com/track/{n:022d}'},
+        }
+
+    anthem = {**track(-1), 'id': 'anthem', 'name': 'Sunst Anthem', 'artists': [{'id': 'x', 'name': 'The Moravy'}]}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'catalog.snapshot')
+        start = time.perf_counter()
+        stats = write_snapshot([anthem, *(track(n) for n in range(100000))], path)
+        print(f"Built {stats} in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        catalog = CatalogSnapshot(path)
+        opened = time.perf_counter() - start
+        print(f"Opened in {opened * 1000:.2f} ms, {tracemalloc.get_traced_memory()[1] / 1024:.0f} KiB allocated")
+        tracemalloc.stop()
+
+        # Exact words, a partly typed last word, and lookups by ID
+        assert catalog.search('sunst anthem')[0]['id'] == 'anthem'
+        assert catalog.search('moravy anth')[0]['id'] == 'anthem'
+        assert catalog.search('zzz') == [] and catalog.search('') == []
+        assert catalog.get('anthem')['name'] == 'Sunst Anthem'
+        assert catalog.get(f'{123:022d}')['id'] == f'{123:022d}'
+        assert catalog.get('missing') is None
+        # "lan" is in most tracks, so it only reranks the tracks matching "mora..."
+        results = catalog.search('lan mora', 20)
+        assert len(results) == 20, results
+        assert all(any(t.startswith('mora') for t in track_tokens(r)) for r in results), results
+
+        for query in ('lan', 'lan mora', 'ri', 'sunst ko', 'rivy12 neck', 'tavy3 m'):
+            start = time.perf_counter()
+            catalog.search(query)
+            print(f"  {query!r}: {(time.perf_counter() - start) * 1000:.1f} ms")
+        catalog.close()
+    print("OK")
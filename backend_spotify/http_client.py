@@ -0,0 +1,172 @@
+"""
+HTTP Client
+Small keep-alive connection pool on top of http.client. Connections are held at
+module scope by the caller and reused across warm Lambda invocations, so repeat
+calls to the same host skip TCP and TLS setup. Requests that fail with 429/5xx
+or a dropped connection are retried with exponential backoff, honouring
+Retry-After.
+"""
+import http.client
+import json
+import random
+import threading
+import time
+import urllib.parse
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HTTPError(Exception):
+    """Non-2xx response after retries were exhausted."""
+
+    def __init__(self, status: int, body: bytes, headers: dict[str, str]) -> None:
+        super().__init__(f'HTTP {status}: {body[:200]!r}')
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+    @property
+    def retry_after(self) -> float | None:
+        return parse_retry_after(self.headers.get('retry-after'))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class PooledHTTPClient:
+    """Thread-safe HTTP/1.1 client that keeps idle connections per host for reuse."""
+
+    def __init__(
+        self,
+        timeout: float = 5.0,
+        max_retries: int = 3,
+        backoff: float = 0.25,
+        max_backoff: float = 4.0,
+        max_retry_after: float = 10.0,
+        pool_size: int = 8,
+        retry_statuses: frozenset[int] = RETRY_STATUSES,
+    ) -> None:
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # A Retry-After longer than this is not waited out; the error is raised instead
+        self.max_retry_after = max_retry_after
+        self.pool_size = pool_size
+        self.retry_statuses = retry_statuses
+        self._idle: dict[tuple[str, str, int | None], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'connectionsOpened': 0, 'retries': 0}
+
+    def _acquire(self, origin: tuple[str, str, int | None]) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                return idle.pop(), True
+            self.counters['connectionsOpened'] += 1
+
+        scheme, host, port = origin
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def _release(self, origin: tuple[str, str, int | None], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(origin, [])
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            pools, self._idle = self._idle, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.close()
+
+    def _delay(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            return retry_after
+        # Full jitter keeps concurrent retries from arriving in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: bytes | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[int, dict[str, str], bytes]:
+        """Send a request, retrying `retry_statuses` and connection failures. Returns (status, headers, body)."""
+        parsed = urllib.parse.urlsplit(url)
+        origin = (parsed.scheme, parsed.hostname or '', parsed.port)
+        target = parsed.path + (f'?{parsed.query}' if parsed.query else '')
+
+        attempt = 0
+        while True:
+            conn, reused = self._acquire(origin)
+            with self._lock:
+                self.counters['requests'] += 1
+            try:
+                conn.request(method, target, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if reused:
+                    # The server dropped an idle keep-alive connection; retry on a fresh one for free
+                    continue
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._delay(attempt, None))
+                attempt += 1
+                with self._lock:
+                    self.counters['retries'] += 1
+                continue
+
+            resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(origin, conn)
+
+            if 200 <= resp.status < 300:
+                return resp.status, resp_headers, data
+
+            retry_after = parse_retry_after(resp_headers.get('retry-after'))
+            if (
+                resp.status not in self.retry_statuses
+                or attempt >= self.max_retries
+                or (retry_after is not None and retry_after > self.max_retry_after)
+            ):
+                raise HTTPError(resp.status, data, resp_headers)
+
+            time.sleep(self._delay(attempt, retry_after))
+            attempt += 1
+            with self._lock:
+                self.counters['retries'] += 1
+
+    def get_json(self, url: str, headers: dict[str, str] | None = None) -> Any:
+        _, _, data = self.request('GET', url, headers=headers)
+        return json.loads(data.decode())
+
+    def post_form(self, url: str, fields: dict[str, str], headers: dict[str, str] | None = None) -> Any:
+        body = urllib.parse.urlencode(fields).encode()
+        headers = {**(headers or {}), 'Content-Type': 'application/x-www-form-urlencoded'}
+        _, _, data = self.request('POST', url, body=body, headers=headers)
+        return json.loads(data.decode())
@@ -3,55 +3,135 @@ Spotify API Proxy Lambda
 Handles Spotify API queries for track search.
 """
 import json
+import math
 import os
 import base64
-import urllib.request
+import re
+import threading
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 from typing import Any
 
+from catalog_snapshot import CatalogSnapshot
+from http_client import RETRY_STATUSES, HTTPError, PooledHTTPClient
+from instrumentation import bind, instrument, phase, set_route
+from prefix_index import PrefixIndex
+from rate_limit import RateLimited, RateLimiter
+from search_cache import cache_from_env, normalize_query
+from singleflight import SingleFlight, TokenManager
+
 # Spotify API credentials (set via environment variables)
 SPOTIFY_CLIENT_ID = os.environ.get('SPOTIFY_CLIENT_ID', '')
 SPOTIFY_CLIENT_SECRET = os.environ.get('SPOTIFY_CLIENT_SECRET', '')
 
-# Cache access token (within Lambda execution context)
-_access_token: str | None = None
-_token_expires: float = 0
+# Spotify endpoints (overridable to point at a local stub server)
+SPOTIFY_ACCOUNTS_URL = os.environ.get('SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com')
+SPOTIFY_API_URL = os.environ.get('SPOTIFY_API_URL', 'https://api.spotify.com')
 
+# Where searches go: 'spotify', or 'offline' to serve /search, /suggest and /tracks from a
+# catalog snapshot (see catalog_snapshot.py and scripts/build_catalog_snapshot.py)
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'spotify')
+CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT', os.path.join(os.path.dirname(__file__), 'catalog.snapshot'))
+offline_catalog: CatalogSnapshot | None = None
 
-def get_access_token() -> str:
-    """Get Spotify API access token using client credentials flow."""
-    global _access_token, _token_expires
+# Keep-alive connections to Spotify, reused across warm invocations. A 429 isn't
+# slept on here: it goes straight to rate_limiter, which holds every upstream call
+# for its Retry-After while the request is answered from cache or shed
+spotify_http = PooledHTTPClient(
+    timeout=float(os.environ.get('SPOTIFY_HTTP_TIMEOUT', '5')),
+    max_retries=int(os.environ.get('SPOTIFY_HTTP_RETRIES', '3')),
+    retry_statuses=RETRY_STATUSES - {429},
+)
+
+# Identical concurrent searches share one upstream call
+search_flight = SingleFlight()
+
+# Admission control: each client's searches per second (and burst), and this container's
+# budget of Spotify calls per second (and burst), kept under the app's quota
+rate_limiter = RateLimiter(
+    client_rate=float(os.environ.get('SEARCH_CLIENT_RATE', '2')),
+    client_burst=float(os.environ.get('SEARCH_CLIENT_BURST', '10')),
+    upstream_rate=float(os.environ.get('SPOTIFY_QUOTA_RATE', '5')),
+    upstream_burst=float(os.environ.get('SPOTIFY_QUOTA_BURST', '20')),
+)
+
+# Search results cache: in-process LRU backed by a shared table (see search_cache.py)
+search_cache = cache_from_env()
+
+# Autocomplete index over voted tracks (from the ballot track catalog) and past search results
+suggest_index = PrefixIndex(max_tracks=int(os.environ.get('SUGGEST_INDEX_MAX_TRACKS', '20000')))
+TRACKS_TABLE = os.environ.get('TRACKS_TABLE', 'musicvoting_tracks')
+DYNAMODB_ENDPOINT = os.environ.get('DYNAMODB_ENDPOINT', None)
+# Fall back to a Spotify search when the index has fewer hits than this
+SUGGEST_MIN_HITS = int(os.environ.get('SUGGEST_MIN_HITS', '5'))
+# How often (seconds) to re-read the track catalog into the index, in the background
+SUGGEST_CATALOG_REFRESH = float(os.environ.get('SUGGEST_CATALOG_REFRESH', '300'))
+_catalog_loaded_at: float = 0
+_catalog_loading = False
+_catalog_lock = threading.Lock()
+tracks_table: Any = None
 
-    import time
-    if _access_token and time.time() < _token_expires:
-        return _access_token
+# Spotify's several-tracks endpoint accepts at most 50 IDs per call
+SPOTIFY_TRACKS_BATCH = 50
+MAX_TRACK_IDS = 200
+TRACK_ID_PATTERN = re.compile(r'^[A-Za-z0-9]{1,64}$')
 
+
+def request_access_token() -> tuple[str, float]:
+    """Request a new Spotify API access token using client credentials flow."""
     if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
         raise ValueError("Spotify client ID and secret must be set in environment variables.")
     credentials = f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}"
     encoded_credentials = base64.b64encode(credentials.encode()).decode()
 
-    data = urllib.parse.urlencode({'grant_type': 'client_credentials'}).encode()
-    req = urllib.request.Request(
-        'https://accounts.spotify.com/api/token',
-        data=data,
-        headers={
-            'Authorization': f'Basic {encoded_credentials}',
-            'Content-Type': 'application/x-www-form-urlencoded',
-        }
-    )
+    with phase('spotify'):
+        result = spotify_http.post_form(
+            f'{SPOTIFY_ACCOUNTS_URL}/api/token',
+            {'grant_type': 'client_credentials'},
+            headers={'Authorization': f'Basic {encoded_credentials}'},
+        )
+    return result['access_token'], result['expires_in']
 
-    with urllib.request.urlopen(req) as response:
-        result = json.loads(response.read().decode())
-        _access_token = result['access_token']
-        _token_expires = time.time() + result['expires_in'] - 60  # 1 min buffer
-        return _access_token
 
+# Cache access token (within Lambda execution context). Refreshed once, in the
+# background, 5 minutes before expiry; treated as expired 1 minute early.
+token_manager = TokenManager(request_access_token, expiry_margin=60, refresh_ahead=300)
 
-def search_tracks(query: str, limit: int = 20) -> list[dict[str, Any]]:
-    """Search for tracks on Spotify."""
+
+def get_access_token() -> str:
+    """Get Spotify API access token using client credentials flow."""
+    return token_manager.get()
+
+
+def spotify_get(path: str) -> Any:
+    """GET a Spotify Web API path, refreshing the token once if Spotify rejects it.
+
+    Each call spends from the upstream budget; RateLimited is raised when it's
+    exhausted or Spotify itself answers 429.
+    """
+    rate_limiter.admit_upstream()
     token = get_access_token()
+    try:
+        try:
+            with phase('spotify'):
+                return spotify_http.get_json(f'{SPOTIFY_API_URL}{path}', headers={'Authorization': f'Bearer {token}'})
+        except HTTPError as e:
+            if e.status != 401:
+                raise
+            token_manager.invalidate()
+            token = get_access_token()
+            with phase('spotify'):
+                return spotify_http.get_json(f'{SPOTIFY_API_URL}{path}', headers={'Authorization': f'Bearer {token}'})
+    except HTTPError as e:
+        if e.status == 429:
+            raise rate_limiter.upstream_limited(e.retry_after)
+        raise
+
 
+def search_tracks(query: str, limit: int = 20) -> list[dict[str, Any]]:
+    """Search for tracks on Spotify."""
     params = urllib.parse.urlencode({
         'q': query,
         'type': 'track',
@@ -59,14 +139,50 @@ def search_tracks(query: str, limit: int = 20) -> list[dict[str, Any]]:
         'market': 'AU',  # Australia market
     })
 
-    req = urllib.request.Request(
-        f'https://api.spotify.com/v1/search?{params}',
-        headers={'Authorization': f'Bearer {token}'}
-    )
+    result = spotify_get(f'/v1/search?{params}')
+    return result.get('tracks', {}).get('items', [])
+
 
-    with urllib.request.urlopen(req) as response:
-        result = json.loads(response.read().decode())
-        return result.get('tracks', {}).get('items', [])
+def fetch_tracks(track_ids: list[str]) -> list[dict[str, Any]]:
+    """Fetch up to 50 tracks from Spotify's several-tracks endpoint. Unknown IDs are skipped."""
+    params = urllib.parse.urlencode({'ids': ','.join(track_ids), 'market': 'AU'})
+    result = spotify_get(f'/v1/tracks?{params}')
+    return [t for t in result.get('tracks', []) if t]
+
+
+def get_offline_catalog() -> CatalogSnapshot:
+    """The catalog snapshot, mapped on first use."""
+    global offline_catalog
+
+    if offline_catalog is None:
+        offline_catalog = CatalogSnapshot(CATALOG_SNAPSHOT)
+    return offline_catalog
+
+
+def get_tracks(track_ids: list[str]) -> list[dict[str, Any]]:
+    """Formatted tracks for many IDs, in request order.
+
+    Cached tracks are served from the cache; the rest are fetched from Spotify
+    in chunks of 50, concurrently over the pooled connections.
+    """
+    if SEARCH_BACKEND == 'offline':
+        catalog = get_offline_catalog()
+        return [track for track in map(catalog.get, track_ids) if track is not None]
+
+    keys = {track_id: f'track:{track_id}' for track_id in track_ids}
+    cached = search_cache.get_many(list(keys.values()))
+    tracks = {track_id: cached[key] for track_id, key in keys.items() if key in cached}
+
+    missing = [track_id for track_id in track_ids if track_id not in tracks]
+    if missing:
+        chunks = [missing[i:i + SPOTIFY_TRACKS_BATCH] for i in range(0, len(missing), SPOTIFY_TRACKS_BATCH)]
+        with ThreadPoolExecutor(max_workers=min(len(chunks), 4)) as pool:
+            fetched = [format_track(t) for chunk in pool.map(bind(fetch_tracks), chunks) for t in chunk]
+        search_cache.set_many({f'track:{t["id"]}': t for t in fetched})
+        suggest_index.add_tracks(fetched)
+        tracks.update((t['id'], t) for t in fetched)
+
+    return [tracks[track_id] for track_id in track_ids if track_id in tracks]
 
 
 def format_track(track: dict[str, Any]) -> dict[str, Any]:
@@ -87,6 +203,155 @@ def format_track(track: dict[str, Any]) -> dict[str, Any]:
     }
 
 
+def search_key(query: str, limit: int) -> str:
+    return f'{normalize_query(query)}|{limit}'
+
+
+def cached_search(query: str, limit: int = 20, client: str | None = None) -> list[dict[str, Any]]:
+    """Search for tracks, serving repeat queries from the cache instead of Spotify.
+
+    Cache misses spend one of `client`'s tokens (when given) before going
+    upstream; RateLimited is raised if it has none left.
+    """
+    key = search_key(query, limit)
+    tracks = search_cache.get(key)
+    if tracks is None:
+        if client is not None:
+            rate_limiter.admit_client(client)
+        tracks = search_flight.do(key, lambda: fetch_search(key, query, limit))
+    suggest_index.add_tracks(tracks)
+    return tracks
+
+
+def search_or_stale(query: str, client: str | None, limit: int = 20) -> tuple[list[dict[str, Any]], bool]:
+    """Search results and whether they're stale: when a search is shed, the expired cached
+    result is served instead, if this container still holds one."""
+    if SEARCH_BACKEND == 'offline':
+        with phase('offlineSearch'):
+            tracks = get_offline_catalog().search(query, limit)
+        suggest_index.add_tracks(tracks)
+        return tracks, False
+
+    try:
+        tracks = cached_search(query, limit, client)
+    except RateLimited:
+        tracks = search_cache.get_stale(search_key(query, limit))
+        if tracks is None:
+            raise
+        rate_limiter.count('servedStale')
+        return tracks, True
+    rate_limiter.count('served')
+    return tracks, False
+
+
+def fetch_search(key: str, query: str, limit: int) -> list[dict[str, Any]]:
+    """Search Spotify and cache the formatted result (run once per key by search_flight)."""
+    tracks = [format_track(t) for t in search_tracks(query, limit)]
+    search_cache.set(key, tracks)
+    return tracks
+
+
+def decimal_to_num(obj: Any) -> Any:
+    """Convert Decimal objects to int/float for JSON serialization."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    if isinstance(obj, dict):
+        return {k: decimal_to_num(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [decimal_to_num(i) for i in obj]
+    return obj
+
+
+def get_tracks_table() -> Any:
+    """The ballot backend's track catalog table, connected on first use."""
+    global tracks_table
+
+    if tracks_table is None:
+        import boto3
+        if DYNAMODB_ENDPOINT:
+            dynamodb = boto3.resource(
+                'dynamodb',
+                endpoint_url=DYNAMODB_ENDPOINT,
+                region_name='us-east-1',
+                aws_access_key_id='dummy',
+                aws_secret_access_key='dummy',
+            )
+        else:
+            dynamodb = boto3.resource('dynamodb')
+        tracks_table = dynamodb.Table(TRACKS_TABLE)
+    return tracks_table
+
+
+def load_catalog() -> None:
+    """Add every voted track from the ballot backend's track catalog to the suggest index.
+
+    A paginated scan, so it runs off the request path (see refresh_catalog).
+    Failures are logged and leave the index serving what it already holds.
+    """
+    try:
+        table = get_tracks_table()
+        kwargs: dict[str, Any] = {}
+        while True:
+            with phase('dynamodb'):
+                result = table.scan(**kwargs)
+            suggest_index.add_tracks(decimal_to_num(item['track']) for item in result.get('Items', []))
+            if 'LastEvaluatedKey' not in result:
+                break
+            kwargs['ExclusiveStartKey'] = result['LastEvaluatedKey']
+    except Exception as e:
+        print(f"Track catalog load error: {e}")
+
+
+def _load_catalog_in_background() -> None:
+    global _catalog_loading
+    try:
+        load_catalog()
+    finally:
+        _catalog_loading = False
+
+
+def refresh_catalog() -> None:
+    """Start a background load_catalog once per SUGGEST_CATALOG_REFRESH seconds. Never blocks.
+
+    Suggestions made while it runs answer from whatever is already indexed.
+    """
+    global _catalog_loaded_at, _catalog_loading
+
+    if _catalog_loading or time.time() - _catalog_loaded_at < SUGGEST_CATALOG_REFRESH:
+        return
+    with _catalog_lock:
+        if _catalog_loading or time.time() - _catalog_loaded_at < SUGGEST_CATALOG_REFRESH:
+            return
+        _catalog_loading = True
+        _catalog_loaded_at = time.time()
+    threading.Thread(target=_load_catalog_in_background, daemon=True).start()
+
+
+def suggest_tracks(query: str, limit: int = 10, client: str | None = None) -> tuple[list[dict[str, Any]], str]:
+    """Autocomplete from the prefix index, searching Spotify only when it has too few hits.
+
+    Returns the tracks and where they came from ('index' or 'search'). If the
+    search is shed, the index hits alone are returned.
+    """
+    refresh_catalog()
+    tracks = suggest_index.search(query, limit)
+    if len(tracks) >= min(SUGGEST_MIN_HITS, limit):
+        return tracks, 'index'
+
+    try:
+        found, _ = search_or_stale(query, client)
+    except RateLimited:
+        return tracks, 'index'
+    seen = {t['id'] for t in tracks}
+    for track in found:
+        if len(tracks) >= limit:
+            break
+        if track['id'] not in seen:
+            seen.add(track['id'])
+            tracks.append(track)
+    return tracks, 'search'
+
+
 def cors_headers() -> dict[str, str]:
     """Return CORS headers for the response.
 
@@ -96,61 +361,114 @@ def cors_headers() -> dict[str, str]:
     return {}
 
 
+def response(status_code: int, body: dict[str, Any], headers: dict[str, str] | None = None) -> dict[str, Any]:
+    """Create a Lambda response with a JSON body."""
+    with phase('serialize'):
+        return {
+            'statusCode': status_code,
+            'headers': {**cors_headers(), 'Content-Type': 'application/json', **(headers or {})},
+            'body': json.dumps(body),
+        }
+
+
+def rate_limited_response(error: RateLimited) -> dict[str, Any]:
+    """429 telling the client how many whole seconds to wait before retrying."""
+    rate_limiter.shed(error)
+    retry_after = max(1, math.ceil(error.retry_after))
+    return response(
+        429,
+        {'error': 'Too many searches, please try again shortly', 'retryAfter': retry_after},
+        headers={'Retry-After': str(retry_after)},
+    )
+
+
+def client_id(event: dict[str, Any]) -> str:
+    """The caller's source IP, which keys its rate limit bucket."""
+    context = event.get('requestContext') or {}
+    # Function URL puts it under http, API Gateway (and the local server) under identity
+    source = (context.get('http') or context.get('identity') or {}).get('sourceIp')
+    return source or 'unknown'
+
+
+@instrument('spotify')
 def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """Lambda handler for Spotify API proxy. Supports both API Gateway and Function URL formats."""
+    with phase('route'):
+        return route_request(event)
+
 
-    # Function URL uses requestContext.http, API Gateway uses httpMethod directly
-    if 'requestContext' in event and 'http' in event.get('requestContext', {}):
-        # Function URL format
-        method = event['requestContext']['http']['method']
-        path = event.get('rawPath', '')
-    else:
-        # API Gateway format (also used by local server)
-        method = event.get('httpMethod', '')
-        path = event.get('path', '')
+def route_request(event: dict[str, Any]) -> dict[str, Any]:
+    """Dispatch an HTTP event to its handler."""
+    with phase('parse'):
+        # Function URL uses requestContext.http, API Gateway uses httpMethod directly
+        if 'requestContext' in event and 'http' in event.get('requestContext', {}):
+            # Function URL format
+            method = event['requestContext']['http']['method']
+            path = event.get('rawPath', '')
+        else:
+            # API Gateway format (also used by local server)
+            method = event.get('httpMethod', '')
+            path = event.get('path', '')
+
+        query_params = event.get('queryStringParameters') or {}
 
     # Handle CORS preflight
     if method == 'OPTIONS':
+        set_route(method, '*')
         return {
             'statusCode': 200,
             'headers': cors_headers(),
             'body': '',
         }
 
-    query_params = event.get('queryStringParameters') or {}
-
     try:
         if path == '/search' or path.endswith('/search'):
+            set_route(method, '/search')
+            query = query_params.get('q', '')
+            if not query:
+                return response(400, {'error': 'Query parameter "q" is required'})
+
+            tracks, stale = search_or_stale(query, client_id(event))
+            return response(200, {'tracks': tracks, 'stale': stale} if stale else {'tracks': tracks})
+
+        if path == '/suggest' or path.endswith('/suggest'):
+            set_route(method, '/suggest')
             query = query_params.get('q', '')
             if not query:
-                return {
-                    'statusCode': 400,
-                    'headers': cors_headers(),
-                    'body': json.dumps({'error': 'Query parameter "q" is required'}),
-                }
+                return response(400, {'error': 'Query parameter "q" is required'})
 
-            tracks = search_tracks(query)
-            formatted_tracks = [format_track(t) for t in tracks]
+            tracks, source = suggest_tracks(query, client=client_id(event))
+            return response(200, {'tracks': tracks, 'source': source})
 
-            return {
-                'statusCode': 200,
-                'headers': {**cors_headers(), 'Content-Type': 'application/json'},
-                'body': json.dumps({'tracks': formatted_tracks}),
-            }
+        if path == '/tracks' or path.endswith('/tracks'):
+            set_route(method, '/tracks')
+            track_ids = list(dict.fromkeys(i.strip() for i in query_params.get('ids', '').split(',') if i.strip()))
+            if not track_ids:
+                return response(400, {'error': 'Query parameter "ids" is required'})
+            if len(track_ids) > MAX_TRACK_IDS or not all(TRACK_ID_PATTERN.match(i) for i in track_ids):
+                return response(400, {'error': f'"ids" must be at most {MAX_TRACK_IDS} Spotify track IDs'})
 
-        return {
-            'statusCode': 404,
-            'headers': cors_headers(),
-            'body': json.dumps({'error': 'Not found'}),
-        }
+            return response(200, {'tracks': get_tracks(track_ids)})
+
+        if path.endswith('/cache/stats'):
+            set_route(method, '/cache/stats')
+            return response(200, {
+                **search_cache.stats(),
+                'coalescedSearches': search_flight.counters['coalesced'],
+                'tokenRefreshes': token_manager.counters['refreshes'],
+                'rateLimit': rate_limiter.stats(),
+                'searchBackend': SEARCH_BACKEND,
+            })
+
+        set_route(method, 'unknown')
+        return response(404, {'error': 'Not found'})
+
+    except RateLimited as e:
+        return rate_limited_response(e)
 
     except Exception as e:
         print(f"Error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers(),
-            'body': json.dumps({'error': 'Internal server error'}),
-        }
+        return response(500, {'error': 'Internal server error'})
 
 
 # For local testing
@@ -0,0 +1,120 @@
+"""
+Prefix Index
+Sorted-array autocomplete index over track and artist names. Lookups are a
+bisect into the sorted keys followed by a short forward walk, so answering a
+prefix query never touches the network.
+
+New tracks are indexed in batches: their keys are sorted on their own and
+spliced into the existing keys in one linear pass. The index holds at most
+`max_tracks` tracks, dropping the earliest added first; dropped tracks' keys
+are skipped by searches and compacted away once they pile up.
+"""
+import bisect
+import re
+import threading
+from typing import Any, Iterable
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace for prefix matching."""
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', text.lower())).strip()
+
+
+def index_keys(track: dict[str, Any]) -> set[str]:
+    """Keys a track is findable under: each word-start suffix of its name,
+    its artists' names, and "artist name" so "taylor swift anti" matches too."""
+    name = normalize(track.get('name', ''))
+    artists = [normalize(a.get('name', '')) for a in track.get('artists', [])]
+
+    keys = set()
+    for phrase in [name, *artists, *(f'{artist} {name}' for artist in artists)]:
+        words = phrase.split(' ')
+        for i in range(len(words)):
+            key = ' '.join(words[i:])
+            if key:
+                keys.add(key)
+    return keys
+
+
+class PrefixIndex:
+    """Thread-safe prefix index mapping normalized names to formatted tracks."""
+
+    def __init__(self, max_tracks: int = 20000) -> None:
+        self.max_tracks = max_tracks
+        self._keys: list[str] = []
+        self._ids: list[str] = []
+        self._pending: list[tuple[str, str]] = []
+        # Dropped tracks whose keys are still in _keys
+        self._evicted: set[str] = set()
+        self._tracks: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def add_tracks(self, tracks: Iterable[dict[str, Any]]) -> None:
+        """Add formatted tracks. Already-indexed track IDs are skipped."""
+        with self._lock:
+            for track in tracks:
+                if track['id'] in self._tracks:
+                    continue
+                self._tracks[track['id']] = track
+                if track['id'] in self._evicted:
+                    # Dropped but not yet compacted away, so its keys are still indexed
+                    self._evicted.discard(track['id'])
+                    continue
+                self._pending.extend((key, track['id']) for key in index_keys(track))
+            while len(self._tracks) > self.max_tracks:
+                # Dicts keep insertion order, so the first is the earliest added
+                oldest = next(iter(self._tracks))
+                del self._tracks[oldest]
+                self._evicted.add(oldest)
+
+    def _merge_pending(self) -> None:
+        # Sort only the new batch, then copy the runs of existing keys between its
+        # insertion points: linear, with the copying done by list slices
+        self._pending.sort()
+        keys: list[str] = []
+        ids: list[str] = []
+        start = 0
+        for key, track_id in self._pending:
+            position = bisect.bisect_right(self._keys, key, start)
+            keys += self._keys[start:position]
+            ids += self._ids[start:position]
+            keys.append(key)
+            ids.append(track_id)
+            start = position
+        keys += self._keys[start:]
+        ids += self._ids[start:]
+        self._keys, self._ids = keys, ids
+        self._pending = []
+
+    def _compact(self) -> None:
+        evicted = self._evicted
+        pairs = [(key, track_id) for key, track_id in zip(self._keys, self._ids) if track_id not in evicted]
+        self._keys = [key for key, _ in pairs]
+        self._ids = [track_id for _, track_id in pairs]
+        self._evicted = set()
+
+    def search(self, query: str, limit: int = 20) -> list[dict[str, Any]]:
+        """Return up to `limit` distinct tracks with a name or artist starting with `query`."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        with self._lock:
+            if self._pending:
+                self._merge_pending()
+            if len(self._evicted) > self.max_tracks // 4:
+                self._compact()
+
+            results: list[dict[str, Any]] = []
+            seen: set[str] = set()
+            i = bisect.bisect_left(self._keys, prefix)
+            while i < len(self._keys) and self._keys[i].startswith(prefix) and len(results) < limit:
+                track_id = self._ids[i]
+                if track_id not in seen and track_id in self._tracks:
+                    seen.add(track_id)
+                    results.append(self._tracks[track_id])
+                i += 1
+            return results
@@ -0,0 +1,117 @@
+"""
+Rate Limit
+Admission control for the Spotify proxy: a token bucket per client, so one
+eager typist can't starve everyone else, and a global bucket that budgets
+this container's calls to Spotify below its quota. When Spotify answers 429
+anyway, upstream calls stop until its Retry-After has passed.
+
+Buckets live in the execution context, so each warm container enforces its
+own budget; size SPOTIFY_QUOTA_RATE as the app's quota divided by the
+function's reserved concurrency.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import count
+
+
+class RateLimited(Exception):
+    """A request was shed; the caller may retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(f'Rate limited ({reason}), retry after {retry_after:.1f}s')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Holds up to `burst` tokens, refilled at `rate` per second."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Take a token if one is available. Returns 0, or the seconds until one will be."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+class RateLimiter:
+    """Per-client buckets, the global upstream bucket, and counters for sizing both.
+
+    At most `max_clients` client buckets are kept; the least recently seen
+    client's is dropped first (it would have refilled anyway).
+    """
+
+    def __init__(
+        self,
+        client_rate: float,
+        client_burst: float,
+        upstream_rate: float,
+        upstream_burst: float,
+        max_clients: int = 10000,
+    ) -> None:
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self.upstream = TokenBucket(upstream_rate, upstream_burst)
+        self._clients: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.counters = {'served': 0, 'servedStale': 0, 'shed': 0, 'shedClient': 0, 'shedUpstream': 0, 'upstream429s': 0}
+
+    def count(self, counter: str) -> None:
+        """Add to a counter here and in the current request's metrics."""
+        with self._lock:
+            self.counters[counter] += 1
+        count(counter)
+
+    def admit_client(self, client: str) -> None:
+        """Take one of `client`'s tokens, or raise RateLimited."""
+        with self._lock:
+            bucket = self._clients.get(client)
+            if bucket is None:
+                bucket = self._clients[client] = TokenBucket(self.client_rate, self.client_burst)
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+            self._clients.move_to_end(client)
+        wait = bucket.take()
+        if wait:
+            raise RateLimited('client', wait)
+
+    def admit_upstream(self) -> None:
+        """Take a token from the Spotify budget, or raise RateLimited while over it or backing off."""
+        blocked = self._blocked_until - time.time()
+        if blocked > 0:
+            raise RateLimited('upstream', blocked)
+        wait = self.upstream.take()
+        if wait:
+            raise RateLimited('upstream', wait)
+
+    def upstream_limited(self, retry_after: float | None, default: float = 1.0) -> RateLimited:
+        """Record a 429 from Spotify: hold upstream calls for its Retry-After. Returns the error to raise."""
+        wait = default if retry_after is None else retry_after
+        self.count('upstream429s')
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.time() + wait)
+        return RateLimited('upstream', wait)
+
+    def shed(self, error: RateLimited) -> None:
+        """Count a request answered 429."""
+        self.count('shed')
+        self.count('shedClient' if error.reason == 'client' else 'shedUpstream')
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self.counters, 'clients': len(self._clients)}
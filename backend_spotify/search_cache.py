@@ -0,0 +1,304 @@
+"""
+Search Cache
+Two-tier cache for Spotify search results: an in-process LRU with TTL that lives
+in the Lambda execution context, backed by a shared DynamoDB table (or local
+directory) so warm results survive cold starts and are shared across containers.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from instrumentation import cache_lookup, phase
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share a cache entry."""
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.time() >= expires_at:
+                return None  # Kept until evicted, for get_stale
+            self._data.move_to_end(key)
+            return value
+
+    def get_stale(self, key: str) -> Any | None:
+        """The cached value even if it has expired, for when it can't be refreshed."""
+        with self._lock:
+            entry = self._data.get(key)
+            return None if entry is None else entry[1]
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DynamoDBCache:
+    """Shared cache in a DynamoDB table keyed by `query`, with `expiresAt` as the TTL attribute."""
+
+    def __init__(self, table_name: str, ttl: float, endpoint_url: str | None = None) -> None:
+        self.table_name = table_name
+        self.ttl = ttl
+        self.endpoint_url = endpoint_url
+        self._table = None
+
+    @property
+    def table(self) -> Any:
+        # boto3 is only imported when the shared tier is actually used
+        if self._table is None:
+            import boto3
+            if self.endpoint_url:
+                dynamodb = boto3.resource(
+                    'dynamodb',
+                    endpoint_url=self.endpoint_url,
+                    region_name='us-east-1',
+                    aws_access_key_id='dummy',
+                    aws_secret_access_key='dummy',
+                )
+            else:
+                dynamodb = boto3.resource('dynamodb')
+            self._table = dynamodb.Table(self.table_name)
+        return self._table
+
+    def get(self, key: str) -> Any | None:
+        item = self.table.get_item(Key={'query': key}).get('Item')
+        # DynamoDB TTL deletion can lag by hours, so check expiry ourselves
+        if not item or time.time() >= int(item['expiresAt']):
+            return None
+        return json.loads(item['value'])
+
+    def set(self, key: str, value: Any) -> None:
+        self.table.put_item(Item=self._item(key, value))
+
+    def _item(self, key: str, value: Any) -> dict[str, Any]:
+        return {
+            'query': key,
+            # Stored as a JSON string so reads don't come back as Decimals
+            'value': json.dumps(value),
+            'expiresAt': int(time.time() + self.ttl),
+        }
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Look up many keys with BatchGetItem, 100 per request."""
+        found = {}
+        now = time.time()
+        client = self.table.meta.client
+        for start in range(0, len(keys), 100):
+            request = {self.table_name: {'Keys': [{'query': {'S': k}} for k in keys[start:start + 100]]}}
+            while request:
+                result = client.batch_get_item(RequestItems=request)
+                for item in result.get('Responses', {}).get(self.table_name, []):
+                    if now < int(item['expiresAt']['N']):
+                        found[item['query']['S']] = json.loads(item['value']['S'])
+                request = result.get('UnprocessedKeys')
+        return found
+
+    def set_many(self, values: dict[str, Any]) -> None:
+        with self.table.batch_writer() as batch:
+            for key, value in values.items():
+                batch.put_item(Item=self._item(key, value))
+
+
+class FileCache:
+    """Shared cache on the local filesystem, one JSON file per key (for local development)."""
+
+    def __init__(self, directory: str, ttl: float) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, key: str) -> Any | None:
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() >= entry['expiresAt']:
+            return None
+        return entry['value']
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set_many(self, values: dict[str, Any]) -> None:
+        for key, value in values.items():
+            self.set(key, value)
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'query': key, 'value': value, 'expiresAt': time.time() + self.ttl}, f)
+        os.replace(tmp_path, path)
+
+
+class TieredCache:
+    """In-process LRU in front of an optional shared cache, with hit/miss counters.
+
+    Errors from the shared tier are logged and treated as misses so a cache
+    outage never breaks search.
+    """
+
+    def __init__(self, local: LRUCache, shared: DynamoDBCache | FileCache | None = None) -> None:
+        self.local = local
+        self.shared = shared
+        self._lock = threading.Lock()
+        self.counters = {'localHits': 0, 'sharedHits': 0, 'misses': 0, 'staleHits': 0, 'sharedErrors': 0}
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def get(self, key: str) -> Any | None:
+        value = self.local.get(key)
+        if value is not None:
+            self._count('localHits')
+            cache_lookup('searchCache', hits=1, misses=0)
+            return value
+
+        if self.shared is not None:
+            try:
+                with phase('sharedCache'):
+                    value = self.shared.get(key)
+            except Exception as e:
+                print(f"Search cache read error: {e}")
+                self._count('sharedErrors')
+                value = None
+            if value is not None:
+                self._count('sharedHits')
+                cache_lookup('searchCache', hits=1, misses=0)
+                self.local.set(key, value)
+                return value
+
+        self._count('misses')
+        cache_lookup('searchCache', hits=0, misses=1)
+        return None
+
+    def get_stale(self, key: str) -> Any | None:
+        """An expired entry still held in-process, or None. The shared tier isn't consulted."""
+        value = self.local.get_stale(key)
+        if value is not None:
+            self._count('staleHits')
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                with phase('sharedCache'):
+                    self.shared.set(key, value)
+            except Exception as e:
+                print(f"Search cache write error: {e}")
+                self._count('sharedErrors')
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Look up many keys at once; the shared tier is queried in one batch for local misses."""
+        found = {}
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                found[key] = value
+        with self._lock:
+            self.counters['localHits'] += len(found)
+
+        missing = [k for k in keys if k not in found]
+        if missing and self.shared is not None:
+            try:
+                with phase('sharedCache'):
+                    shared = self.shared.get_many(missing)
+            except Exception as e:
+                print(f"Search cache read error: {e}")
+                self._count('sharedErrors')
+                shared = {}
+            for key, value in shared.items():
+                self.local.set(key, value)
+            found.update(shared)
+            with self._lock:
+                self.counters['sharedHits'] += len(shared)
+
+        with self._lock:
+            self.counters['misses'] += len(keys) - len(found)
+        cache_lookup('searchCache', hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def set_many(self, values: dict[str, Any]) -> None:
+        for key, value in values.items():
+            self.local.set(key, value)
+        if values and self.shared is not None:
+            try:
+                with phase('sharedCache'):
+                    self.shared.set_many(values)
+            except Exception as e:
+                print(f"Search cache write error: {e}")
+                self._count('sharedErrors')
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters['localHits'] + counters['sharedHits'] + counters['misses']
+        hits = counters['localHits'] + counters['sharedHits']
+        return {
+            **counters,
+            'hitRate': round(hits / lookups, 4) if lookups else 0.0,
+            'localSize': len(self.local),
+            'sharedBackend': type(self.shared).__name__ if self.shared else None,
+        }
+
+
+def cache_from_env() -> TieredCache:
+    """Build the search cache from SEARCH_CACHE_* environment variables.
+
+    SEARCH_CACHE_BACKEND: 'dynamodb' (default), 'file' or 'none' for the shared tier
+    SEARCH_CACHE_TTL:     seconds an entry stays fresh (default 86400)
+    SEARCH_CACHE_SIZE:    max entries in the in-process LRU (default 1000)
+    SEARCH_CACHE_TABLE:   DynamoDB table for the shared tier
+    SEARCH_CACHE_DIR:     directory for the 'file' backend
+    """
+    ttl = float(os.environ.get('SEARCH_CACHE_TTL', '86400'))
+    size = int(os.environ.get('SEARCH_CACHE_SIZE', '1000'))
+    backend = os.environ.get('SEARCH_CACHE_BACKEND', 'dynamodb')
+
+    shared: DynamoDBCache | FileCache | None = None
+    if backend == 'dynamodb':
+        shared = DynamoDBCache(
+            os.environ.get('SEARCH_CACHE_TABLE', 'musicvoting_search_cache'),
+            ttl,
+            endpoint_url=os.environ.get('DYNAMODB_ENDPOINT'),
+        )
+    elif backend == 'file':
+        shared = FileCache(os.environ.get('SEARCH_CACHE_DIR', '.search_cache'), ttl)
+
+    return TieredCache(LRUCache(size, ttl), shared)
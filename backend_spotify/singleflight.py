@@ -0,0 +1,124 @@
+"""
+Single Flight
+Concurrency helpers for the Spotify proxy: coalescing identical in-flight calls
+into one upstream request, and a token manager that refreshes once (never
+stampeding the accounts service) and proactively before expiry.
+"""
+import threading
+import time
+from typing import Any, Callable
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result or error."""
+
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'coalesced': 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.counters['coalesced'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.counters['calls'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class TokenManager:
+    """Thread-safe cache for an expiring access token.
+
+    `fetch` returns (token, expires_in_seconds). Callers holding a valid token
+    never block. Once the token is within `refresh_ahead` seconds of expiry a
+    single background refresh is started; if it has actually expired (less
+    than `expiry_margin` left), callers wait on one synchronous refresh.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], tuple[str, float]],
+        expiry_margin: float = 60,
+        refresh_ahead: float = 300,
+    ) -> None:
+        self._fetch = fetch
+        self.expiry_margin = expiry_margin
+        self.refresh_ahead = refresh_ahead
+        self._token: str | None = None
+        self._expires_at: float = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.counters = {'refreshes': 0, 'backgroundRefreshes': 0}
+
+    def _refresh_locked(self) -> str:
+        token, expires_in = self._fetch()
+        self._token = token
+        self._expires_at = time.time() + expires_in
+        self.counters['refreshes'] += 1
+        return token
+
+    def _background_refresh(self) -> None:
+        try:
+            with self._lock:
+                if time.time() < self._expires_at - self.refresh_ahead:
+                    return  # Someone else already refreshed
+                self._refresh_locked()
+                self.counters['backgroundRefreshes'] += 1
+        except Exception as e:
+            print(f"Background token refresh error: {e}")
+        finally:
+            self._refreshing = False
+
+    def get(self) -> str:
+        token, expires_at = self._token, self._expires_at
+        now = time.time()
+
+        if token and now < expires_at - self.expiry_margin:
+            if now >= expires_at - self.refresh_ahead and not self._refreshing:
+                with self._lock:
+                    start = not self._refreshing
+                    self._refreshing = True
+                if start:
+                    threading.Thread(target=self._background_refresh, daemon=True).start()
+            return token
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._token and time.time() < self._expires_at - self.expiry_margin:
+                return self._token
+            return self._refresh_locked()
+
+    def invalidate(self) -> None:
+        """Drop the cached token, e.g. after Spotify rejects it with 401."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0
@@ -0,0 +1,107 @@
+"""Tests for http_client.py against scripts/spotify_stub_server.py: connection reuse, 5xx backoff, 429 handling."""
+import json
+import os
+import sys
+
+import pytest
+
+import http_client
+from http_client import RETRY_STATUSES, HTTPError, PooledHTTPClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import spotify_stub_server  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    """A stub server on a free port. Returns (base URL, its StubState)."""
+    server = spotify_stub_server.start(0)
+    yield f'http://127.0.0.1:{server.server_address[1]}', spotify_stub_server.StubHandler.state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Delays the client sleeps for, without sleeping. Jitter always picks the longest delay."""
+    delays = []
+    monkeypatch.setattr(http_client.time, 'sleep', delays.append)
+    monkeypatch.setattr(http_client.random, 'uniform', lambda low, high: high)
+    return delays
+
+
+def test_connection_is_reused(stub):
+    url, state = stub
+    client = PooledHTTPClient()
+    for i in range(5):
+        assert len(client.get_json(f'{url}/v1/search?q=song{i}&limit=3')['tracks']['items']) == 3
+    assert client.post_form(f'{url}/api/token', {'grant_type': 'client_credentials'})['access_token']
+    client.close()
+    assert state.requests == 6
+    assert state.connections == 1
+    assert client.counters == {'requests': 6, 'connectionsOpened': 1, 'retries': 0}
+
+
+def test_server_errors_are_retried(stub, sleeps):
+    url, state = stub
+    state.fail_status, state.fail_every = 503, 2
+    client = PooledHTTPClient()
+    for i in range(3):
+        client.get_json(f'{url}/v1/search?q=song{i}&limit=1')
+    # Requests 2 and 4 failed and were retried on the same connection
+    assert state.requests == 5 and state.connections == 1
+    assert client.counters['retries'] == 2
+    assert sleeps == [client.backoff, client.backoff]
+
+
+def test_server_errors_back_off_exponentially(stub, sleeps):
+    url, state = stub
+    state.fail_status, state.fail_every = 503, 1
+    client = PooledHTTPClient(max_retries=4, backoff=0.25, max_backoff=1.0)
+    with pytest.raises(HTTPError) as error:
+        client.get_json(f'{url}/v1/search?q=song')
+    assert error.value.status == 503
+    assert state.requests == 5
+    assert sleeps == [0.25, 0.5, 1.0, 1.0]  # doubling, capped at max_backoff
+
+
+def test_errors_outside_retry_statuses_are_raised(stub, sleeps):
+    url, state = stub
+    client = PooledHTTPClient()
+    with pytest.raises(HTTPError) as error:
+        client.get_json(f'{url}/v1/unknown')
+    assert error.value.status == 404
+    assert state.requests == 1 and sleeps == []
+
+
+def test_429_is_not_retried_when_excluded(stub, sleeps):
+    # As the Spotify Lambda configures it: the rate limiter, not the client, waits out a 429
+    url, state = stub
+    state.fail_status, state.fail_every = 429, 1
+    client = PooledHTTPClient(retry_statuses=RETRY_STATUSES - {429})
+    with pytest.raises(HTTPError) as error:
+        client.get_json(f'{url}/v1/search?q=song')
+    assert error.value.status == 429
+    assert error.value.retry_after == 0
+    assert json.loads(error.value.body) == {'error': 'rate limited'}
+    assert state.requests == 1 and sleeps == []
+    assert client.counters['retries'] == 0
+
+
+def test_429_honours_retry_after(stub, sleeps):
+    url, state = stub
+    state.fail_status, state.fail_every = 429, 2
+    client = PooledHTTPClient()
+    client.get_json(f'{url}/v1/search?q=one')
+    client.get_json(f'{url}/v1/search?q=two')
+    assert state.requests == 3
+    assert sleeps == [0.0]  # the stub's Retry-After, not the backoff
+
+
+def test_parse_retry_after():
+    assert http_client.parse_retry_after('3') == 3.0
+    assert http_client.parse_retry_after('-1') == 0.0
+    assert http_client.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert http_client.parse_retry_after('soon') is None
+    assert http_client.parse_retry_after(None) is None
@@ -1,23 +1,36 @@
 """
 Local development server for testing the Music Voting app.
-Runs both Spotify and Ballot APIs on different ports.
+Runs both Spotify and Ballot APIs on different ports, each on a threaded
+HTTP/1.1 server with keep-alive.
 
-Requires DynamoDB Local:
+By default uses DynamoDB Local:
   docker run -p 8000:8000 amazon/dynamodb-local
 
 Setup tables:
   python scripts/setup_local_dynamo.py
+
+Or run without Docker, keeping all tables in memory (data is lost on exit):
+  python local_server.py --backend=memory
+
+Options:
+  --backend=dynamodb|memory   Storage for the ballot/search tables (default: dynamodb)
+  --verbose                   Log request headers and bodies as well as the access line
 """
+import argparse
+import base64
 import http.server
+import logging
 import os
 import sys
 import threading
+import time
 from urllib.parse import urlparse, parse_qs
 
 # Set DynamoDB endpoint before importing lambda
 os.environ['DYNAMODB_ENDPOINT'] = 'http://localhost:8000'
 
-# Add backend directories to path
+# Add backend directories to path (backend_common is the shared Lambda layer)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend_common'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend_spotify'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend_ballot'))
 
@@ -25,6 +38,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend_ballot'))
 import backend_ballot.lambda_function as ballot_lambda
 import backend_spotify.lambda_function as spotify_lambda
 
+logger = logging.getLogger('local_server')
+
 
 def check_dynamodb_connection():
     """Check if DynamoDB Local is running and tables exist."""
@@ -40,10 +55,12 @@ def check_dynamodb_connection():
         client = dynamodb.meta.client
         tables = client.list_tables()['TableNames']
 
-        if 'musicvoting_ballots' not in tables:
-            print("[ERROR] Missing table: musicvoting_ballots")
-            print("        Run: python scripts/setup_local_dynamo.py")
-            return False
+        required = (ballot_lambda.BALLOTS_TABLE, ballot_lambda.TALLY_TABLE, ballot_lambda.TRACKS_TABLE, 'musicvoting_search_cache')
+        for table in required:
+            if table not in tables:
+                print(f"[ERROR] Missing table: {table}")
+                print("        Run: python scripts/setup_local_dynamo.py")
+                return False
 
         print("[OK] DynamoDB Local connected")
         return True
@@ -53,106 +70,227 @@ def check_dynamodb_connection():
         if 'Connection refused' in error_msg or 'NewConnectionError' in error_msg:
             print("[ERROR] Cannot connect to DynamoDB Local at http://localhost:8000")
             print("        Run: docker run -p 8000:8000 amazon/dynamodb-local")
+            print("        Or:  python local_server.py --backend=memory")
         else:
             print(f"[ERROR] DynamoDB error: {e}")
         return False
 
 
-class SpotifyHandler(http.server.BaseHTTPRequestHandler):
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-        self.end_headers()
+def use_memory_backend():
+    """Swap every table the lambdas use for thread-safe in-memory tables."""
+    from memory_store import MemoryDynamoDB
 
-    def do_GET(self):
-        parsed = urlparse(self.path)
-        query_params = parse_qs(parsed.query)
+    memory = MemoryDynamoDB()
+    memory.create_table(ballot_lambda.BALLOTS_TABLE, 'electionId', 'username')
+    memory.create_table(ballot_lambda.TALLY_TABLE, 'electionId', 'trackId')
+    memory.create_table(ballot_lambda.TRACKS_TABLE, 'trackId')
 
-        event = {
-            'httpMethod': 'GET',
-            'path': parsed.path,
-            'queryStringParameters': {k: v[0] for k, v in query_params.items()},
-        }
+    ballot_lambda.dynamodb = memory
+    ballot_lambda.ballots_table = memory.Table(ballot_lambda.BALLOTS_TABLE)
+    ballot_lambda.tally_table = memory.Table(ballot_lambda.TALLY_TABLE)
+    ballot_lambda.tracks_table = memory.Table(ballot_lambda.TRACKS_TABLE)
 
-        result = spotify_lambda.lambda_handler(event, None)
+    # The Spotify proxy reads the same catalog; its search cache stays in-process only
+    spotify_lambda.tracks_table = memory.Table(ballot_lambda.TRACKS_TABLE)
+    spotify_lambda.search_cache.shared = None
 
-        self.send_response(result['statusCode'])
-        self.send_header('Access-Control-Allow-Origin', '*')
-        for key, value in result.get('headers', {}).items():
-            self.send_header(key, value)
-        self.end_headers()
-        self.wfile.write(result.get('body', '').encode())
+    print("[OK] Using in-memory backend (data is lost on exit)")
 
-    def log_message(self, format, *args):
-        print(f"[Spotify] {args[0]}")
 
+class LambdaHandler(http.server.BaseHTTPRequestHandler):
+    """Translate HTTP requests into Lambda events for `lambda_module`."""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    # Headers and body are separate writes; without TCP_NODELAY, Nagle's algorithm
+    # plus delayed ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+    lambda_module = None
+    name = 'Lambda'
+    allow_methods = 'GET, OPTIONS'
+
+    def send_cors_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', 'Retry-After')
 
-class BallotHandler(http.server.BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_cors_headers()
+        self.send_header('Access-Control-Allow-Methods', self.allow_methods)
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, Idempotency-Key, Last-Event-ID')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
-    def handle_request(self, method: str, body: str = ''):
+    def build_event(self, method: str, body: str = '') -> dict:
         parsed = urlparse(self.path)
-
-        event = {
+        query_params = parse_qs(parsed.query)
+        return {
             'httpMethod': method,
             'path': parsed.path,
+            'queryStringParameters': {k: v[0] for k, v in query_params.items()},
             'headers': dict(self.headers),
             'body': body,
+            'requestContext': {'identity': {'sourceIp': self.client_address[0]}},
         }
 
-        # Debug logging
-        print(f"[Ballot] {method} {parsed.path}")
-        print(f"[Ballot] Headers: {dict(self.headers)}")
+    def read_body(self) -> str:
+        content_length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(content_length).decode() if content_length else ''
+
+    def handle_request(self, method: str, body: str = ''):
+        start = time.perf_counter()
+        event = self.build_event(method, body)
+
+        logger.debug("%s %s headers=%s", self.name, method, dict(self.headers))
         if body:
-            print(f"[Ballot] Body: {body[:200]}")
+            logger.debug("%s body=%s", self.name, body[:200])
 
-        result = ballot_lambda.lambda_handler(event, None)
+        if self.try_stream(event, start):
+            return
 
-        print(f"[Ballot] Response: {result['statusCode']} - {result.get('body', '')[:200]}")
+        result = self.lambda_module.lambda_handler(event, None)
+        if result.get('isBase64Encoded'):
+            data = base64.b64decode(result['body'])  # e.g. a gzip-compressed body
+        else:
+            data = result.get('body', '').encode()
 
         self.send_response(result['statusCode'])
-        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_cors_headers()
         for key, value in result.get('headers', {}).items():
             self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+        logger.debug("%s response=%s", self.name, data[:200])
+        self.log_access(method, event['path'], result['statusCode'], len(data), start)
+
+    def try_stream(self, event: dict, start: float) -> bool:
+        """Hook for handlers that stream some responses. Returns True if it responded."""
+        return False
+
+    def stream_response(self, lines, method: str, path: str, start: float, content_type: str = 'application/x-ndjson'):
+        """Write a streamed body (NDJSON or Server-Sent Events) with chunked transfer encoding."""
+        self.send_response(200)
+        self.send_cors_headers()
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
         self.end_headers()
-        self.wfile.write(result.get('body', '').encode())
+        count = size = 0
+        try:
+            for line in lines:
+                chunk = line.encode()
+                self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+                count += 1
+                size += len(chunk)
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, which is how event streams normally end
+            self.close_connection = True
+            self.log_access(method, path, 200, size, start, lines=count, disconnected=True)
+            return
+        except Exception as e:
+            logger.error("%s stream aborted after %d lines: %s", self.name, count, e)
+            self.close_connection = True
+            return
+        self.log_access(method, path, 200, size, start, lines=count)
+
+    def log_access(self, method: str, path: str, status: int, size: int, start: float, **extra):
+        fields = ' '.join(f'{k}={v}' for k, v in extra.items())
+        logger.info(
+            "%s %s %s status=%d bytes=%d duration_ms=%.1f %s",
+            self.name, method, path, status, size, (time.perf_counter() - start) * 1000, fields,
+        )
+
+    def log_message(self, format, *args):
+        # Access lines are logged by log_access; only surface http.server errors
+        logger.debug("%s %s", self.name, format % args)
+
+    def log_error(self, format, *args):
+        logger.warning("%s %s", self.name, format % args)
+
+
+class SpotifyHandler(LambdaHandler):
+    lambda_module = spotify_lambda
+    name = 'Spotify'
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+
+class BallotHandler(LambdaHandler):
+    lambda_module = ballot_lambda
+    name = 'Ballot'
+    allow_methods = 'GET, POST, DELETE, OPTIONS'
+
+    def try_stream(self, event: dict, start: float) -> bool:
+        params = event['queryStringParameters']
+        if event['httpMethod'] != 'GET':
+            return False
+
+        # Push live results over one open connection, where the Lambda long-polls
+        if event['path'].endswith('/admin/results/stream'):
+            last_event_id = self.headers.get('Last-Event-ID') or params.get('lastEventId')
+            try:
+                election_id = ballot_lambda.parse_election(params.get('electionId'))
+                events = ballot_lambda.live_results_events(election_id, params, last_event_id)
+            except ValueError:
+                return False  # Let the lambda answer with a 400
+            self.stream_response(events, 'GET', event['path'], start, 'text/event-stream')
+            return True
+
+        # Stream NDJSON admin reads line by line instead of buffering the whole body
+        if not event['path'].endswith('/admin/ballots'):
+            return False
+        if params.get('format') != 'ndjson':
+            return False
+        try:
+            election_id = ballot_lambda.parse_election(params.get('electionId'))
+            lines = ballot_lambda.stream_admin_ballots(election_id, params)
+        except ValueError:
+            return False  # Let the lambda answer with a 400
+        self.stream_response(lines, 'GET', event['path'], start)
+        return True
 
     def do_GET(self):
         self.handle_request('GET')
 
     def do_POST(self):
-        content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length).decode()
-        self.handle_request('POST', body)
+        self.handle_request('POST', self.read_body())
 
     def do_DELETE(self):
         self.handle_request('DELETE')
 
-    def log_message(self, format, *args):
-        print(f"[Ballot] {args[0]}")
-
 
 def run_server(handler_class, port: int, name: str):
-    server = http.server.HTTPServer(('', port), handler_class)
+    server = http.server.ThreadingHTTPServer(('', port), handler_class)
     print(f"{name} server running on http://localhost:{port}")
     server.serve_forever()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Music Voting local development server')
+    parser.add_argument('--backend', choices=['dynamodb', 'memory'], default='dynamodb')
+    parser.add_argument('--verbose', action='store_true', help='Log request headers and bodies')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+    )
+    # boto3/urllib3 are noisy at DEBUG; keep them at WARNING even in verbose mode
+    for noisy in ('boto3', 'botocore', 'urllib3'):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
     print("=" * 50)
     print("Music Voting Local Development Server")
     print("=" * 50)
     print()
 
+    if args.backend == 'memory':
+        use_memory_backend()
     # Check DynamoDB connection before starting
-    if not check_dynamodb_connection():
+    elif not check_dynamodb_connection():
         print()
         print("Fix the above errors and try again.")
         sys.exit(1)
@@ -0,0 +1,424 @@
+"""
+In-memory stand-in for the DynamoDB resource API, used by `local_server.py --backend=memory`.
+
+Implements the subset of boto3's Table / service resource / client surface the
+Lambdas use: get/put/update/delete/scan/query, batch writes and reads, and
+TransactWriteItems, including the update and condition expressions they send.
+All operations are serialized under one lock, so it is safe to share between
+the threaded local servers. Data lives only as long as the process.
+"""
+import copy
+import re
+import threading
+from typing import Any
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+# Items returned per scan/query page when no Limit is given (real DynamoDB pages at 1 MB)
+DEFAULT_PAGE_SIZE = 1000
+
+_deserializer = TypeDeserializer()
+
+
+def client_error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+class Expression:
+    """Tokenizer and evaluator for DynamoDB update/condition/projection expressions."""
+
+    TOKEN = re.compile(r'\s*(<>|<=|>=|[=<>(),+\-]|[#:]?[A-Za-z_][\w]*(?:\.[#]?[A-Za-z_][\w]*)*)')
+
+    def __init__(self, names: dict[str, str] | None, values: dict[str, Any] | None) -> None:
+        self.names = names or {}
+        self.values = values or {}
+
+    def tokens(self, text: str) -> list[str]:
+        tokens, pos = [], 0
+        text = text.strip()
+        while pos < len(text):
+            match = self.TOKEN.match(text, pos)
+            if not match:
+                raise ValueError(f'Cannot parse expression near: {text[pos:]!r}')
+            tokens.append(match.group(1))
+            pos = match.end()
+            while pos < len(text) and text[pos].isspace():
+                pos += 1
+        return tokens
+
+    def path(self, token: str) -> list[str]:
+        return [self.names.get(part, part) for part in token.split('.')]
+
+    @staticmethod
+    def get(item: dict[str, Any], path: list[str]) -> Any:
+        for part in path:
+            if not isinstance(item, dict) or part not in item:
+                return None
+            item = item[part]
+        return item
+
+    @staticmethod
+    def set(item: dict[str, Any], path: list[str], value: Any) -> None:
+        for part in path[:-1]:
+            item = item.setdefault(part, {})
+        item[path[-1]] = value
+
+    @staticmethod
+    def remove(item: dict[str, Any], path: list[str]) -> None:
+        for part in path[:-1]:
+            item = item.get(part, {})
+        item.pop(path[-1], None)
+
+    # --- update expressions -------------------------------------------------
+
+    def operand(self, tokens: list[str], pos: int, item: dict[str, Any]) -> tuple[Any, int]:
+        token = tokens[pos]
+        if token == 'if_not_exists':
+            path, pos = self.path(tokens[pos + 2]), pos + 4  # if_not_exists ( path ,
+            default, pos = self.operand(tokens, pos, item)
+            current = self.get(item, path)
+            return (default if current is None else current), pos + 1  # )
+        if token == 'list_append':
+            first, pos = self.operand(tokens, pos + 2, item)
+            second, pos = self.operand(tokens, pos + 1, item)
+            return list(first or []) + list(second or []), pos + 1
+        if token.startswith(':'):
+            return copy.deepcopy(self.values[token]), pos + 1
+        return copy.deepcopy(self.get(item, self.path(token))), pos + 1
+
+    def apply_update(self, item: dict[str, Any], expression: str) -> None:
+        tokens = self.tokens(expression)
+        pos, action = 0, None
+        while pos < len(tokens):
+            if tokens[pos] in ('SET', 'ADD', 'REMOVE', 'DELETE'):
+                action, pos = tokens[pos], pos + 1
+                continue
+            if tokens[pos] == ',':
+                pos += 1
+                continue
+
+            path = self.path(tokens[pos])
+            if action == 'SET':
+                value, pos = self.operand(tokens, pos + 2, item)  # path =
+                while pos < len(tokens) and tokens[pos] in ('+', '-'):
+                    other, next_pos = self.operand(tokens, pos + 1, item)
+                    value = value + other if tokens[pos] == '+' else value - other
+                    pos = next_pos
+                self.set(item, path, value)
+            elif action == 'ADD':
+                value = self.values[tokens[pos + 1]]
+                current = self.get(item, path)
+                if isinstance(value, set):
+                    self.set(item, path, (current or set()) | value)
+                else:
+                    self.set(item, path, (current or 0) + value)
+                pos += 2
+            elif action == 'DELETE':
+                current = self.get(item, path) or set()
+                self.set(item, path, current - self.values[tokens[pos + 1]])
+                pos += 2
+            elif action == 'REMOVE':
+                self.remove(item, path)
+                pos += 1
+            else:
+                raise ValueError(f'Unsupported update expression: {expression!r}')
+
+    # --- condition expressions ----------------------------------------------
+
+    def check(self, item: dict[str, Any] | None, expression: str | None) -> bool:
+        if not expression:
+            return True
+        self._tokens = self.tokens(expression)
+        self._pos = 0
+        self._item = item or {}
+        return self._or()
+
+    def _peek(self) -> str | None:
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _next(self) -> str:
+        token = self._tokens[self._pos]
+        self._pos += 1
+        return token
+
+    def _or(self) -> bool:
+        result = self._and()
+        while self._peek() == 'OR':
+            self._next()
+            result = self._and() or result
+        return result
+
+    def _and(self) -> bool:
+        result = self._not()
+        while self._peek() == 'AND':
+            self._next()
+            result = self._not() and result
+        return result
+
+    def _not(self) -> bool:
+        if self._peek() == 'NOT':
+            self._next()
+            return not self._not()
+        return self._primary()
+
+    def _value(self) -> Any:
+        token = self._next()
+        if token.startswith(':'):
+            return self.values[token]
+        return self.get(self._item, self.path(token))
+
+    def _primary(self) -> bool:
+        token = self._peek()
+        if token == '(':
+            self._next()
+            result = self._or()
+            self._next()  # )
+            return result
+        if token in ('attribute_exists', 'attribute_not_exists', 'begins_with'):
+            self._next()
+            self._next()  # (
+            path = self.path(self._next())
+            if token == 'begins_with':
+                self._next()  # ,
+                prefix = self._value()
+                self._next()  # )
+                value = self.get(self._item, path)
+                return isinstance(value, str) and value.startswith(prefix)
+            self._next()  # )
+            exists = self.get(self._item, path) is not None
+            return exists if token == 'attribute_exists' else not exists
+
+        left = self._value()
+        op = self._next()
+        right = self._value()
+        if op == '=':
+            return left == right
+        if op == '<>':
+            return left != right
+        if left is None or right is None:
+            return False
+        return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[op]
+
+    # --- projections --------------------------------------------------------
+
+    def project(self, item: dict[str, Any], expression: str | None) -> dict[str, Any]:
+        if not expression:
+            return item
+        projected: dict[str, Any] = {}
+        for token in self.tokens(expression):
+            if token == ',':
+                continue
+            path = self.path(token)
+            value = self.get(item, path)
+            if value is not None:
+                self.set(projected, path, value)
+        return projected
+
+
+class MemoryBatchWriter:
+    def __init__(self, table: 'MemoryTable') -> None:
+        self.table = table
+
+    def put_item(self, Item: dict[str, Any]) -> None:
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key: dict[str, Any]) -> None:
+        self.table.delete_item(Key=Key)
+
+    def __enter__(self) -> 'MemoryBatchWriter':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+
+class MemoryTable:
+    """Thread-safe in-memory table with a hash key and optional range key."""
+
+    def __init__(self, store: 'MemoryDynamoDB', name: str, hash_key: str, range_key: str | None = None) -> None:
+        self.store = store
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.items: dict[tuple, dict[str, Any]] = {}
+
+    def _key(self, key: dict[str, Any]) -> tuple:
+        if self.range_key:
+            return (key[self.hash_key], key[self.range_key])
+        return (key[self.hash_key],)
+
+    def _key_dict(self, key: tuple) -> dict[str, Any]:
+        names = [self.hash_key] + ([self.range_key] if self.range_key else [])
+        return dict(zip(names, key))
+
+    def _conditional(self, current: dict[str, Any] | None, kwargs: dict[str, Any], operation: str) -> None:
+        expression = Expression(kwargs.get('ExpressionAttributeNames'), kwargs.get('ExpressionAttributeValues'))
+        if not expression.check(current, kwargs.get('ConditionExpression')):
+            raise client_error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+
+    def get_item(self, Key: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        with self.store.lock:
+            item = self.items.get(self._key(Key))
+            if item is None:
+                return {}
+            expression = Expression(kwargs.get('ExpressionAttributeNames'), None)
+            return {'Item': copy.deepcopy(expression.project(item, kwargs.get('ProjectionExpression')))}
+
+    def put_item(self, Item: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        with self.store.lock:
+            key = self._key(Item)
+            self._conditional(self.items.get(key), kwargs, 'PutItem')
+            self.items[key] = copy.deepcopy(Item)
+            return {}
+
+    def update_item(self, Key: dict[str, Any], UpdateExpression: str, **kwargs: Any) -> dict[str, Any]:
+        with self.store.lock:
+            key = self._key(Key)
+            current = self.items.get(key)
+            self._conditional(current, kwargs, 'UpdateItem')
+            item = copy.deepcopy(current) if current else dict(Key)
+            expression = Expression(kwargs.get('ExpressionAttributeNames'), kwargs.get('ExpressionAttributeValues'))
+            expression.apply_update(item, UpdateExpression)
+            self.items[key] = item
+            if kwargs.get('ReturnValues') == 'ALL_NEW':
+                return {'Attributes': copy.deepcopy(item)}
+            return {}
+
+    def delete_item(self, Key: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        with self.store.lock:
+            key = self._key(Key)
+            self._conditional(self.items.get(key), kwargs, 'DeleteItem')
+            self.items.pop(key, None)
+            return {}
+
+    def _page(self, keys: list[tuple], kwargs: dict[str, Any]) -> dict[str, Any]:
+        start = kwargs.get('ExclusiveStartKey')
+        if start:
+            start_key = self._key(start)
+            keys = [k for k in keys if k > start_key]
+
+        limit = kwargs.get('Limit', DEFAULT_PAGE_SIZE)
+        page, more = keys[:limit], len(keys) > limit
+        expression = Expression(kwargs.get('ExpressionAttributeNames'), kwargs.get('ExpressionAttributeValues'))
+        items = [
+            copy.deepcopy(expression.project(self.items[k], kwargs.get('ProjectionExpression')))
+            for k in page
+            if expression.check(self.items[k], kwargs.get('FilterExpression'))
+        ]
+        result: dict[str, Any] = {'Items': items, 'Count': len(items), 'ScannedCount': len(page)}
+        if more:
+            result['LastEvaluatedKey'] = self._key_dict(page[-1])
+        return result
+
+    def scan(self, **kwargs: Any) -> dict[str, Any]:
+        with self.store.lock:
+            keys = sorted(self.items)
+            if 'TotalSegments' in kwargs:
+                keys = [k for k in keys if hash(k) % kwargs['TotalSegments'] == kwargs['Segment']]
+            return self._page(keys, kwargs)
+
+    def query(self, KeyConditionExpression: str, **kwargs: Any) -> dict[str, Any]:
+        with self.store.lock:
+            expression = Expression(kwargs.get('ExpressionAttributeNames'), kwargs.get('ExpressionAttributeValues'))
+            keys = [
+                k for k in sorted(self.items, reverse=not kwargs.get('ScanIndexForward', True))
+                if expression.check(self._key_dict(k), KeyConditionExpression)
+            ]
+            return self._page(keys, kwargs)
+
+    def batch_writer(self, **kwargs: Any) -> MemoryBatchWriter:
+        return MemoryBatchWriter(self)
+
+
+class MemoryClient:
+    """The low-level client calls the Lambdas make (typed attribute values)."""
+
+    def __init__(self, store: 'MemoryDynamoDB') -> None:
+        self.store = store
+
+    @staticmethod
+    def _plain(values: dict[str, Any] | None) -> dict[str, Any] | None:
+        if values is None:
+            return None
+        return {k: _deserializer.deserialize(v) for k, v in values.items()}
+
+    def transact_write_items(self, TransactItems: list[dict[str, Any]]) -> dict[str, Any]:
+        with self.store.lock:
+            operations = []
+            for transact_item in TransactItems:
+                for kind, params in transact_item.items():
+                    params = dict(params)
+                    for field in ('Key', 'Item', 'ExpressionAttributeValues'):
+                        if field in params:
+                            params[field] = self._plain(params[field])
+                    operations.append((kind, params))
+
+            # Check every condition first so the transaction applies all-or-nothing
+            reasons = []
+            for kind, params in operations:
+                table = self.store.Table(params['TableName'])
+                key = params.get('Key') or params['Item']
+                current = table.items.get(table._key(key))
+                expression = Expression(params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues'))
+                ok = expression.check(current, params.get('ConditionExpression'))
+                reasons.append('None' if ok else 'ConditionalCheckFailed')
+            if any(r != 'None' for r in reasons):
+                raise client_error(
+                    'TransactionCanceledException',
+                    f'Transaction cancelled, please refer cancellation reasons for specific reasons [{", ".join(reasons)}]',
+                    'TransactWriteItems',
+                )
+
+            for kind, params in operations:
+                table = self.store.Table(params['TableName'])
+                if kind == 'Put':
+                    table.put_item(Item=params['Item'])
+                elif kind == 'Update':
+                    table.update_item(
+                        Key=params['Key'],
+                        UpdateExpression=params['UpdateExpression'],
+                        ExpressionAttributeNames=params.get('ExpressionAttributeNames'),
+                        ExpressionAttributeValues=params.get('ExpressionAttributeValues'),
+                    )
+                elif kind == 'Delete':
+                    table.delete_item(Key=params['Key'])
+            return {}
+
+
+class MemoryMeta:
+    def __init__(self, client: MemoryClient) -> None:
+        self.client = client
+
+
+class MemoryDynamoDB:
+    """Stand-in for `boto3.resource('dynamodb')` holding named in-memory tables."""
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.tables: dict[str, MemoryTable] = {}
+        self.meta = MemoryMeta(MemoryClient(self))
+
+    def create_table(self, name: str, hash_key: str, range_key: str | None = None) -> MemoryTable:
+        with self.lock:
+            if name not in self.tables:
+                self.tables[name] = MemoryTable(self, name, hash_key, range_key)
+            return self.tables[name]
+
+    def Table(self, name: str) -> MemoryTable:
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise client_error('ResourceNotFoundException', f'Requested resource not found: {name}', 'DescribeTable')
+
+    def batch_get_item(self, RequestItems: dict[str, Any]) -> dict[str, Any]:
+        responses: dict[str, list[dict[str, Any]]] = {}
+        with self.lock:
+            for name, request in RequestItems.items():
+                table = self.Table(name)
+                responses[name] = [
+                    copy.deepcopy(table.items[table._key(key)])
+                    for key in request['Keys']
+                    if table._key(key) in table.items
+                ]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
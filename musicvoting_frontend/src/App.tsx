@@ -1,21 +1,22 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { Tab, TabGroup, TabList, TabPanel, TabPanels } from '@headlessui/react';
 import { LoginForm } from './components/LoginForm';
 import { BallotEditor } from './components/BallotEditor';
 import { ResultsViewer } from './components/ResultsViewer';
 import { ErrorBanner } from './components/ErrorBanner';
 import { useAuth } from './hooks/useAuth';
-import { getBallot, saveBallot, deleteBallot, getAllBallots } from './api';
+import { getBallot, saveBallot, deleteBallot } from './api';
 import type { Ballot, BallotEntry } from './types';
 import { getVotePeriodLabel } from './config';
 
 function App() {
   const { isAuthenticated, username, displayName, isLoading, error, login, logout } = useAuth();
   const [existingBallot, setExistingBallot] = useState<Ballot | null>(null);
-  const [ballots, setBallots] = useState<Ballot[]>([]);
   const [isLoadingBallot, setIsLoadingBallot] = useState(false);
   const [selectedTab, setSelectedTab] = useState(0);
   const [apiError, setApiError] = useState<string | null>(null);
+  // One key per save intent: retries of the same entries reuse it until a save succeeds
+  const pendingSave = useRef<{ entries: string; idempotencyKey: string } | null>(null);
 
   useEffect(() => {
     if (isAuthenticated && username) {
@@ -33,18 +34,6 @@ function App() {
     }
   }, [isAuthenticated, username]);
 
-  useEffect(() => {
-    if (isAuthenticated && selectedTab === 1) {
-      setApiError(null);
-      getAllBallots()
-        .then(setBallots)
-        .catch((err) => {
-          console.error(err);
-          setApiError('Failed to load results. Check if the backend server is running.');
-        });
-    }
-  }, [isAuthenticated, selectedTab]);
-
   const handleSave = useCallback(
     async (entries: BallotEntry[]) => {
       if (!username) return;
@@ -53,10 +42,15 @@ function App() {
         entries,
         submittedAt: new Date().toISOString(),
       };
-      const result = await saveBallot(ballot);
+      const intent = JSON.stringify(entries);
+      if (pendingSave.current?.entries !== intent) {
+        pendingSave.current = { entries: intent, idempotencyKey: crypto.randomUUID() };
+      }
+      const result = await saveBallot(ballot, pendingSave.current.idempotencyKey);
       if (!result.success) {
         throw new Error(result.error);
       }
+      pendingSave.current = null;
       setExistingBallot(ballot);
     },
     [username]
@@ -167,7 +161,7 @@ function App() {
 
             {username?.toLowerCase() === 'hen' && (
               <TabPanel>
-                <ResultsViewer ballots={ballots} />
+                <ResultsViewer />
               </TabPanel>
             )}
           </TabPanels>
@@ -1,10 +1,32 @@
 import { CONFIG } from './config';
-import type { SpotifyTrack, Ballot } from './types';
+import type {
+  SpotifyTrack,
+  Ballot,
+  RankingAlgorithm,
+  RankingResult,
+  ResultsDelta,
+  ResultsMethod,
+  ResultsResponse,
+  ResultsSnapshotManifest,
+} from './types';
+
+// Thrown when the search proxy sheds a request; retryAfter is in seconds
+export class RateLimitedError extends Error {
+  retryAfter: number;
+
+  constructor(retryAfter: number) {
+    super('Too many searches');
+    this.retryAfter = retryAfter;
+  }
+}
 
 export async function searchTracks(query: string): Promise<SpotifyTrack[]> {
   const response = await fetch(
     `${CONFIG.SPOTIFY_API_URL}/search?q=${encodeURIComponent(query)}`
   );
+  if (response.status === 429) {
+    throw new RateLimitedError(Number(response.headers.get('Retry-After')) || 1);
+  }
   if (!response.ok) {
     throw new Error('Failed to search tracks');
   }
@@ -12,8 +34,10 @@ export async function searchTracks(query: string): Promise<SpotifyTrack[]> {
   return data.tracks;
 }
 
+const election = `electionId=${encodeURIComponent(CONFIG.ELECTION_ID)}`;
+
 export async function getBallot(username: string): Promise<Ballot | null> {
-  const response = await fetch(`${CONFIG.BALLOT_API_URL}/ballot/${username}`);
+  const response = await fetch(`${CONFIG.BALLOT_API_URL}/ballot/${username}?${election}`);
   if (response.status === 404) {
     return null;
   }
@@ -23,15 +47,18 @@ export async function getBallot(username: string): Promise<Ballot | null> {
   return response.json();
 }
 
+// Pass the same idempotencyKey when retrying a save so it is applied at most once
 export async function saveBallot(
-  ballot: Ballot
-): Promise<{ success: boolean; error?: string }> {
+  ballot: Ballot,
+  idempotencyKey: string
+): Promise<{ success: boolean; error?: string; unchanged?: boolean; replayed?: boolean }> {
   const response = await fetch(`${CONFIG.BALLOT_API_URL}/ballot`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
+      'Idempotency-Key': idempotencyKey,
     },
-    body: JSON.stringify(ballot),
+    body: JSON.stringify({ ...ballot, electionId: CONFIG.ELECTION_ID }),
   });
   return response.json();
 }
@@ -39,16 +66,147 @@ export async function saveBallot(
 export async function deleteBallot(
   username: string
 ): Promise<{ success: boolean; error?: string }> {
-  const response = await fetch(`${CONFIG.BALLOT_API_URL}/ballot/${username}`, {
+  const response = await fetch(`${CONFIG.BALLOT_API_URL}/ballot/${username}?${election}`, {
     method: 'DELETE',
   });
   return response.json();
 }
 
-export async function getAllBallots(): Promise<Ballot[]> {
-  const response = await fetch(`${CONFIG.BALLOT_API_URL}/admin/ballots`);
+async function fetchSnapshotFile<T>(url: string): Promise<T | null> {
+  try {
+    const response = await fetch(url);
+    // CloudFront answers missing paths with index.html, so only trust JSON
+    if (!response.ok || !response.headers.get('content-type')?.includes('application/json')) {
+      return null;
+    }
+    return await response.json();
+  } catch {
+    return null;
+  }
+}
+
+// Looked up once per page load; null until the vote has closed and results are published
+let snapshotManifest: Promise<ResultsSnapshotManifest | null> | null = null;
+
+export function getResultsSnapshot(): Promise<ResultsSnapshotManifest | null> {
+  if (!snapshotManifest) {
+    snapshotManifest = fetchSnapshotFile<ResultsSnapshotManifest>(CONFIG.RESULTS_SNAPSHOT_URL);
+  }
+  return snapshotManifest;
+}
+
+async function getSnapshotDocument<T>(name: string): Promise<T | null> {
+  const manifest = await getResultsSnapshot();
+  const file = manifest?.files[name];
+  if (!file) {
+    return null;
+  }
+  // Manifest paths are absolute on the host that serves the manifest
+  const base = new URL(CONFIG.RESULTS_SNAPSHOT_URL, window.location.href);
+  return fetchSnapshotFile<T>(new URL(file, base).href);
+}
+
+// One page of an election's ballots; pass the returned cursor back for the next, until it is null
+export async function getBallotsPage(
+  cursor: string | null,
+  limit = 50
+): Promise<{ items: Ballot[]; cursor: string | null }> {
+  const params = new URLSearchParams({ electionId: CONFIG.ELECTION_ID, limit: String(limit) });
+  if (cursor) params.set('cursor', cursor);
+  const response = await fetch(`${CONFIG.BALLOT_API_URL}/admin/ballots?${params}`);
   if (!response.ok) {
     throw new Error('Failed to get ballots');
   }
   return response.json();
 }
+
+export async function getResults(
+  algorithm: ResultsMethod,
+  top = 100
+): Promise<ResultsResponse> {
+  const published = await getSnapshotDocument<ResultsResponse>(algorithm);
+  if (published) {
+    return { ...published, results: published.results.slice(0, top) };
+  }
+
+  const params = new URLSearchParams({ electionId: CONFIG.ELECTION_ID, algorithm, top: String(top) });
+  const response = await fetch(`${CONFIG.BALLOT_API_URL}/admin/results?${params}`);
+  if (!response.ok) {
+    throw new Error('Failed to get results');
+  }
+  return response.json();
+}
+
+// FNV-1a over the ranked track IDs, matching ranking_checksum in backend_ballot/live_results.py
+function rankingChecksum(results: RankingResult[]): string {
+  const text = results.map((r) => r.trackId).join(',');
+  let hash = 0x811c9dc5;
+  for (let i = 0; i < text.length; i++) {
+    hash = Math.imul(hash ^ text.charCodeAt(i), 0x01000193) >>> 0;
+  }
+  return hash.toString(16).padStart(8, '0');
+}
+
+// Returns null if the result doesn't match the server's order, i.e. this copy is out of sync
+export function applyResultsDelta(results: RankingResult[], delta: ResultsDelta, top: number): RankingResult[] | null {
+  const previous = new Map(results.map((r) => [r.trackId, r]));
+  const moved = new Set([...delta.removed, ...delta.changes.map((c) => c.trackId)]);
+  const ranked = results
+    .map((result, index) => ({ rank: index + 1, result }))
+    .filter(({ result }) => !moved.has(result.trackId));
+  for (const change of delta.changes) {
+    ranked.push({
+      rank: change.rank,
+      result: {
+        trackId: change.trackId,
+        track: change.track ?? previous.get(change.trackId)?.track ?? null,
+        score: change.score,
+        votes: change.votes,
+        positions: change.positions,
+      },
+    });
+  }
+  const next = ranked
+    .sort((a, b) => a.rank - b.rank)
+    .slice(0, top)
+    .map(({ result }) => result);
+  return rankingChecksum(next) === delta.checksum ? next : null;
+}
+
+// Live top-N for a scoring algorithm: one snapshot, then only what changes, pushed over
+// Server-Sent Events. Calls onUpdate with the full current results; returns a function to stop.
+export function subscribeResults(
+  algorithm: RankingAlgorithm,
+  top: number,
+  onUpdate: (data: ResultsResponse) => void
+): () => void {
+  const params = new URLSearchParams({ electionId: CONFIG.ELECTION_ID, algorithm, top: String(top) });
+  const url = `${CONFIG.BALLOT_API_URL}/admin/results/stream?${params}`;
+  let source: EventSource;
+  let current: ResultsResponse | null = null;
+
+  const connect = () => {
+    source = new EventSource(url);
+    source.addEventListener('snapshot', (event) => {
+      current = JSON.parse((event as MessageEvent).data);
+      onUpdate(current!);
+    });
+    source.addEventListener('delta', (event) => {
+      if (!current) return;
+      const delta: ResultsDelta = JSON.parse((event as MessageEvent).data);
+      const results = applyResultsDelta(current.results, delta, top);
+      if (!results) {
+        // Out of sync: start again from a snapshot
+        source.close();
+        current = null;
+        connect();
+        return;
+      }
+      current = { ...current, stats: delta.stats, results };
+      onUpdate(current);
+    });
+  };
+
+  connect();
+  return () => source.close();
+}
@@ -1,88 +1,80 @@
-import { useState, useMemo } from 'react';
+import { useState, useEffect } from 'react';
 import { Tab, TabGroup, TabList, TabPanel, TabPanels } from '@headlessui/react';
-import type { Ballot, RankingResult, RankingAlgorithm, SpotifyTrack } from '../types';
-import { CONFIG } from '../config';
+import type { Ballot, RankingAlgorithm, RankingResult, ResultsMethod, ResultsStats } from '../types';
+import { getBallotsPage, getResults, getResultsSnapshot, subscribeResults } from '../api';
 
-interface ResultsViewerProps {
-  ballots: Ballot[];
-}
-
-function calculateRankings(
-  ballots: Ballot[],
-  algorithm: RankingAlgorithm
-): RankingResult[] {
-  const trackScores = new Map<string, { track: SpotifyTrack; score: number; votes: number; positions: number[] }>();
-
-  for (const ballot of ballots) {
-    for (const entry of ballot.entries) {
-      const existing = trackScores.get(entry.trackId);
-      let score: number;
-
-      switch (algorithm) {
-        case 'borda':
-          score = CONFIG.MAX_SONGS - entry.rank + 1;
-          break;
-        case 'harmonic':
-          score = 1 / entry.rank;
-          break;
-        case 'logarithmic':
-          score = Math.log2(CONFIG.MAX_SONGS + 2 - entry.rank);
-          break;
-        case 'exponential':
-          score = Math.pow(2, CONFIG.MAX_SONGS - entry.rank);
-          break;
-        case 'bayesian':
-          score = (CONFIG.MAX_SONGS - entry.rank + 1) / CONFIG.MAX_SONGS;
-          break;
-        default:
-          score = CONFIG.MAX_SONGS - entry.rank + 1;
-      }
-
-      if (existing) {
-        existing.score += score;
-        existing.votes += 1;
-        existing.positions.push(entry.rank);
-      } else {
-        trackScores.set(entry.trackId, {
-          track: entry.track,
-          score,
-          votes: 1,
-          positions: [entry.rank],
-        });
-      }
-    }
-  }
-
-  return Array.from(trackScores.values())
-    .sort((a, b) => b.score - a.score)
-    .map((item) => ({
-      ...item,
-      score: Math.round(item.score * 100) / 100,
-    }));
-}
-
-const ALGORITHMS: { id: RankingAlgorithm; name: string; description: string }[] = [
+const ALGORITHMS: { id: ResultsMethod; name: string; description: string }[] = [
   { id: 'borda', name: 'Borda Count', description: 'Linear scoring (1st=20pts, 20th=1pt). Fair and balanced - every position matters equally in terms of point difference.' },
   { id: 'harmonic', name: 'Harmonic', description: 'Strong top bias (1st=1pt, 2nd=0.5pt, 10th=0.1pt). Your #1 pick is worth as much as picks #2-20 combined.' },
   { id: 'logarithmic', name: 'Logarithmic', description: 'Moderate top bias using log2 scale. Top 5 picks carry most weight, but lower ranks still contribute meaningfully.' },
   { id: 'exponential', name: 'Exponential', description: 'Extreme top bias (1st=524k pts, 2nd=262k pts). Your #1 pick completely dominates - great for finding consensus favorites.' },
   { id: 'bayesian', name: 'Bayesian', description: 'Normalized 0-1 scale (1st=1.0, 20th=0.05). Same as Borda but scaled for easier interpretation.' },
+  { id: 'irv', name: 'Instant Runoff', description: 'Last-place tracks are eliminated round by round and their votes move to each ballot\'s next choice. Score is the track\'s votes in its final round.' },
+  { id: 'schulze', name: 'Schulze', description: 'Condorcet method over head-to-head matchups, resolving cycles by the strongest chain of wins. Score is how many tracks it beats.' },
+  { id: 'copeland', name: 'Copeland', description: 'Counts head-to-head wins (ties are half a win) against every other track. Score is wins plus half the ties.' },
 ];
 
-export function ResultsViewer({ ballots }: ResultsViewerProps) {
-  const [selectedAlgorithm, setSelectedAlgorithm] = useState<RankingAlgorithm>('borda');
-
-  const rankings = useMemo(
-    () => calculateRankings(ballots, selectedAlgorithm),
-    [ballots, selectedAlgorithm]
-  );
+// Scoring algorithms follow the live tally; the ordinal methods need every ballot, so they load once
+const LIVE_ALGORITHMS: ResultsMethod[] = ['borda', 'harmonic', 'logarithmic', 'exponential', 'bayesian'];
+
+const TOP = 100;
+
+export function ResultsViewer() {
+  const [selectedAlgorithm, setSelectedAlgorithm] = useState<ResultsMethod>('borda');
+
+  // Individual ballots are paged in on request; the rankings above never need them
+  const [ballots, setBallots] = useState<Ballot[]>([]);
+  const [ballotsCursor, setBallotsCursor] = useState<string | null | undefined>(undefined);
+  const [isLoadingBallots, setIsLoadingBallots] = useState(false);
+  const [ballotsError, setBallotsError] = useState<string | null>(null);
+
+  const [rankings, setRankings] = useState<RankingResult[]>([]);
+  const [voterStats, setVoterStats] = useState<ResultsStats>({
+    totalVoters: 0,
+    uniqueTracks: 0,
+    totalVotes: 0,
+  });
+
+  // Rankings are tallied server-side; only the top 100 are sent to the browser, and
+  // while the vote is open only their changes follow
+  useEffect(() => {
+    let cancelled = false;
+    let unsubscribe = () => {};
+    const show = (data: { results: RankingResult[]; stats: ResultsStats }) => {
+      if (cancelled) return;
+      setRankings(data.results);
+      setVoterStats(data.stats);
+    };
 
-  const voterStats = useMemo(() => {
-    return {
-      totalVoters: ballots.length,
-      uniqueTracks: new Set(ballots.flatMap((b) => b.entries.map((e) => e.trackId))).size,
+    getResultsSnapshot()
+      .then((published) => {
+        if (cancelled) return;
+        if (published || !LIVE_ALGORITHMS.includes(selectedAlgorithm)) {
+          return getResults(selectedAlgorithm, TOP).then(show);
+        }
+        unsubscribe = subscribeResults(selectedAlgorithm as RankingAlgorithm, TOP, show);
+      })
+      .catch((err) => console.error(err));
+    return () => {
+      cancelled = true;
+      unsubscribe();
     };
-  }, [ballots]);
+  }, [selectedAlgorithm]);
+
+  const loadBallots = async () => {
+    setIsLoadingBallots(true);
+    setBallotsError(null);
+    try {
+      const page = await getBallotsPage(ballotsCursor ?? null);
+      setBallots((prev) => [...prev, ...page.items]);
+      setBallotsCursor(page.cursor);
+    } catch (err) {
+      console.error(err);
+      setBallotsError('Failed to load ballots.');
+    } finally {
+      setIsLoadingBallots(false);
+    }
+  };
 
   return (
     <div className="space-y-6">
@@ -97,7 +89,7 @@ export function ResultsViewer({ ballots }: ResultsViewerProps) {
         </div>
         <div className="rounded-xl border border-slate-700/50 bg-slate-800/50 p-4">
           <p className="text-sm text-slate-400">Total Votes</p>
-          <p className="text-2xl font-bold text-slate-100">{ballots.length * CONFIG.MAX_SONGS}</p>
+          <p className="text-2xl font-bold text-slate-100">{voterStats.totalVotes}</p>
         </div>
         <div className="rounded-xl border border-slate-700/50 bg-slate-800/50 p-4">
           <p className="text-sm text-slate-400">Algorithm</p>
@@ -138,9 +130,9 @@ export function ResultsViewer({ ballots }: ResultsViewerProps) {
         </div>
       ) : (
         <div className="space-y-2">
-          {rankings.slice(0, 100).map((result, index) => (
+          {rankings.map((result, index) => (
             <div
-              key={result.track.id}
+              key={result.trackId}
               className={`flex items-center gap-4 rounded-xl border p-4 transition-all ${
                 index < 3
                   ? 'border-amber-500/30 bg-amber-900/10'
@@ -161,7 +153,7 @@ export function ResultsViewer({ ballots }: ResultsViewerProps) {
                 {index + 1}
               </div>
 
-              {result.track.album.images[2] && (
+              {result.track?.album.images[2] && (
                 <img
                   src={result.track.album.images[2].url}
                   alt=""
@@ -170,9 +162,9 @@ export function ResultsViewer({ ballots }: ResultsViewerProps) {
               )}
 
               <div className="flex-1 min-w-0">
-                <p className="truncate font-medium text-slate-100">{result.track.name}</p>
+                <p className="truncate font-medium text-slate-100">{result.track?.name ?? result.trackId}</p>
                 <p className="truncate text-sm text-slate-400">
-                  {result.track.artists.map((a) => a.name).join(', ')}
+                  {result.track?.artists.map((a) => a.name).join(', ')}
                 </p>
               </div>
 
@@ -186,7 +178,7 @@ export function ResultsViewer({ ballots }: ResultsViewerProps) {
               <div className="hidden md:block shrink-0 w-32">
                 <p className="text-xs text-slate-500">Positions</p>
                 <p className="text-sm text-slate-400">
-                  {result.positions.sort((a, b) => a - b).slice(0, 5).join(', ')}
+                  {result.positions.slice(0, 5).join(', ')}
                   {result.positions.length > 5 ? '...' : ''}
                 </p>
               </div>
@@ -212,7 +204,7 @@ export function ResultsViewer({ ballots }: ResultsViewerProps) {
                 {ballot.entries.slice(0, 5).map((entry) => (
                   <li key={entry.trackId} className="flex items-center gap-2 text-slate-300">
                     <span className="w-5 text-slate-500">{entry.rank}.</span>
-                    <span className="truncate">{entry.track.name}</span>
+                    <span className="truncate">{entry.track?.name ?? entry.trackId}</span>
                   </li>
                 ))}
                 {ballot.entries.length > 5 && (
@@ -222,6 +214,16 @@ export function ResultsViewer({ ballots }: ResultsViewerProps) {
             </div>
           ))}
         </div>
+        {ballotsError && <p className="mt-4 text-sm text-rose-400">{ballotsError}</p>}
+        {ballotsCursor !== null && (
+          <button
+            onClick={loadBallots}
+            disabled={isLoadingBallots}
+            className="mt-4 rounded-xl border border-slate-600/50 px-4 py-2 text-sm text-slate-300 hover:bg-slate-800/50 transition-all disabled:opacity-50"
+          >
+            {isLoadingBallots ? 'Loading...' : ballotsCursor === undefined ? 'Show ballots' : 'Load more ballots'}
+          </button>
+        )}
       </div>
     </div>
   );
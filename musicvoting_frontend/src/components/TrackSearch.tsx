@@ -1,6 +1,6 @@
 import { useState, useCallback, useRef } from 'react';
 import { Combobox, ComboboxInput, ComboboxOptions, ComboboxOption } from '@headlessui/react';
-import { searchTracks } from '../api';
+import { RateLimitedError, searchTracks } from '../api';
 import type { SpotifyTrack } from '../types';
 import { CONFIG } from '../config';
 
@@ -43,7 +43,11 @@ export function TrackSearch({ onSelect, excludeIds = [] }: TrackSearchProps) {
       } catch (error) {
         console.error('Search failed:', error);
         setTracks([]);
-        setSearchError('Search failed. Check if the Spotify API server is running.');
+        setSearchError(
+          error instanceof RateLimitedError
+            ? `Lots of people are searching right now. Try again in ${error.retryAfter}s.`
+            : 'Search failed. Check if the Spotify API server is running.'
+        );
       } finally {
         setIsLoading(false);
       }
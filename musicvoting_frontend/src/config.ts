@@ -1,6 +1,12 @@
 export const CONFIG = {
   SPOTIFY_API_URL: import.meta.env.VITE_SPOTIFY_API_URL || 'http://localhost:3001',
   BALLOT_API_URL: import.meta.env.VITE_BALLOT_API_URL || 'http://localhost:3002',
+  // Ballots and results belong to this election (the ballot Lambda's ELECTION_ID)
+  ELECTION_ID: import.meta.env.VITE_ELECTION_ID || '2025',
+  // Manifest of the election's results snapshot, published to CloudFront when the vote closes
+  RESULTS_SNAPSHOT_URL:
+    import.meta.env.VITE_RESULTS_SNAPSHOT_URL ||
+    `/results/${import.meta.env.VITE_ELECTION_ID || '2025'}/latest.json`,
   VOTE_START_YEAR: 2015,
   VOTE_END_YEAR: 2025,
   VOTE_START_DATE: '2015-01-01',
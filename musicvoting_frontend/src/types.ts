@@ -20,6 +20,7 @@ export interface BallotEntry {
 }
 
 export interface Ballot {
+  electionId?: string;
   username: string;
   entries: BallotEntry[];
   submittedAt?: string;
@@ -40,10 +41,42 @@ export interface VoteConfig {
 }
 
 export interface RankingResult {
-  track: SpotifyTrack;
+  trackId: string;
+  track: SpotifyTrack | null;
   score: number;
   votes: number;
   positions: number[];
 }
 
 export type RankingAlgorithm = 'borda' | 'harmonic' | 'logarithmic' | 'exponential' | 'bayesian';
+
+// Ordinal methods computed from whole ballots on the server (see backend_ballot/voting_methods.py)
+export type VotingMethod = 'irv' | 'schulze' | 'copeland';
+
+export type ResultsMethod = RankingAlgorithm | VotingMethod;
+
+export interface ResultsStats {
+  totalVoters: number;
+  uniqueTracks: number;
+  totalVotes: number;
+}
+
+// Published by the ballot Lambda at vote close; maps each ResultsMethod to a file
+export interface ResultsSnapshotManifest {
+  generatedAt: string;
+  files: Record<string, string>;
+}
+
+export interface ResultsResponse {
+  algorithm: ResultsMethod;
+  stats: ResultsStats;
+  results: RankingResult[];
+}
+
+// A `delta` event from GET /admin/results/stream: entries that entered or moved, with their new 1-based rank
+export interface ResultsDelta {
+  stats: ResultsStats;
+  changes: (Omit<RankingResult, 'track'> & { track?: SpotifyTrack | null; rank: number; previousRank: number | null })[];
+  removed: string[];
+  checksum: string;
+}
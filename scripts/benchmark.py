@@ -0,0 +1,356 @@
+"""
+Benchmark the ballot and search Lambdas with synthetic elections.
+
+Generates ballots whose track popularity follows a Zipf distribution, then
+drives backend_ballot's lambda_handler with concurrent clients, either
+directly or over HTTP through local_server.py. Every phase (save, get,
+rescind, admin scan, results, and optionally search/suggest) reports
+p50/p95/p99 latency, throughput and the peak memory traced for one
+representative request.
+
+Runs need no AWS or Docker. Each (size, mode) run gets fresh in-memory tables
+from local_server's --backend=memory, and search phases use the Spotify stub
+server.
+
+Usage:
+  python scripts/benchmark.py
+  python scripts/benchmark.py --ballots 1000,10000,100000 --mode both --clients 16
+  python scripts/benchmark.py --search                      # include search/suggest phases
+  python scripts/benchmark.py --url http://localhost:3002   # against a running local_server.py
+  python scripts/benchmark.py --output bench.json --compare baseline.json
+      Fails (exit 1) if any phase's p95 regressed by more than --threshold percent.
+"""
+import argparse
+import bisect
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from urllib.parse import urlencode, urlparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MAX_SONGS = 20
+PHASES = ('save', 'get', 'rescind', 'admin_scan', 'results', 'search', 'suggest')
+
+
+class ZipfSampler:
+    """Draw integers in [0, n) with P(k) proportional to 1 / (k + 1) ** exponent."""
+
+    def __init__(self, n: int, exponent: float) -> None:
+        self.cumulative = []
+        total = 0.0
+        for k in range(n):
+            total += 1 / (k + 1) ** exponent
+            self.cumulative.append(total)
+
+    def sample(self, rng: random.Random) -> int:
+        return bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])
+
+
+def synthetic_track(k: int) -> dict[str, Any]:
+    return {
+        'id': f'bench{k:017d}',  # Spotify-shaped: 22 base62 characters
+        'name': f'Song {k}',
+        'artists': [{'name': f'Artist {k % 997}'}],
+        'album': {'name': f'Album {k % 1999}', 'images': []},
+    }
+
+
+def synthetic_ballots(count: int, tracks: int, exponent: float, seed: int) -> list[dict[str, Any]]:
+    """Ballots of 5-20 distinct tracks, drawn with Zipfian popularity."""
+    rng = random.Random(seed)
+    sampler = ZipfSampler(tracks, exponent)
+    ballots = []
+    for i in range(count):
+        size = rng.randint(5, min(MAX_SONGS, tracks))
+        picked: list[int] = []
+        while len(picked) < size:
+            k = sampler.sample(rng)
+            if k not in picked:
+                picked.append(k)
+        ballots.append({
+            'username': f'voter{i:06d}',
+            'entries': [
+                {'rank': rank, 'trackId': f'bench{k:017d}', 'track': synthetic_track(k)}
+                for rank, k in enumerate(picked, start=1)
+            ],
+            'submittedAt': '2026-01-01T00:00:00Z',
+        })
+    return ballots
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class DirectClient:
+    """Invoke lambda_handler in-process with API Gateway-style events."""
+
+    def __init__(self, ballot_lambda: Any, spotify_lambda: Any) -> None:
+        self.handlers = {'ballot': ballot_lambda.lambda_handler, 'spotify': spotify_lambda.lambda_handler}
+
+    def call(self, api: str, method: str, path: str, params: dict | None = None, body: Any = None) -> int:
+        event = {
+            'httpMethod': method,
+            'path': path,
+            'queryStringParameters': params or {},
+            'headers': {},
+            'body': json.dumps(body) if body is not None else '',
+        }
+        return self.handlers[api](event, None)['statusCode']
+
+
+class HTTPClient:
+    """Call the local servers over HTTP/1.1, one keep-alive connection per client thread."""
+
+    def __init__(self, urls: dict[str, str]) -> None:
+        self.urls = {api: urlparse(url) for api, url in urls.items()}
+        self._local = threading.local()
+
+    def _connection(self, api: str) -> http.client.HTTPConnection:
+        connections = self._local.__dict__.setdefault('connections', {})
+        if api not in connections:
+            url = self.urls[api]
+            connections[api] = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+        return connections[api]
+
+    def call(self, api: str, method: str, path: str, params: dict | None = None, body: Any = None) -> int:
+        target = path + ('?' + urlencode(params) if params else '')
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data else {}
+        for attempt in range(2):
+            connection = self._connection(api)
+            try:
+                connection.request(method, target, body=data, headers=headers)
+                result = connection.getresponse()
+                result.read()
+                return result.status
+            except (ConnectionError, http.client.HTTPException):
+                # The server closed an idle keep-alive connection; reconnect once
+                connection.close()
+                del self._local.connections[api]
+                if attempt:
+                    raise
+        return 0
+
+
+def run_phase(call: Callable[[Any], int], requests: list[Any], clients: int) -> dict[str, Any]:
+    """Run `call` over `requests` with `clients` concurrent workers and summarize latency."""
+    def timed(request: Any) -> tuple[float, int]:
+        start = time.perf_counter()
+        try:
+            status = call(request)
+        except Exception as e:
+            print(f"Request error: {e}")
+            status = 0
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(timed, requests))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(elapsed * 1000 for elapsed, _ in results)
+    return {
+        'ops': len(results),
+        'errors': sum(1 for _, status in results if not 200 <= status < 300),
+        'p50Ms': round(percentile(latencies, 50), 3),
+        'p95Ms': round(percentile(latencies, 95), 3),
+        'p99Ms': round(percentile(latencies, 99), 3),
+        'opsPerSec': round(len(results) / wall, 1) if wall else 0.0,
+    }
+
+
+def peak_memory(call: Callable[[Any], int], request: Any) -> int:
+    """Peak bytes allocated (traced by tracemalloc) while serving one request."""
+    tracemalloc.start()
+    try:
+        call(request)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(client: Any, ballots: list[dict], args: argparse.Namespace, in_process: bool) -> dict[str, dict]:
+    """Run every phase against one freshly loaded election."""
+    rng = random.Random(args.seed)
+    usernames = [b['username'] for b in ballots]
+    ops = min(args.ops, len(ballots))
+
+    phases: dict[str, tuple[Callable[[Any], int], list[Any]]] = {
+        'save': (lambda b: client.call('ballot', 'POST', '/ballot', body=b), ballots),
+        'get': (lambda u: client.call('ballot', 'GET', f'/ballot/{u}'), rng.sample(usernames, ops)),
+        'admin_scan': (lambda _: client.call('ballot', 'GET', '/admin/ballots'), [None] * args.scan_repeats),
+        'results': (
+            lambda a: client.call('ballot', 'GET', '/admin/results', {'algorithm': a}),
+            [rng.choice(('borda', 'harmonic', 'bayesian')) for _ in range(args.results_repeats)],
+        ),
+    }
+    if args.search:
+        # A Zipfian mix of queries, so repeated popular queries exercise the search cache
+        sampler = ZipfSampler(args.queries, args.zipf)
+        queries = [f'query {sampler.sample(rng)}' for _ in range(args.ops)]
+        phases['search'] = (lambda q: client.call('spotify', 'GET', '/search', {'q': q}), queries)
+        phases['suggest'] = (lambda q: client.call('spotify', 'GET', '/suggest', {'q': q}), [f'song {q[6:]}' for q in queries])
+    # Rescind last so the scan and results phases see the whole election
+    phases['rescind'] = (lambda u: client.call('ballot', 'DELETE', f'/ballot/{u}'), rng.sample(usernames, ops))
+
+    report = {}
+    for name in PHASES:
+        if name not in phases:
+            continue
+        call, requests = phases[name]
+        stats = run_phase(call, requests, args.clients)
+        stats['peakKiB'] = round(peak_memory(call, requests[-1]) / 1024, 1) if in_process else None
+        report[name] = stats
+        print(format_row(name, stats))
+    return report
+
+
+def format_row(name: str, stats: dict[str, Any]) -> str:
+    peak = f"{stats['peakKiB']:>10.1f}" if stats['peakKiB'] is not None else f"{'n/a':>10}"
+    return (
+        f"  {name:<11}{stats['ops']:>7}{stats['errors']:>7}{stats['p50Ms']:>10.2f}"
+        f"{stats['p95Ms']:>10.2f}{stats['p99Ms']:>10.2f}{stats['opsPerSec']:>10.1f}{peak}"
+    )
+
+
+def print_header(title: str) -> None:
+    print(f"\n{title}")
+    print(f"  {'phase':<11}{'ops':>7}{'errors':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'peak KiB':>10}")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict[str, Any], baseline_path: str, threshold: float) -> int:
+    """Print p95 changes against a previous --output file; return 1 if any phase regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r['ballots'], r['mode'], r['phase']): r for r in baseline['results']}
+
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit') or 'unknown commit'}), p95 latency:")
+    regressed = 0
+    for row in current['results']:
+        old = before.get((row['ballots'], row['mode'], row['phase']))
+        if not old or not old['p95Ms']:
+            continue
+        change = (row['p95Ms'] - old['p95Ms']) / old['p95Ms'] * 100
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressed += 1
+        print(f"  {row['ballots']:>7} {row['mode']:<7}{row['phase']:<11}{old['p95Ms']:>10.2f} -> {row['p95Ms']:>10.2f} ({change:+.1f}%){flag}")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ballot and search Lambdas')
+    parser.add_argument('--ballots', default='1000', help='Comma-separated election sizes (default: 1000)')
+    parser.add_argument('--mode', choices=['direct', 'http', 'both'], default='direct')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients (default: 8)')
+    parser.add_argument('--ops', type=int, default=1000, help='Requests per get/rescind/search phase (default: 1000)')
+    parser.add_argument('--scan-repeats', type=int, default=5, help='Full admin scans per run (default: 5)')
+    parser.add_argument('--results-repeats', type=int, default=50, help='Results requests per run (default: 50)')
+    parser.add_argument('--tracks', type=int, default=5000, help='Catalog size to draw from (default: 5000)')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent for track popularity (default: 1.1)')
+    parser.add_argument('--search', action='store_true', help='Also benchmark /search and /suggest against the Spotify stub')
+    parser.add_argument('--queries', type=int, default=200, help='Distinct search queries (default: 200)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help='Ballot API of an already running local_server.py (implies --mode http)')
+    parser.add_argument('--spotify-url', default='http://localhost:3001', help='Spotify API used with --url --search')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare p95 latencies with an earlier --output file')
+    parser.add_argument('--threshold', type=float, default=20.0, help='Regression threshold in percent (default: 20)')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.ballots.split(',')]
+    modes = ['http'] if args.url else ['direct', 'http'] if args.mode == 'both' else [args.mode]
+
+    os.environ['SEARCH_CACHE_BACKEND'] = 'none'
+    if args.search and not args.url:
+        sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+        import spotify_stub_server
+        stub = spotify_stub_server.start(0)
+        stub_url = f'http://127.0.0.1:{stub.server_address[1]}'
+        os.environ.update({
+            'SPOTIFY_CLIENT_ID': 'stub',
+            'SPOTIFY_CLIENT_SECRET': 'stub',
+            'SPOTIFY_ACCOUNTS_URL': stub_url,
+            'SPOTIFY_API_URL': stub_url,
+        })
+
+    sys.path.insert(0, ROOT)
+    import local_server
+
+    output: dict[str, Any] = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'clients': args.clients,
+        'results': [],
+    }
+    for size in sizes:
+        ballots = synthetic_ballots(size, args.tracks, args.zipf, args.seed)
+        for mode in modes:
+            if args.url:
+                client = HTTPClient({'ballot': args.url, 'spotify': args.spotify_url})
+                servers = []
+            else:
+                # Fresh tables and caches for every run
+                local_server.use_memory_backend()
+                local_server.ballot_lambda._track_cache.clear()
+                local_server.spotify_lambda.search_cache.local._data.clear()
+                local_server.spotify_lambda.suggest_index = local_server.spotify_lambda.PrefixIndex()
+                local_server.spotify_lambda._catalog_loaded_at = 0
+                client = DirectClient(local_server.ballot_lambda, local_server.spotify_lambda)
+                servers = []
+                if mode == 'http':
+                    servers = [
+                        local_server.http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+                        for handler in (local_server.BallotHandler, local_server.SpotifyHandler)
+                    ]
+                    for server in servers:
+                        threading.Thread(target=server.serve_forever, daemon=True).start()
+                    client = HTTPClient({
+                        api: f'http://127.0.0.1:{server.server_address[1]}'
+                        for api, server in zip(('ballot', 'spotify'), servers)
+                    })
+
+            print_header(f"{size} ballots, {mode}, {args.clients} clients")
+            report = benchmark(client, ballots, args, in_process=not args.url)
+            for server in servers:
+                server.shutdown()
+                server.server_close()
+            for phase, stats in report.items():
+                output['results'].append({'ballots': size, 'mode': mode, 'phase': phase, **stats})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.compare:
+        sys.exit(compare(output, args.compare, args.threshold))
+
+
+if __name__ == '__main__':
+    main()
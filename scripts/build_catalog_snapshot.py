@@ -0,0 +1,100 @@
+"""
+Build the track catalog snapshot that SEARCH_BACKEND=offline searches.
+
+Collects tracks from any mix of sources, formats them as the Spotify Lambda
+does, and writes them with a BM25 token index to one memory-mappable file
+(see backend_spotify/catalog_snapshot.py). Spotify track objects carrying
+`popularity` are written most popular first, since searches for very common
+words only consider the earliest tracks.
+
+Usage:
+  python scripts/build_catalog_snapshot.py --json tracks.json
+      Tracks from a JSON file: a list of tracks or a Spotify search response
+  python scripts/build_catalog_snapshot.py --local --tracks-table --search-cache .search_cache
+      Every voted track in DynamoDB Local, plus the file search cache
+  python scripts/build_catalog_snapshot.py --synthetic 50000
+      Synthetic tracks shaped like the Spotify stub server's, for CI
+
+Then run local_server.py with SEARCH_BACKEND=offline.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import Any, Iterator
+
+
+def json_tracks(path: str) -> Iterator[dict[str, Any]]:
+    """Tracks in a JSON file: a list, {"tracks": [...]} or a Spotify search response."""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('tracks', [])
+    if isinstance(data, dict):
+        data = data.get('items', [])
+    yield from (track for track in data if track)
+
+
+def search_cache_tracks(directory: str) -> Iterator[dict[str, Any]]:
+    """Tracks held by the file search cache, fresh or expired: search results and single tracks."""
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as f:
+                value = json.load(f)['value']
+        except (OSError, ValueError, KeyError):
+            continue
+        yield from value if isinstance(value, list) else [value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the offline search catalog snapshot')
+    parser.add_argument('--local', action='store_true', help='Use DynamoDB Local at http://localhost:8000')
+    parser.add_argument('--json', action='append', default=[], help='JSON file of tracks (repeatable)')
+    parser.add_argument('--tracks-table', action='store_true', help="Include the ballot backend's track catalog")
+    parser.add_argument('--search-cache', help='Include tracks from a file search cache directory')
+    parser.add_argument('--synthetic', type=int, default=0, help='Include this many synthetic tracks')
+    parser.add_argument('--out', help="Snapshot path (default: the Spotify Lambda's CATALOG_SNAPSHOT)")
+    args = parser.parse_args()
+
+    if args.local:
+        os.environ['DYNAMODB_ENDPOINT'] = 'http://localhost:8000'
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_common'))
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_spotify'))
+    sys.path.insert(0, os.path.dirname(__file__))
+    import lambda_function
+    from catalog_snapshot import write_snapshot
+
+    tracks: list[dict[str, Any]] = []
+    for path in args.json:
+        tracks += json_tracks(path)
+    if args.tracks_table:
+        table = lambda_function.get_tracks_table()
+        kwargs: dict[str, Any] = {}
+        while True:
+            result = table.scan(**kwargs)
+            tracks += (lambda_function.decimal_to_num(item['track']) for item in result.get('Items', []))
+            if 'LastEvaluatedKey' not in result:
+                break
+            kwargs['ExclusiveStartKey'] = result['LastEvaluatedKey']
+    if args.search_cache:
+        tracks += search_cache_tracks(args.search_cache)
+    if args.synthetic:
+        from spotify_stub_server import fake_track
+        tracks += (fake_track(f'{n:022d}', f'Synthetic Song {n}') for n in range(args.synthetic))
+    if not tracks:
+        parser.error('No tracks: give --json, --tracks-table, --search-cache or --synthetic')
+
+    # Stable, so tracks without a popularity keep their source order
+    tracks.sort(key=lambda track: -track.get('popularity', 0))
+    out = args.out or lambda_function.CATALOG_SNAPSHOT
+    start = time.perf_counter()
+    stats = write_snapshot(map(lambda_function.format_track, tracks), out)
+    print(f"Wrote {out}: {stats['tracks']} tracks, {stats['terms']} terms, "
+          f"{stats['bytes'] / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
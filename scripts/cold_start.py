@@ -0,0 +1,143 @@
+"""
+Measure cold-start cost of the ballot and Spotify Lambdas.
+
+Each run starts a fresh interpreter and times, for one function:
+  init       importing lambda_function (Lambda reports this as Init Duration)
+  preflight  the first request that needs no AWS call (an OPTIONS preflight)
+  connect    creating the DynamoDB client on the first table call
+  total      all three: what the first request touching DynamoDB waits for
+and records the process's peak RSS against the MemorySize in template.yaml.
+Nothing talks to AWS: creating a client needs no network or credentials.
+
+Usage:
+  python scripts/cold_start.py
+  python scripts/cold_start.py --runs 20 --output cold.json --compare baseline.json
+      Fails (exit 1) if any phase's median regressed by more than --threshold percent.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Any
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+FUNCTIONS = ('ballot', 'spotify')
+PHASES = ('init', 'preflight', 'connect', 'total')
+
+# Runs inside the fresh interpreter, with the function's directory as cwd
+# (the shared layer is on sys.path as it is under /opt/python in Lambda)
+CHILD = '''
+import json, resource, sys, time
+sys.path.insert(0, '../backend_common')
+sys.path.insert(0, '.')
+start = time.perf_counter()
+import lambda_function
+init = time.perf_counter()
+lambda_function.lambda_handler({'httpMethod': 'OPTIONS', 'path': '/'}, None)
+preflight = time.perf_counter()
+if hasattr(lambda_function, 'dynamodb'):
+    lambda_function.dynamodb.meta.client
+else:
+    lambda_function.get_tracks_table().meta.client
+connect = time.perf_counter()
+print(json.dumps({
+    'init': (init - start) * 1000,
+    'preflight': (preflight - init) * 1000,
+    'connect': (connect - preflight) * 1000,
+    'total': (connect - start) * 1000,
+    'rssMb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+
+def configured_memory() -> int | None:
+    """MemorySize (MB) from the template's Globals, as deployed."""
+    with open(os.path.join(ROOT, 'template.yaml')) as f:
+        match = re.search(r'^\s+MemorySize:\s*(\d+)', f.read(), re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+
+def measure(function: str) -> dict[str, float]:
+    env = {
+        **os.environ,
+        'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+        'PYTHONDONTWRITEBYTECODE': '1',
+    }
+    env.pop('DYNAMODB_ENDPOINT', None)
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD],
+        cwd=os.path.join(ROOT, f'backend_{function}'),
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples: list[dict[str, float]]) -> dict[str, Any]:
+    summary = {}
+    for phase in PHASES:
+        values = sorted(s[phase] for s in samples)
+        summary[phase] = {
+            'median': round(statistics.median(values), 1),
+            'min': round(values[0], 1),
+            'max': round(values[-1], 1),
+        }
+    summary['rssMb'] = round(max(s['rssMb'] for s in samples), 1)
+    return summary
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any], threshold: float) -> bool:
+    """Print median changes against a baseline. Returns False if any phase regressed past the threshold."""
+    ok = True
+    print(f"\nCompared with baseline (threshold {threshold:.0f}%):")
+    for function, summary in current['functions'].items():
+        before = baseline['functions'].get(function)
+        if not before:
+            continue
+        for phase in PHASES:
+            old, new = before[phase]['median'], summary[phase]['median']
+            change = (new - old) / old * 100 if old else float('inf') if new > old else 0.0
+            regressed = change > threshold and new - old > 1.0  # Ignore sub-millisecond noise
+            ok &= not regressed
+            print(f"  {function:8} {phase:10} {old:8.1f} -> {new:8.1f} ms ({change:+.0f}%){'  REGRESSED' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure Lambda cold-start cost')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters per function (default: 10)')
+    parser.add_argument('--function', choices=FUNCTIONS, action='append', help='Only measure these (repeatable)')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare medians with an earlier --output file')
+    parser.add_argument('--threshold', type=float, default=20.0, help='Regression threshold in percent (default: 20)')
+    args = parser.parse_args()
+
+    memory = configured_memory()
+    output = {'python': sys.version.split()[0], 'memorySizeMb': memory, 'runs': args.runs, 'functions': {}}
+
+    print(f"{'function':8} " + ' '.join(f'{p:>22}' for p in PHASES) + f" {'peak RSS':>10}")
+    for function in args.function or FUNCTIONS:
+        summary = summarize([measure(function) for _ in range(args.runs)])
+        output['functions'][function] = summary
+        cells = [f"{s['median']:7.1f} ({s['min']:.0f}-{s['max']:.0f}) ms" for s in (summary[p] for p in PHASES)]
+        print(f"{function:8} " + ' '.join(f'{c:>22}' for c in cells) + f" {summary['rssMb']:7.1f} MB")
+    if memory:
+        print(f"Configured MemorySize: {memory} MB. Lambda's CPU share scales with it, so expect "
+              f"slower times than this machine at {memory} MB.")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(baseline, output, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Publish the final results snapshot when the vote closes.
+
+Computes every ranking algorithm once from one election's ballots and writes
+content-hashed, pre-compressed JSON to the frontend bucket under
+results/<electionId>/, plus a results/<electionId>/latest.json manifest. CloudFront then serves the results page
+without touching the Lambda. Deployed stacks with VoteCloseTime set do this
+automatically on a schedule; this script is for running it by hand.
+
+Usage:
+  python scripts/finalize_results.py --bucket <FrontendBucketName>
+  python scripts/finalize_results.py --local --out-dir musicvoting_frontend/public
+      DynamoDB Local, writing uncompressed files the Vite dev server serves at /results/
+"""
+import argparse
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publish the final results snapshot')
+    parser.add_argument('--local', action='store_true', help='Use DynamoDB Local at http://localhost:8000')
+    parser.add_argument('--election', help="Election ID (default: the ballot Lambda's ELECTION_ID)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--bucket', help='S3 bucket behind CloudFront (the FrontendBucketName stack output)')
+    target.add_argument('--out-dir', help='Write uncompressed snapshot files under this directory instead')
+    args = parser.parse_args()
+
+    if args.local:
+        os.environ['DYNAMODB_ENDPOINT'] = 'http://localhost:8000'
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_common'))
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_ballot'))
+    import lambda_function
+    import snapshot
+
+    election_id = lambda_function.parse_election(args.election)
+    if args.out_dir:
+        manifest = lambda_function.publish_results(snapshot.DirectoryTarget(args.out_dir), election_id)
+    else:
+        manifest = lambda_function.publish_results(snapshot.S3Target(args.bucket), election_id)
+
+    print(f"Published {election_id} snapshot generated at {manifest['generatedAt']}:")
+    for name, path in manifest['files'].items():
+        print(f"  {name}: {path}")
+
+
+if __name__ == '__main__':
+    main()
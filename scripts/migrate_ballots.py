@@ -0,0 +1,67 @@
+"""
+Convert stored ballots between the map and packed entry encodings, or copy
+ballots from the old single-election table into an election.
+
+Set BALLOT_ENCODING=packed on the ballot Lambda first, so new saves are
+written packed, then run this to rewrite existing ballots. Reads understand
+both formats, so the migration can run (and be re-run) while voting is open.
+A ballot saved mid-migration is skipped and reported as a conflict.
+
+With --from-table, ballots from a table keyed only on username (the original
+musicvoting_ballots) are copied into --election of the (electionId, username)
+ballots table and that election's tally is rebuilt. Ballots the election
+already has are kept, so it can be re-run.
+
+Usage:
+  python scripts/migrate_ballots.py --local --dry-run   # DynamoDB Local, report sizes only
+  python scripts/migrate_ballots.py                     # AWS, pack every ballot
+  python scripts/migrate_ballots.py --to map            # AWS, roll back to lists of maps
+  python scripts/migrate_ballots.py --from-table musicvoting_ballots --election 2025
+"""
+import argparse
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate the ballot entry encoding')
+    parser.add_argument('--local', action='store_true', help='Use DynamoDB Local at http://localhost:8000')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+    parser.add_argument('--to', choices=['packed', 'map'], default='packed', help='Target encoding (default: packed)')
+    parser.add_argument('--from-table', metavar='TABLE', help='Copy ballots from this username-keyed table instead')
+    parser.add_argument('--election', help="Election to copy them into (default: the ballot Lambda's ELECTION_ID)")
+    args = parser.parse_args()
+
+    if args.local:
+        os.environ['DYNAMODB_ENDPOINT'] = 'http://localhost:8000'
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_common'))
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_ballot'))
+    import lambda_function
+
+    if args.from_table:
+        election_id = lambda_function.parse_election(args.election)
+        result = lambda_function.migrate_legacy_ballots(args.from_table, election_id, apply=not args.dry_run)
+        print(f"Ballots in {args.from_table}: {result['scanned']}")
+        if args.dry_run:
+            print(f"Run without --dry-run to copy them into election {election_id}.")
+            return
+        print(f"Copied into election {election_id}: {result['copied']}")
+        print(f"Already in the election (kept): {result['existing']}")
+        print(f"Tally rebuilt: {result['tally']['tracks']} tracks, {len(result['tally']['drifted'])} updated")
+        return
+
+    result = lambda_function.migrate_ballot_encoding(args.to, apply=not args.dry_run)
+
+    scanned = result['scanned'] or 1
+    print(f"Ballots scanned: {result['scanned']}")
+    print(f"{'Would convert' if args.dry_run else 'Converted'} to {args.to}: {result['converted']}")
+    if result['conflicts']:
+        print(f"Skipped (saved during migration, re-run to convert): {result['conflicts']}")
+    print(f"Average item size: {result['bytesBefore'] / scanned:.0f} -> {result['bytesAfter'] / scanned:.0f} bytes")
+    if result['bytesAfter']:
+        print(f"Scan read cost: {result['bytesBefore'] / result['bytesAfter']:.1f}x {'lower' if args.to == 'packed' else 'higher'}")
+
+
+if __name__ == '__main__':
+    main()
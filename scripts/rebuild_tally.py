@@ -0,0 +1,56 @@
+"""
+Rebuild one election's materialized tally from its ballots.
+
+The ballot Lambda keeps musicvoting_election_tally up to date incrementally on
+every save/rescind. This script recomputes an election's tally from a Query of
+its ballots, reports any tracks whose counts have drifted, and (unless
+--dry-run) overwrites them. It also copies track metadata still embedded in
+older ballots into musicvoting_tracks.
+
+Usage:
+  python scripts/rebuild_tally.py --local            # DynamoDB Local
+  python scripts/rebuild_tally.py --dry-run          # AWS, check only
+  python scripts/rebuild_tally.py --election 2024    # AWS, repair another election
+
+Run it once after first deploying the tally table, and whenever voting is quiet.
+"""
+import argparse
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the ballot tally aggregate')
+    parser.add_argument('--local', action='store_true', help='Use DynamoDB Local at http://localhost:8000')
+    parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+    parser.add_argument('--election', help="Election ID (default: the ballot Lambda's ELECTION_ID)")
+    args = parser.parse_args()
+
+    if args.local:
+        os.environ['DYNAMODB_ENDPOINT'] = 'http://localhost:8000'
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_common'))
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_ballot'))
+    import lambda_function
+
+    election_id = lambda_function.parse_election(args.election)
+    result = lambda_function.rebuild_tally(election_id, apply=not args.dry_run)
+
+    print(f"Election: {result['election']}")
+    print(f"Tracks in tally: {result['tracks']}")
+    print(f"Tracks embedded in old-format ballots: {result['embeddedTracks']}")
+    print(f"Drifted: {len(result['drifted'])}")
+    for track_id in result['drifted']:
+        print(f"  {track_id}")
+    print(f"Orphaned: {len(result['orphaned'])}")
+    for track_id in result['orphaned']:
+        print(f"  {track_id}")
+
+    if result['drifted'] or result['orphaned']:
+        print("Repaired." if result['repaired'] else "Run without --dry-run to repair.")
+    else:
+        print("Tally matches ballots.")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,15 +7,30 @@ Prerequisites:
 
 Usage:
   python scripts/setup_local_dynamo.py
+  python scripts/setup_local_dynamo.py --seed-ballots 5000   # add synthetic ballots
+  python scripts/setup_local_dynamo.py --verify-scan         # compare the election Query with a scan
 
 Note: User authentication is handled entirely on the frontend (see config.ts).
-      This script only creates the ballots table.
+      This script creates the ballots, tally aggregate, track catalog and
+      search cache tables. Ballots and the tally are keyed by (electionId,
+      username) and (electionId, trackId). If the original username-keyed
+      musicvoting_ballots table exists, its ballots are copied into --election
+      and that election's tally is rebuilt; the old tables are left in place.
 """
+import argparse
+import os
+import random
+import sys
+import time
+
 import boto3
 from botocore.exceptions import ClientError
 
 ENDPOINT_URL = 'http://localhost:8000'
 
+# Single-election ballots table from before ballots were keyed by electionId
+LEGACY_BALLOTS_TABLE = 'musicvoting_ballots'
+
 
 def get_dynamodb():
     return boto3.resource(
@@ -27,17 +42,23 @@ def get_dynamodb():
     )
 
 
-def create_table(dynamodb, table_name: str):
+def ballot_lambda():
+    """The ballot Lambda module, pointed at DynamoDB Local."""
+    os.environ['DYNAMODB_ENDPOINT'] = ENDPOINT_URL
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_common'))
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_ballot'))
+    import lambda_function
+    return lambda_function
+
+
+def create_table(dynamodb, table_name: str, key: str = 'username', sort_key: str | None = None):
     """Create a table if it doesn't exist."""
+    keys = [(key, 'HASH')] + ([(sort_key, 'RANGE')] if sort_key else [])
     try:
         table = dynamodb.create_table(
             TableName=table_name,
-            KeySchema=[
-                {'AttributeName': 'username', 'KeyType': 'HASH'},
-            ],
-            AttributeDefinitions=[
-                {'AttributeName': 'username', 'AttributeType': 'S'},
-            ],
+            KeySchema=[{'AttributeName': name, 'KeyType': kind} for name, kind in keys],
+            AttributeDefinitions=[{'AttributeName': name, 'AttributeType': 'S'} for name, _ in keys],
             BillingMode='PAY_PER_REQUEST',
         )
         table.wait_until_exists()
@@ -49,6 +70,66 @@ def create_table(dynamodb, table_name: str):
             raise
 
 
+def seed_ballots(dynamodb, count: int, election_id: str, tracks: int = 2000):
+    """Write `count` synthetic 20-song ballots for an election, drawn from a pool of `tracks` track IDs."""
+    table = dynamodb.Table('musicvoting_election_ballots')
+    rng = random.Random(42)
+    pool = [f'seedtrack{i:05d}' for i in range(tracks)]
+
+    with table.batch_writer() as batch:
+        for i in range(count):
+            batch.put_item(Item={
+                'electionId': election_id,
+                'username': f'seeduser{i:06d}',
+                'entries': [
+                    {'rank': rank, 'trackId': track_id}
+                    for rank, track_id in enumerate(rng.sample(pool, 20), start=1)
+                ],
+                'submittedAt': '2025-01-01T00:00:00Z',
+                'isRescinded': False,
+            })
+    print(f"Seeded {count} ballots in election {election_id} (run scripts/rebuild_tally.py --local to update the tally)")
+
+
+def migrate_legacy_ballots(dynamodb, election_id: str):
+    """Copy ballots from the username-keyed table, if there is one, into an election."""
+    try:
+        key_schema = dynamodb.meta.client.describe_table(TableName=LEGACY_BALLOTS_TABLE)['Table']['KeySchema']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+            return
+        raise
+    if [k['AttributeName'] for k in key_schema] != ['username']:
+        return
+
+    print(f"\nCopying {LEGACY_BALLOTS_TABLE} into election {election_id}...")
+    result = ballot_lambda().migrate_legacy_ballots(LEGACY_BALLOTS_TABLE, election_id)
+    print(f"Copied {result['copied']} of {result['scanned']} ballots ({result['existing']} already there)")
+    print(f"Rebuilt the tally: {result['tally']['tracks']} tracks")
+    print(f"The old {LEGACY_BALLOTS_TABLE} and musicvoting_tally tables can be deleted once checked")
+
+
+def verify_scan(election_id: str):
+    """Check the ballot Lambda's election Query returns the same ballots as a filtered parallel scan."""
+    lambda_function = ballot_lambda()
+
+    start = time.perf_counter()
+    queried = [b['username'] for b in lambda_function.election_ballots(election_id, fields=['username'])]
+    print(f"query: {len(queried)} ballots in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    scanned = [
+        b['username'] for b in lambda_function.scan_ballots(fields=['electionId', 'username'])
+        if b['electionId'] == election_id
+    ]
+    print(f"scan (segments={lambda_function.SCAN_SEGMENTS}): {len(scanned)} ballots in {time.perf_counter() - start:.2f}s")
+
+    if len(queried) == len(set(queried)) and set(queried) == set(scanned):
+        print("Election query matches scan")
+    else:
+        print("[ERROR] Election query differs from scan")
+
+
 def list_tables(dynamodb):
     """List all tables."""
     client = dynamodb.meta.client
@@ -57,6 +138,12 @@ def list_tables(dynamodb):
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Set up DynamoDB Local tables')
+    parser.add_argument('--seed-ballots', type=int, default=0, metavar='N', help='Write N synthetic ballots')
+    parser.add_argument('--verify-scan', action='store_true', help='Compare the election Query with a parallel scan')
+    parser.add_argument('--election', help="Election to migrate, seed and verify (default: the ballot Lambda's ELECTION_ID)")
+    args = parser.parse_args()
+
     print("=" * 50)
     print("DynamoDB Local Setup")
     print("=" * 50)
@@ -78,7 +165,19 @@ def main():
 
     # Create tables
     print("Creating tables...")
-    create_table(dynamodb, 'musicvoting_ballots')
+    create_table(dynamodb, 'musicvoting_election_ballots', key='electionId', sort_key='username')
+    create_table(dynamodb, 'musicvoting_election_tally', key='electionId', sort_key='trackId')
+    create_table(dynamodb, 'musicvoting_tracks', key='trackId')
+    create_table(dynamodb, 'musicvoting_search_cache', key='query')
+
+    election_id = ballot_lambda().parse_election(args.election)
+    migrate_legacy_ballots(dynamodb, election_id)
+
+    if args.seed_ballots:
+        seed_ballots(dynamodb, args.seed_ballots, election_id)
+
+    if args.verify_scan:
+        verify_scan(election_id)
 
     # List tables
     list_tables(dynamodb)
@@ -87,7 +186,7 @@ def main():
     print("Setup complete!")
     print("=" * 50)
     print("\nNote: User login is handled on the frontend (see config.ts)")
-    print("      Only the ballots table is needed in DynamoDB")
+    print("      Only the election ballots, election tally, tracks and search cache tables are needed in DynamoDB")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,207 @@
+"""
+Local stub of the Spotify Web API for offline development and checks.
+
+Serves the token, search and several-tracks endpoints used by backend_spotify
+with synthetic tracks, over HTTP/1.1 keep-alive. It can inject 429 (with
+Retry-After) or 5xx responses and latency to exercise the client's retries,
+rate limiting and pooling.
+
+Usage:
+  python scripts/spotify_stub_server.py --port 3100
+      Then run local_server.py with:
+        SPOTIFY_ACCOUNTS_URL=http://localhost:3100 SPOTIFY_API_URL=http://localhost:3100
+        SPOTIFY_CLIENT_ID=stub SPOTIFY_CLIENT_SECRET=stub
+
+  python scripts/spotify_stub_server.py --check
+      Start the stub on a free port and run the Spotify Lambda against it,
+      verifying connection reuse, 5xx retries, that a 429 is handed to the
+      rate limiter without retrying, and batched track lookups.
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+
+def fake_track(track_id: str, name: str) -> dict:
+    """A track shaped like the Spotify Web API's full track object."""
+    return {
+        'id': track_id,
+        'name': name,
+        'artists': [{'id': f'artist-{track_id}', 'name': f'Artist {track_id[:4]}'}],
+        'album': {
+            'id': f'album-{track_id}',
+            'name': f'Album {track_id[:4]}',
+            'images': [{'url': f'https://example.invalid/{track_id}.jpg', 'width': 64, 'height': 64}] * 3,
+            'release_date': '2025-01-01',
+        },
+        'duration_ms': 200000,
+        'preview_url': None,
+        'external_urls': {'spotify': f'https://open.spotify.com/track/{track_id}'},
+    }
+
+
+class StubState:
+    def __init__(self, fail_every: int = 0, latency: float = 0.0, fail_status: int = 429) -> None:
+        self.fail_every = fail_every
+        self.fail_status = fail_status
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    state = StubState()
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+
+    def send_json(self, status: int, body: dict, headers: dict | None = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def fail(self):
+        if self.state.fail_status == 429:
+            return self.send_json(429, {'error': 'rate limited'}, {'Retry-After': '0'})
+        self.send_json(self.state.fail_status, {'error': 'unavailable'})
+
+    def should_fail(self) -> bool:
+        with self.state.lock:
+            self.state.requests += 1
+            count = self.state.requests
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        return bool(self.state.fail_every) and count % self.state.fail_every == 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.should_fail():
+            return self.fail()
+        if urlparse(self.path).path == '/api/token':
+            return self.send_json(200, {'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 3600})
+        self.send_json(404, {'error': 'not found'})
+
+    def do_GET(self):
+        if self.should_fail():
+            return self.fail()
+
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        if parsed.path == '/v1/search':
+            query = params.get('q', '')
+            limit = int(params.get('limit', 20))
+            items = [
+                fake_track(hashlib.sha1(f'{query}{i}'.encode()).hexdigest()[:22], f'{query.title()} Song {i + 1}')
+                for i in range(limit)
+            ]
+            return self.send_json(200, {'tracks': {'items': items}})
+
+        if parsed.path == '/v1/tracks':
+            ids = params.get('ids', '').split(',')
+            if len(ids) > 50:
+                return self.send_json(400, {'error': 'too many ids'})
+            # Spotify returns null for unknown IDs; treat IDs starting with 'missing' as unknown
+            tracks = [None if i.startswith('missing') else fake_track(i, f'Track {i}') for i in ids]
+            return self.send_json(200, {'tracks': tracks})
+
+        self.send_json(404, {'error': 'not found'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(
+    port: int, fail_every: int = 0, latency: float = 0.0, fail_status: int = 429,
+) -> http.server.ThreadingHTTPServer:
+    StubHandler.state = StubState(fail_every, latency, fail_status)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check() -> int:
+    """Run the Spotify Lambda against the stub and verify pooling and retries."""
+    server = start(0, fail_every=4, fail_status=503)
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    os.environ.update({
+        'SPOTIFY_CLIENT_ID': 'stub',
+        'SPOTIFY_CLIENT_SECRET': 'stub',
+        'SPOTIFY_ACCOUNTS_URL': url,
+        'SPOTIFY_API_URL': url,
+        'SEARCH_CACHE_BACKEND': 'none',
+    })
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_common'))
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend_spotify'))
+    import lambda_function
+
+    for i in range(10):
+        tracks = lambda_function.search_tracks(f'query {i}')
+        assert len(tracks) == 20, len(tracks)
+
+    ids = [f'track{i:03d}' for i in range(120)] + ['missing1']
+    tracks = lambda_function.get_tracks(ids)
+    assert [t['id'] for t in tracks] == ids[:-1], 'batch lookup lost or reordered tracks'
+    before = StubHandler.state.requests
+    lambda_function.get_tracks(ids[:-1])
+    assert StubHandler.state.requests == before, 'cached tracks were fetched again'
+
+    counters = dict(lambda_function.spotify_http.counters)
+    state = StubHandler.state
+    print(f"Stub saw {state.requests} requests over {state.connections} connection(s)")
+    print(f"Client counters: {counters}")
+
+    # A 429 isn't retried: the first one stops upstream calls for its Retry-After
+    state.fail_status, state.fail_every = 429, 1
+    before = state.requests
+    try:
+        lambda_function.search_tracks('rate limited')
+        limited = False
+    except lambda_function.RateLimited:
+        limited = True
+    server.shutdown()
+
+    # Concurrent chunk fetches may each open a connection
+    ok = counters['retries'] > 0 and state.connections <= 4 and limited and state.requests == before + 1
+    print("OK" if ok else "[ERROR] Expected retries on injected 503s, reused connections and an unretried 429")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stub of the Spotify Web API')
+    parser.add_argument('--port', type=int, default=3100)
+    parser.add_argument('--fail-every', type=int, default=0, metavar='N', help='Answer every Nth request with --fail-status')
+    parser.add_argument('--fail-status', type=int, default=429, help='Status of injected failures (default 429)')
+    parser.add_argument('--latency', type=float, default=0.0, metavar='SECONDS', help='Delay added to each request')
+    parser.add_argument('--check', action='store_true', help='Run the Spotify Lambda against the stub and exit')
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(check())
+
+    server = start(args.port, args.fail_every, args.latency, args.fail_status)
+    print(f"Spotify stub running on http://localhost:{args.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()